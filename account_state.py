@@ -0,0 +1,104 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# 账户状态缓存: 一个周期内持仓 / 余额只查一次 (周期开始时与K线请求并发预取)，
+# analyze_market 和 execute_trade 都读缓存；自己下单成交后立即作废，下次读取重新查询
+
+
+class _AccountCache(object):
+    """
+    key -> (获取时间, future)。future 失败时丢弃，下次读取重试。
+    余额是全账户共享的，多标的同时开始周期时 balance_max_age 秒内复用同一次查询
+    """
+
+    def __init__(self, exchange, balance_max_age=1.0):
+        self.exchange = exchange
+        self.balance_max_age = balance_max_age
+        self.entries = {}
+        self.fetches = 0
+        self.hits = 0
+
+    def _entry(self, key, loader):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.fetches += 1
+            entry = self.entries[key] = (time.monotonic(), self._submit(loader))
+        else:
+            self.hits += 1
+        return entry[1]
+
+    def _drop(self, key, future):
+        if self.entries.get(key, (None, None))[1] is future:
+            del self.entries[key]
+
+    def _positions_future(self, symbol):
+        return self._entry(('positions', symbol), lambda: self.exchange.fetch_positions([symbol]))
+
+    def _balance_future(self):
+        return self._entry(('balance',), self.exchange.fetch_balance)
+
+    def begin_cycle(self, symbol):
+        """新周期: 作废该标的持仓和过期的余额，并在后台预取"""
+        self.entries.pop(('positions', symbol), None)
+        balance = self.entries.get(('balance',))
+        if balance and time.monotonic() - balance[0] > self.balance_max_age:
+            del self.entries[('balance',)]
+        self._positions_future(symbol)
+        self._balance_future()
+
+    def on_fill(self, symbol):
+        """自己的订单成交后持仓和余额都已变化"""
+        self.entries.pop(('positions', symbol), None)
+        self.entries.pop(('balance',), None)
+
+    def summary(self):
+        total = self.fetches + self.hits
+        return f"账户缓存: 查询 {self.fetches} 次 | 复用 {self.hits} 次" + (
+            f" ({self.hits / total:.0%})" if total else "")
+
+
+class AccountState(_AccountCache):
+    """同步版 (app_v2): 预取在后台线程里执行"""
+
+    def __init__(self, exchange, balance_max_age=1.0):
+        super().__init__(exchange, balance_max_age)
+        self.pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='account')
+
+    def _submit(self, loader):
+        return self.pool.submit(loader)
+
+    def _result(self, key, future):
+        try:
+            return future.result()
+        except Exception:
+            self._drop(key, future)
+            raise
+
+    def positions(self, symbol):
+        return self._result(('positions', symbol), self._positions_future(symbol))
+
+    def balance(self):
+        return self._result(('balance',), self._balance_future())
+
+
+class AsyncAccountState(_AccountCache):
+    """异步版 (multi_bot): 预取是事件循环里的任务，所有标的共享一份"""
+
+    def _submit(self, loader):
+        return asyncio.ensure_future(loader())
+
+    async def _result(self, key, future):
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._drop(key, future)
+            raise
+
+    async def positions(self, symbol):
+        return await self._result(('positions', symbol), self._positions_future(symbol))
+
+    async def balance(self):
+        return await self._result(('balance',), self._balance_future())
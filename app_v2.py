@@ -1,49 +1,61 @@
 import os
 import time
-import schedule
-from openai import OpenAI
+import asyncio
+import calendar
 import ccxt
-import pandas as pd
-import numpy as np
 from datetime import datetime
-import json
-import re
 import sys
+import queue
+import threading
+from concurrent.futures import Future, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
+from indicator_engine import IndicatorEngine, build_market_snapshot
+from indicator_kernels import IndicatorKernels, market_snapshot
+from candle_store import CandleStore
+from llm_client import HedgedLLM, LatencyStats, LLMDeadlineExceeded, LazyClient, PromptCacheStats
+from decision_cache import DecisionCache
+from llm_cassette import LLMCassette, wrap_client
+from llm_json import DecisionParseError, RepairStats, parse_decision, validate_decision
+import http_pool
+from metrics import StageMetrics, NULL_METRICS
+from account_state import AccountState
+from order_exec import submit_orders
+from paper_ledger import PaperLedger, ledger_path
+from resampler import Resampler, mtf_context
+from ws_feed import CandleFeed, OKX_WS_BUSINESS, okx_inst_id
+from scheduler import CandleScheduler, ServerClock, candle_open, confirm_candle_close, next_candle_close
+from startup import warm_imports, load_markets_cached, run_concurrently
 
 load_dotenv()
 
-# --- 1. 日志系统 (自动保存到文件) ---
-class Logger(object):
-    def __init__(self):
-        if not os.path.exists('logs'):
-            os.makedirs('logs')
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        self.filename = f"logs/log_{timestamp}.log"
-        self.terminal = sys.stdout
-        self.log = open(self.filename, 'a', encoding='utf-8')
-        print(f"📄 日志文件已创建: {self.filename}")
-
-    def write(self, message):
-        self.terminal.write(message)
-        self.log.write(message)
-        self.log.flush()
-
-    def flush(self):
-        self.terminal.flush()
-        self.log.flush()
+# --- 1. 日志系统 (自动保存到文件，后台线程批量写入，按大小/日期切分压缩) ---
+from logger import Logger
 
 # --- 2. 配置区域 ---
-deepseek_client = OpenAI(
-    api_key=os.getenv('DEEPSEEK_API_KEY'),
-    base_url="https://api.deepseek.com"
-)
+# 所有出站 HTTP 走 http_pool 的长连接池 (见 http_pool.py)
+def make_deepseek_client():
+    from openai import AsyncOpenAI  # 导入约 1 秒，推迟到第一次请求 (main 里会提前在后台预导入)
+    return AsyncOpenAI(
+        api_key=os.getenv('DEEPSEEK_API_KEY'),
+        base_url="https://api.deepseek.com",
+        http_client=http_pool.httpx_async_client('deepseek', timeframe=TRADE_CONFIG['timeframe'])
+    )
+
+deepseek_client = LazyClient(make_deepseek_client)
+
+DEEPSEEK_SYSTEM_PROMPT = "你是一个只输出JSON的量化交易引擎，不要输出任何Markdown格式。"
+DEEPSEEK_REQUEST = {
+    'model': "deepseek-chat",
+    'stream': False,
+    'temperature': 0.1 # 低温度保证输出稳定
+}
 
 exchange = ccxt.okx({
     'options': {'defaultType': 'swap'},
     'apiKey': os.getenv('OKX_API_KEY'),
     'secret': os.getenv('OKX_SECRET'),
     'password': os.getenv('OKX_PASSWORD'),
+    'session': http_pool.requests_session('okx'),
 })
 
 # TRADE_CONFIG = {
@@ -67,7 +79,36 @@ TRADE_CONFIG = {
     'leverage': 3,          # 3倍杠杆 (非常安全)
     'timeframe': '15m',     # 实盘建议 15m，调试可用 1m（可选值：1m, 3m, 5m, 15m, 30m, 1h）
     'test_mode': True,      # [开关] True=模拟资金交易, False=实盘真金白银
+    # 模拟盘账本: 成交按 taker 费率和滑点结算、持仓按资金费率计费，事件追加写入文件，重启后回放恢复
+    # funding_rate=None 用交易所当前资金费率 (到结算点才查一次)；整项设为 None 则只在内存记账且不计费用
+    'paper_ledger': {'path': 'data/paper/{symbol}.jsonl', 'balance': 100.0, 'taker_fee': 0.0005,
+                     'slippage_bps': 2, 'funding_rate': None, 'snapshot_every': 200},
     'data_points': 150,     # 获取K线数量
+    'incremental_indicators': True,  # 增量指标引擎 (每根K线 O(1) 更新，False=每次全量重算)
+    'indicator_backend': 'numpy',    # 全量重算用: numpy=NumPy 内核 (不导入 pandas) / pandas=calculate_technical_indicators
+    'candle_store': 'data/candles',  # 本地K线仓库目录 (只增量下载新K线)，None=每次全量下载
+    'llm_deadline_sec': 30,   # DeepSeek 截止时间: K线收盘后N秒仍无回复则强制 HOLD
+    'llm_hedge_after_sec': 8, # 超过N秒未回复时再发一个备份请求，先回来的生效 (None=关闭)
+    # 决策缓存: 指标量化后与持仓方向都相同时复用上次决策 (quantize=None 用默认分桶，整项设为 None 关闭)
+    'decision_cache': {'ttl_sec': 3600, 'max_size': 512, 'quantize': None},
+    # DeepSeek 录制/回放: off / record / replay (离线确定性运行) / auto，可用环境变量 LLM_CASSETTE 切换
+    'llm_cassette': {'mode': os.getenv('LLM_CASSETTE', 'off'), 'path': 'data/llm_cassette.bin'},
+    # DeepSeek 流式输出: signal + confidence 一解析出来就先下单，reason / 止损止盈继续接收 (磁带开启时自动用非流式)
+    'llm_stream': True,
+    # 分阶段耗时埋点: Prometheus 端点 http://127.0.0.1:<port>/metrics + 每周期一行 JSONL (None=关闭)
+    'metrics': {'port': 9108, 'jsonl': 'logs/stage_metrics.jsonl'},
+    # load_markets 本地缓存 (重启时免去下载全部市场，None=每次下载)
+    'market_cache': {'path': 'data/markets_{exchange}.json', 'ttl_sec': 6 * 3600},
+    # WebSocket 行情: 订阅K线频道，收到收盘推送立即执行 (取代整点+2秒轮询)，可用环境变量 WS_FEED=1 开启
+    # 多周期: 只拉 1m 基础K线，本地合成各周期 (含主周期) 并把高周期趋势加入 prompt (None=关闭)
+    # 例: {'base': '1m', 'timeframes': ['5m', '15m', '1h', '4h']}
+    'resample': None,
+    # 实盘反手方式: net=一笔净额单 (单向持仓模式) / batch=批量接口一次提交平仓+开仓 / sequential=平仓成交后再开仓
+    'reversal': 'net',
+    'order_fill': {'first_poll_sec': 0.05, 'max_poll_sec': 0.5, 'backoff': 1.5, 'timeout_sec': 10},
+    # K线收盘确认: 到点后轮询 (指数退避) 直到新K线出现再执行，取代固定多睡2秒 (None=不确认)
+    'candle_confirm': {'first_poll_sec': 0.1, 'max_poll_sec': 0.5, 'backoff': 1.5, 'timeout_sec': 10},
+    'ws_feed': {'enabled': os.getenv('WS_FEED', '0') == '1', 'url': os.getenv('OKX_WS_URL', OKX_WS_BUSINESS)},
     'analysis_periods': {
         'short_term': 20,  # 短期均线
         'medium_term': 50,  # 中期均线
@@ -79,163 +120,277 @@ TRADE_CONFIG = {
 price_history = []
 signal_history = []
 position = None # 实盘持仓缓存
-
-# 🟢 虚拟账户 (仅在 test_mode=True 时有效)
-virtual_account = {
-    "balance": 100.0,     # 初始模拟本金 100 U
-    "holdings": 0.0,      # 持仓张数
-    "entry_price": 0.0,   # 开仓均价
-    "side": None          # 'long' 或 'short'
-}
+account_state = AccountState(exchange) # 实盘持仓/余额: 每周期只查一次，自己成交后作废
+indicator_engines = {} # (symbol, timeframe) -> IndicatorEngine
+indicator_kernels = IndicatorKernels() # 全量重算的 NumPy 内核 (输出缓冲区跨周期复用)
+candle_store = CandleStore(TRADE_CONFIG['candle_store']) if TRADE_CONFIG.get('candle_store') else None
+llm_latency = LatencyStats() # DeepSeek 延迟统计 (p50/p95/p99)
+prompt_cache_stats = PromptCacheStats() # DeepSeek 前缀缓存命中 tokens
+json_repair_stats = RepairStats() # 回复格式不规范时各本地修复路径的触发次数
+llm_cassette = LLMCassette(**TRADE_CONFIG['llm_cassette']) if TRADE_CONFIG.get('llm_cassette') else None
+deepseek_llm = HedgedLLM(wrap_client(deepseek_client, llm_cassette), DEEPSEEK_REQUEST,
+                         hedge_after=TRADE_CONFIG.get('llm_hedge_after_sec'), stats=llm_latency)
+llm_loop = asyncio.new_event_loop() # 异步 LLM 调用都在这个后台线程的事件循环里跑 (流式回复交出决策后还要继续接收)
+threading.Thread(target=llm_loop.run_forever, name='llm-loop', daemon=True).start()
+llm_stream_tails = queue.SimpleQueue() # 已提前交出决策的流式回复: LLM 线程放入，下个周期开头在主线程处理
+fill_latency = LatencyStats() # 实盘 信号 -> 成交 延迟
+decision_cache = DecisionCache(**TRADE_CONFIG['decision_cache']) if TRADE_CONFIG.get('decision_cache') else None
+metrics = StageMetrics(TRADE_CONFIG['metrics'].get('jsonl')) if TRADE_CONFIG.get('metrics') else NULL_METRICS
+server_clock = ServerClock(exchange.fetch_time) # 交易所服务器时钟 (调度与K线确认共用)
+resamplers = {} # symbol -> Resampler (多周期本地合成)
+ws_feed = None # WebSocket K线流 (仅 ws 模式，由 run_ws_mode 创建)
+
+paper_ledger = None # 🟢 模拟账户账本 (仅在 test_mode=True 时有效，首次使用时打开)
 
 # --- 4. 核心功能函数 ---
 
 def setup_exchange():
     """初始化交易所并获取关键信息"""
     try:
-        # 1. 设置杠杆
-        exchange.set_leverage(
-            TRADE_CONFIG['leverage'],
-            TRADE_CONFIG['symbol'],
-            {'mgnMode': 'cross'}
-        )
+        # 1. 获取合约面值 (关键！不同币种1张合约代表的数量不同)，市场信息优先读本地缓存
+        if TRADE_CONFIG.get('market_cache'):
+            from_cache = load_markets_cached(exchange, TRADE_CONFIG['market_cache'])
+        else:
+            exchange.load_markets()
+            from_cache = False
+        TRADE_CONFIG['contract_size'] = float(exchange.market(TRADE_CONFIG['symbol'])['contractSize'])
+        print(f"📏 合约面值: 1张 = {TRADE_CONFIG['contract_size']} 个币{' (本地缓存)' if from_cache else ''}")
+
+        # 2. 设置杠杆 / 获取余额 / 校准服务器时间 互不依赖，并发执行
+        results = run_concurrently({
+            'leverage': lambda: exchange.set_leverage(TRADE_CONFIG['leverage'], TRADE_CONFIG['symbol'],
+                                                      {'mgnMode': 'cross'}),
+            'balance': exchange.fetch_balance,
+            'clock': server_clock.sync,
+        })
+        for result in results.values():
+            if isinstance(result, Exception):
+                raise result
         print(f"✅ 杠杆模式: 全仓 {TRADE_CONFIG['leverage']}x")
-
-        # 2. 获取合约面值 (关键！不同币种1张合约代表的数量不同)
-        markets = exchange.load_markets()
-        market_info = markets[TRADE_CONFIG['symbol']]
-        TRADE_CONFIG['contract_size'] = float(market_info['contractSize'])
-        print(f"📏 合约面值: 1张 = {TRADE_CONFIG['contract_size']} 个币")
-
-        # 3. 获取余额
-        balance = exchange.fetch_balance()
-        usdt = balance.get('USDT', {}).get('free', 0)
+        usdt = results['balance'].get('USDT', {}).get('free', 0)
         print(f"💰 实盘可用余额: {usdt:.2f} USDT")
+        print(f"🕐 与交易所时差 {results['clock']:+.0f}ms (往返 {server_clock.rtt_ms or 0:.0f}ms)")
         
         return True
     except Exception as e:
         print(f"❌ 交易所初始化失败: {e}")
         return False
 
-def calculate_technical_indicators(df):
-    """计算丰富指标 (适配高级Prompt)"""
+def fetch_ohlcv_with_store(exchange, cfg, now_ms):
+    """
+    增量获取K线: 只下载本地仓库最后一根之后的K线 (since=)，已收盘的写入仓库，
+    再从仓库拼出最近 data_points 根 + 当前未收盘K线，结构与 fetch_ohlcv 相同。
+    """
+    symbol, tf = cfg['symbol'], cfg['timeframe']
+    last_ts = candle_store.last_ts(symbol, tf)
+    if last_ts is None:
+        # 首次运行: 下载一段历史做预热
+        fetched = exchange.fetch_ohlcv(symbol, tf, limit=cfg['data_points'])
+    else:
+        fetched = fetch_ohlcv_since(exchange, symbol, tf, last_ts + exchange.parse_timeframe(tf) * 1000, now_ms)
+    return store_fetched_ohlcv(cfg, fetched)
+
+async def fetch_ohlcv_with_store_async(exchange, cfg, now_ms):
+    """fetch_ohlcv_with_store 的异步版: 仓库读写 (memmap / 追加文件) 放到线程里，不阻塞事件循环"""
+    symbol, tf = cfg['symbol'], cfg['timeframe']
+    last_ts = await asyncio.to_thread(candle_store.last_ts, symbol, tf)
+    if last_ts is None:
+        fetched = await exchange.fetch_ohlcv(symbol, tf, limit=cfg['data_points'])
+    else:
+        fetched = await fetch_ohlcv_since_async(exchange, symbol, tf,
+                                                last_ts + exchange.parse_timeframe(tf) * 1000, now_ms)
+    return await asyncio.to_thread(store_fetched_ohlcv, cfg, fetched)
+
+OHLCV_PAGE_LIMIT = 100 # 增量分页大小 (OKX K线单次最多返回 100 根)
+
+def next_page_since(batch, tf, tf_ms, now_ms):
+    """下一页的起点；None=空页或已追到当前 (未收盘) K线，不再翻页"""
+    if not batch or batch[-1][0] >= candle_open(now_ms, tf):
+        return None
+    return batch[-1][0] + tf_ms
+
+def fetch_ohlcv_since(exchange, symbol, tf, since, now_ms):
+    """从 since 开始增量下载，断档较长时逐页补齐，直到当前K线 (不按请求条数判断是否到头)"""
+    tf_ms = exchange.parse_timeframe(tf) * 1000
+    fetched = []
+    while since is not None:
+        batch = [k for k in exchange.fetch_ohlcv(symbol, tf, since=since, limit=OHLCV_PAGE_LIMIT) if k[0] >= since]
+        fetched += batch
+        since = next_page_since(batch, tf, tf_ms, now_ms)
+    return fetched
+
+async def fetch_ohlcv_since_async(exchange, symbol, tf, since, now_ms):
+    """fetch_ohlcv_since 的异步版 (ccxt.async_support)"""
+    tf_ms = exchange.parse_timeframe(tf) * 1000
+    fetched = []
+    while since is not None:
+        batch = [k for k in await exchange.fetch_ohlcv(symbol, tf, since=since, limit=OHLCV_PAGE_LIMIT)
+                 if k[0] >= since]
+        fetched += batch
+        since = next_page_since(batch, tf, tf_ms, now_ms)
+    return fetched
+
+def new_resampler(cfg):
+    rcfg = cfg['resample']
+    timeframes = list(dict.fromkeys([cfg['timeframe']] + list(rcfg['timeframes'])))
+    return Resampler(timeframes, base=rcfg.get('base', '1m'), maxlen=max(1000, cfg['data_points']))
+
+def seed_resampler(rs, seeds, now_ms):
+    """各周期下载的历史只保留已收盘K线做种子，返回补建未完成K线需要的 1m 起点"""
+    for tf, rows in zip(rs.timeframes, seeds):
+        rs.seed(tf, [k for k in rows if next_candle_close(k[0], tf) <= now_ms])
+    return rs.resume_ms()
+
+def sync_resampler(exchange, cfg, rs, now_ms):
+    """拉一次 1m 增量喂给本地合成器；rs=None (首次运行) 时新建，并为每个周期各下载一次历史做种子"""
+    symbol = cfg['symbol']
+    if rs is None:
+        rs = new_resampler(cfg)
+        since = seed_resampler(rs, [exchange.fetch_ohlcv(symbol, tf, limit=cfg['data_points'])
+                                    for tf in rs.timeframes], now_ms)
+    else:
+        since = rs.last_base_ts + rs.base_ms
+    if since is None:
+        fetched = exchange.fetch_ohlcv(symbol, rs.base, limit=OHLCV_PAGE_LIMIT)
+    else:
+        fetched = fetch_ohlcv_since(exchange, symbol, rs.base, since, now_ms)
+    rs.extend(fetched, now_ms)
+    return rs
+
+async def sync_resampler_async(exchange, cfg, rs, now_ms):
+    """sync_resampler 的异步版，各周期种子并发下载"""
+    symbol = cfg['symbol']
+    if rs is None:
+        rs = new_resampler(cfg)
+        seeds = await asyncio.gather(*(exchange.fetch_ohlcv(symbol, tf, limit=cfg['data_points'])
+                                       for tf in rs.timeframes))
+        since = seed_resampler(rs, seeds, now_ms)
+    else:
+        since = rs.last_base_ts + rs.base_ms
+    if since is None:
+        fetched = await exchange.fetch_ohlcv(symbol, rs.base, limit=OHLCV_PAGE_LIMIT)
+    else:
+        fetched = await fetch_ohlcv_since_async(exchange, symbol, rs.base, since, now_ms)
+    rs.extend(fetched, now_ms)
+    return rs
+
+def attach_mtf_context(data, rs, cfg):
+    """高周期指标摘要写入 data['mtf']，趋势串进指标 (决策缓存 key 随之变化)"""
+    others = [tf for tf in rs.timeframes if tf != cfg['timeframe']]
+    data['mtf'] = mtf_context(rs, others, cfg['data_points'], indicator_kernels)
+    data['indicators']['mtf_trend'] = "|".join(f"{tf}:{v['trend']}" for tf, v in data['mtf'].items())
+    return data
+
+def store_fetched_ohlcv(cfg, fetched):
+    """已收盘K线入库 (最后一根是未收盘K线，不入库)，返回最近 data_points 根"""
+    symbol, tf, limit = cfg['symbol'], cfg['timeframe'], cfg['data_points']
+    if not fetched:
+        return candle_store.tail(symbol, tf, limit)
+
+    closed, live = fetched[:-1], fetched[-1]
+    added = candle_store.append(symbol, tf, closed)
+    if added:
+        print(f"🗄️ [{symbol}] K线仓库新增 {added} 根 (共 {candle_store.count(symbol, tf)} 根)")
+    return candle_store.tail(symbol, tf, limit - 1) + [live]
+
+def get_market_data(ohlcv=None):
+    """获取并处理市场数据 (适配高级Prompt)；ohlcv 为调用方已备好的K线时直接使用"""
+    symbol = TRADE_CONFIG['symbol']
     try:
-        close = df['close']
-        high = df['high']
-        low = df['low']
-        vol = df['vol']
-
-        # 1. 均线系统 (适配 Prompt 的 SMA20/60/120)
-        df['sma_20'] = close.rolling(20).mean()
-        df['sma_60'] = close.rolling(60).mean()  # 新增
-        df['sma_120'] = close.rolling(120).mean() # 新增
-
-        # 2. MACD
-        ema12 = close.ewm(span=12).mean()
-        ema26 = close.ewm(span=26).mean()
-        df['macd'] = ema12 - ema26
-        df['macd_signal'] = df['macd'].ewm(span=9).mean()
-        df['macd_hist'] = df['macd'] - df['macd_signal']
-
-        # 3. RSI
-        delta = close.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-        rs = gain / loss
-        df['rsi'] = 100 - (100 / (1 + rs))
-
-        # 4. 布林带
-        mid = close.rolling(20).mean()
-        std = close.rolling(20).std()
-        df['bb_upper'] = mid + 2 * std
-        df['bb_lower'] = mid - 2 * std
-        df['bb_pct'] = (close - df['bb_lower']) / (df['bb_upper'] - df['bb_lower'])
-
-        # 5. ATR (用于止损)
-        tr1 = high - low
-        tr2 = abs(high - close.shift())
-        tr3 = abs(low - close.shift())
-        tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-        df['atr'] = tr.rolling(14).mean()
-
-        # 6. 成交量比率 (新增：用于判断放量/缩量)
-        # 当前成交量 / 过去20根K线平均成交量
-        df['vol_ma20'] = vol.rolling(20).mean()
-        df['vol_ratio'] = vol / df['vol_ma20']
-
-        df = df.fillna(0)
-        return df
+        with metrics.span('ohlcv_fetch', symbol):
+            rs = None
+            if ohlcv is not None:
+                pass  # ws 模式: 事件循环线程里取好的K线快照，无需请求
+            elif TRADE_CONFIG.get('resample'):
+                # 多周期模式: 主周期也由 1m 本地合成，每轮只有一次 1m 增量请求
+                rs = resamplers[symbol] = sync_resampler(exchange, TRADE_CONFIG, resamplers.get(symbol),
+                                                          server_clock.now_ms())
+                ohlcv = rs.ohlcv(TRADE_CONFIG['timeframe'], TRADE_CONFIG['data_points'])
+            elif candle_store:
+                ohlcv = fetch_ohlcv_with_store(exchange, TRADE_CONFIG, server_clock.now_ms())
+            else:
+                # 获取稍微多一点的数据以计算长周期均线(SMA120)
+                ohlcv = exchange.fetch_ohlcv(
+                    symbol, 
+                    TRADE_CONFIG['timeframe'], 
+                    limit=TRADE_CONFIG['data_points'] # 至少需要120根以上
+                )
+        with metrics.span('indicators', symbol):
+            data = build_market_data(ohlcv, TRADE_CONFIG)
+            if data and rs:
+                attach_mtf_context(data, rs, TRADE_CONFIG)
+            return data
     except Exception as e:
-        print(f"指标计算出错: {e}")
-        return df
+        print(f"数据获取失败: {e}")
+        return None
 
-def get_market_data():
-    """获取并处理市场数据 (适配高级Prompt)"""
-    try:
-        # 获取稍微多一点的数据以计算长周期均线(SMA120)
-        ohlcv = exchange.fetch_ohlcv(
-            TRADE_CONFIG['symbol'], 
-            TRADE_CONFIG['timeframe'], 
-            limit=TRADE_CONFIG['data_points'] # 至少需要120根以上
-        )
-        df = pd.DataFrame(ohlcv, columns=['ts', 'open', 'high', 'low', 'close', 'vol'])
-        df['ts'] = pd.to_datetime(df['ts'], unit='ms')
-        
-        df = calculate_technical_indicators(df)
-        
-        if len(df) < 120: 
+def build_market_data(ohlcv, cfg):
+    """K线列表 -> 指标快照 (增量引擎 / NumPy 内核 / pandas 全量计算)"""
+    if cfg.get('incremental_indicators'):
+        return get_market_data_incremental(ohlcv, cfg)
+    if cfg.get('indicator_backend', 'numpy') == 'numpy':
+        if len(ohlcv) < 120:
             print("⚠️ K线数据不足以计算SMA120，请增加 limit")
             return None
+        data = market_snapshot(indicator_kernels, ohlcv)
+        data['ts'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return data
 
-        curr = df.iloc[-1]
-        
-        # 趋势预判文本化
-        trend_desc = "震荡"
-        if curr['close'] > curr['sma_20'] > curr['sma_60'] > curr['sma_120']:
-            trend_desc = "强多头排列"
-        elif curr['close'] < curr['sma_20'] < curr['sma_60'] < curr['sma_120']:
-            trend_desc = "强空头排列"
-        elif curr['close'] > curr['sma_20']:
-            trend_desc = "短期偏多"
-        elif curr['close'] < curr['sma_20']:
-            trend_desc = "短期偏空"
-
-        return {
-            'price': curr['close'],
-            'ts': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'indicators': {
-                'trend': trend_desc,
-                'sma20_dist': round((curr['close'] - curr['sma_20'])/curr['sma_20']*100, 2),
-                'macd': round(curr['macd'], 4),
-                'macd_hist': round(curr['macd_hist'], 4),
-                'rsi': round(curr['rsi'], 2),
-                'bb_pct': round(curr['bb_pct'], 2),
-                'atr': round(curr['atr'], 4),
-                'vol_ratio': round(curr['vol_ratio'], 2) # 新增：告诉AI是否放量 (大于1代表放量)
-            },
-            'kline_history': df.tail(6).to_dict('records') 
-        }
-    except Exception as e:
-        print(f"数据获取失败: {e}")
+    import pandas as pd
+    from indicators import calculate_technical_indicators
+
+    df = pd.DataFrame(ohlcv, columns=['ts', 'open', 'high', 'low', 'close', 'vol'])
+    df['ts'] = pd.to_datetime(df['ts'], unit='ms')
+    
+    df = calculate_technical_indicators(df)
+    
+    if len(df) < 120: 
+        print("⚠️ K线数据不足以计算SMA120，请增加 limit")
+        return None
+
+    data = build_market_snapshot(df.iloc[-1], df.tail(6).to_dict('records'))
+    data['ts'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return data
+
+def get_market_data_incremental(ohlcv, cfg):
+    """增量版: 只把新收盘的K线喂给指标引擎，未收盘K线只做预览计算"""
+    key = (cfg['symbol'], cfg['timeframe'])
+    engine = indicator_engines.get(key)
+    if engine is None:
+        tf_ms = exchange.parse_timeframe(cfg['timeframe']) * 1000
+        engine = indicator_engines[key] = IndicatorEngine(tf_ms)
+
+    live = engine.sync(ohlcv)
+    if engine.count + 1 < 120:
+        print("⚠️ K线数据不足以计算SMA120，请增加 limit")
         return None
 
+    data = engine.snapshot(live)
+    data['ts'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return data
+
 def get_real_position():
     """获取OKX实盘持仓"""
     try:
-        positions = exchange.fetch_positions([TRADE_CONFIG['symbol']])
-        for pos in positions:
-            if pos['symbol'] == TRADE_CONFIG['symbol']:
-                amt = float(pos['contracts'])
-                if amt > 0:
-                    return {
-                        'side': pos['side'], 
-                        'size': amt,
-                        'pnl': float(pos['unrealizedPnl'])
-                    }
-        return None
+        with metrics.span('position', TRADE_CONFIG['symbol']):
+            positions = account_state.positions(TRADE_CONFIG['symbol'])
+        return parse_real_position(positions, TRADE_CONFIG['symbol'])
     except:
         return None
 
+def parse_real_position(positions, symbol):
+    """从 fetch_positions 结果中取出指定标的的持仓"""
+    for pos in positions:
+        if pos['symbol'] == symbol:
+            amt = float(pos['contracts'])
+            if amt > 0:
+                return {
+                    'side': pos['side'], 
+                    'size': amt,
+                    'pnl': float(pos['unrealizedPnl'])
+                }
+    return None
+
 # --- 5. DeepSeek 分析核心 (Prompt优化版) ---
 
 def analyze_market(data):
@@ -243,52 +398,159 @@ def analyze_market(data):
     
     # 1. 准备持仓信息 (根据模式选择来源)
     if TRADE_CONFIG['test_mode']:
-        pos = virtual_account
-        if pos['side']:
-            # 虚拟盈亏计算
-            diff = (data['price'] - pos['entry_price']) if pos['side'] == 'long' else (pos['entry_price'] - data['price'])
-            pnl = diff * pos['holdings'] * TRADE_CONFIG['contract_size']
-            pos_str = f"{pos['side']}仓 {pos['holdings']}张 (浮盈 {pnl:.2f} U)"
-        else:
-            pos_str = "空仓 (无持仓)"
+        ledger = get_paper_ledger()
+        pos_side = ledger.side
+        pos_str = format_position_text(data, TRADE_CONFIG, account=ledger)
     else:
         real_pos = get_real_position()
-        if real_pos:
-            pos_str = f"{real_pos['side']}仓 {real_pos['size']}张 (浮盈 {real_pos['pnl']:.2f} U)"
-        else:
-            pos_str = "空仓"
+        pos_side = real_pos['side'] if real_pos else None
+        pos_str = format_position_text(data, TRADE_CONFIG, real_pos=real_pos)
+
+    # 2. 行情与上次几乎一样时直接复用缓存决策
+    cache_key = None
+    if decision_cache:
+        cache_key = decision_cache.make_key(TRADE_CONFIG['symbol'], TRADE_CONFIG['timeframe'],
+                                            data['indicators'], pos_side)
+        cached = decision_cache.get(cache_key)
+        if cached:
+            print(f"♻️ 命中决策缓存，跳过 DeepSeek | {decision_cache.summary()}")
+            return cached
+
+    symbol = TRADE_CONFIG['symbol']
+    with metrics.span('prompt_build', symbol):
+        prompt = build_prompt(data, pos_str, TRADE_CONFIG)
 
-    # 2. 构建 K线数据字符串
-    kline_txt = ""
-    for k in data['kline_history']:
-        # 简单的K线描述: 时间 收盘价 涨跌幅
-        change = (k['close'] - k['open']) / k['open'] * 100
-        kline_txt += f"[{k['ts'].strftime('%H:%M')}] 收:{k['close']:.4f} 涨跌:{change:+.2f}% Vol:{k['vol']:.0f}\n"
+    try:
+        if llm_stream_enabled():
+            return analyze_market_stream(data, prompt, cache_key)
+
+        with metrics.span('llm_call', symbol):
+            response = run_llm(
+                deepseek_llm.complete(build_messages(prompt), llm_deadline(data, TRADE_CONFIG))
+            ).result()
+        print(f"⏱️ DeepSeek 延迟: {llm_latency.summary()}")
+        if prompt_cache_stats.record(getattr(response, 'usage', None)):
+            print(f"🧩 {prompt_cache_stats.summary()}")
+        if llm_cassette and llm_cassette.mode != 'off':
+            print(f"📼 {llm_cassette.summary()}")
+        
+        raw_content = response.choices[0].message.content
+        print(f"DeepSeek原始回复: {raw_content}")
+        with metrics.span('json_parse', symbol):
+            result = parse_ai_response(raw_content, data['price'])
+        if cache_key is not None:
+            decision_cache.put(cache_key, result)
+        return result
 
-    # 3. 构建 增强型 Prompt (关键！)
-    # 告诉AI具体数据，而不是模糊的概念，有助于它做数学判断
-    ind = data['indicators']
-    
-    prompt = f"""
+    except LLMDeadlineExceeded as e:
+        print(f"⌛ DeepSeek 超时: {e} | {llm_latency.summary()}")
+        return LLM_TIMEOUT_DECISION.copy()
+    except DecisionParseError as e:
+        print(f"🧩 DeepSeek 回复无法解析: {e} | {json_repair_stats.summary()}")
+        return LLM_UNPARSEABLE_DECISION.copy()
+    except Exception as e:
+        print(f"🧠 DeepSeek 思考失败: {e}")
+        return {"signal": "HOLD", "reason": "API连接错误", "confidence": "LOW"}
+
+LLM_TIMEOUT_DECISION = {"signal": "HOLD", "reason": "DeepSeek 超过截止时间，强制观望", "confidence": "LOW"}
+LLM_UNPARSEABLE_DECISION = {"signal": "HOLD", "reason": "AI回复无法解析，强制观望", "confidence": "LOW"}
+
+def run_llm(coro):
+    """把协程交给 LLM 事件循环线程，返回 concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, llm_loop)
+
+def llm_stream_enabled():
+    # 磁带只录制完整回复，开启时走非流式
+    return TRADE_CONFIG.get('llm_stream') and not (llm_cassette and llm_cassette.mode != 'off')
+
+def analyze_market_stream(data, prompt, cache_key):
+    """
+    流式请求 DeepSeek: signal + confidence 到齐即返回 (reason 等字段在后台继续接收，收完后打印并写入决策缓存)。
+    整条回复先结束 (或没解析出这两个字段) 时按非流式处理
+    """
+    early = Future()
+    with metrics.span('llm_call', TRADE_CONFIG['symbol']):
+        full = run_llm(deepseek_llm.stream(build_messages(prompt), llm_deadline(data, TRADE_CONFIG),
+                                           on_early=early.set_result))
+        wait([early, full], return_when=FIRST_COMPLETED)
+
+    with metrics.span('json_parse', TRADE_CONFIG['symbol']):
+        if not early.done():
+            return finish_llm_stream(full.result(), data['price'], cache_key, deepseek_llm)
+        # 回调在 LLM 线程里执行，只把结果排队；缓存 / 统计 / 打印留给下个周期开头在主线程处理
+        full.add_done_callback(lambda f: llm_stream_tails.put((f, data['price'], cache_key)))
+        return early_decision(early.result(), deepseek_llm)
+
+def drain_llm_stream_tails(log=print):
+    """处理上个周期已提前交出决策的流式回复 (写决策缓存、前缀缓存和 JSON 修复统计，打印完整理由)"""
+    while True:
+        try:
+            future, price, cache_key = llm_stream_tails.get_nowait()
+        except queue.Empty:
+            return
+        finish_llm_stream_tail(future, price, cache_key, deepseek_llm, log)
+
+def early_decision(fields, llm, log=print):
+    """流式提前交出的决策: 只有 signal / confidence，reason 稍后在完整回复里打印"""
+    log(f"⚡ DeepSeek 首token {llm.ttft_stats.samples[-1] * 1000:.0f}ms | "
+        f"决策 {llm.ttd_stats.samples[-1] * 1000:.0f}ms，先执行，理由继续接收中")
+    decision, _ = validate_decision({'signal': fields.get('signal'), 'confidence': fields.get('confidence'),
+                                     'reason': "(接收中，见后续完整回复)"})
+    return decision
+
+def finish_llm_stream(res, price, cache_key, llm, log=print):
+    """流式回复接收完毕: 打印延迟 / 原始回复，解析并写入决策缓存"""
+    ttd = f"{res['ttd'] * 1000:.0f}ms" if res['ttd'] is not None else "-"
+    log(f"⏱️ DeepSeek 首token {res['ttft'] * 1000:.0f}ms | 决策 {ttd} | 全部 {res['total'] * 1000:.0f}ms")
+    log(f"⏱️ 首token: {llm.ttft_stats.summary()} | 出决策: {llm.ttd_stats.summary()}")
+    if prompt_cache_stats.record(res['usage']):
+        log(f"🧩 {prompt_cache_stats.summary()}")
+    log(f"DeepSeek原始回复: {res['content']}")
+    result = parse_ai_response(res['content'], price, log)
+    if cache_key is not None:
+        decision_cache.put(cache_key, result)
+    return result
+
+def finish_llm_stream_tail(future, price, cache_key, llm, log=print):
+    """已提前交出决策后的收尾，作为流式任务 future 的 done 回调 (取消 / 异常只打印，不影响已经下的单)"""
+    if future.cancelled():
+        log("⚠️ DeepSeek 流式回复已取消，完整理由不再接收")
+        return
+    try:
+        result = finish_llm_stream(future.result(), price, cache_key, llm, log)
+        log(f"📝 完整逻辑: {result.get('reason', '无')}")
+        if result.get('stop_loss') or result.get('take_profit'):
+            log(f"🛑 建议止损: {result.get('stop_loss')} | 🎯 建议止盈: {result.get('take_profit')}")
+    except Exception as e:
+        log(f"⚠️ DeepSeek 流式回复收尾失败: {e}")
+
+def llm_deadline(data, cfg):
+    """
+    DeepSeek 截止时间 (time.time() 时间戳): 当前K线开盘 (即上一根收盘) + llm_deadline_sec。
+    启动时那次不在收盘点触发的调用 (距收盘已远超截止时间) 从现在起算。
+    """
+    candle_close = calendar.timegm(data['kline_history'][-1]['ts'].timetuple())
+    if time.time() - candle_close > 2 * cfg['llm_deadline_sec']:
+        return time.time() + cfg['llm_deadline_sec']
+    return candle_close + cfg['llm_deadline_sec']
+
+def format_position_text(data, cfg, account=None, real_pos=None):
+    """持仓描述 (模拟账户传 account 账本，实盘传 real_pos)"""
+    if account is not None:
+        if account.side:
+            return f"{account.side}仓 {account.holdings:g}张 (浮盈 {account.unrealized(data['price']):.2f} U)"
+        return "空仓 (无持仓)"
+    if real_pos:
+        return f"{real_pos['side']}仓 {real_pos['size']}张 (浮盈 {real_pos['pnl']:.2f} U)"
+    return "空仓"
+
+# 静态规则块: 角色 / 状态机 / 交易逻辑 / 输出格式，逐字节不变，放在 prompt 最前面以命中 DeepSeek 前缀缓存
+# (不要在这里插入任何随周期变化的内容)
+PROMPT_RULES = """
     【角色设定】
     你是一名华尔街资深量化交易员，擅长趋势跟踪、波段交易与风险控制。
     核心目标：本金安全 > 稳定盈利 > 扩大收益。
 
-    【市场快照】
-    交易标的：{TRADE_CONFIG['symbol']} ({TRADE_CONFIG['timeframe']})
-    当前价格：{data['price']}
-    当前持仓：{pos_str}
-
-    【技术面仪表盘】
-    1. 趋势（SMA20/60/120）：{ind['trend']} （SMA20偏离 {ind['sma20_dist']}%）
-    2. 动能（MACD）：{ind['macd']}（柱状图 {ind['macd_hist']}）
-    3. 强弱（RSI）：{ind['rsi']}（>70超买, <30超卖）
-    4. 波动（布林带%）：{ind['bb_pct']}（0=下轨反弹，1=上轨压力）
-    5. 波动率（ATR）：{ind['atr']}
-    6. 成交量状态：量比 {ind['vol_ratio']} ( >1.0 为放量，<1.0 为缩量，>2.0 为巨量)
-    7. 其他辅助：最近K线
-    {kline_txt}
-    
     ------------------------------------------------------------
     【核心交易框架：三相市场状态机（Regime Switching）】
     你必须先判断市场属于下列哪一种状态：
@@ -343,210 +605,340 @@ def analyze_market(data):
 
     ------------------------------------------------------------
     【最终输出任务】
-    基于以上所有信息、状态判断、共振信号以及高级逻辑，给出你的最终交易建议。
+    基于以上所有规则、状态判断、共振信号以及高级逻辑，结合文末的本周期数据，给出你的最终交易建议。
 
-    严格输出以下 JSON（无多余内容）：
-    {{
+    严格输出以下 JSON（无多余内容，字段按此顺序输出）：
+    {
         "signal": "BUY" (做多) 或 "SELL" (做空) 或 "HOLD" (观望),
+        "confidence": "HIGH" (高) 或 "MEDIUM" (中) 或 "LOW" (低),
         "trend_range_status": "TREND" | "RANGE" | "WEAKENING",
         "reason": "50字以内的硬核逻辑分析，（包含趋势状态 + 关键指标共振）",
         "stop_loss": 建议止损价 (数字或null),
-        "take_profit": 建议止盈价 (数字或null),
-        "confidence": "HIGH" (高) 或 "MEDIUM" (中) 或 "LOW" (低)
-    }}
+        "take_profit": 建议止盈价 (数字或null)
+    }
+"""
+
+def build_prompt(data, pos_str, cfg):
+    """构建 增强型 Prompt (关键！): 静态规则在前 (可缓存)，本周期数据在后"""
+    # 1. 构建 K线数据字符串
+    kline_txt = ""
+    for k in data['kline_history']:
+        # 简单的K线描述: 时间 收盘价 涨跌幅
+        change = (k['close'] - k['open']) / k['open'] * 100
+        kline_txt += f"[{k['ts'].strftime('%H:%M')}] 收:{k['close']:.4f} 涨跌:{change:+.2f}% Vol:{k['vol']:.0f}\n"
+
+    # 2. 告诉AI具体数据，而不是模糊的概念，有助于它做数学判断
+    ind = data['indicators']
+
+    # 3. 多周期上下文 (开启本地合成时才有)
+    mtf_txt = ""
+    for tf, m in (data.get('mtf') or {}).items():
+        mtf_txt += f"[{tf}] 趋势:{m['trend']} RSI:{m['rsi']} MACD柱:{m['macd_hist']} 布林%:{m['bb_pct']}\n"
+    if mtf_txt:
+        mtf_txt = "8. 多周期共振（高周期方向优先）：\n" + mtf_txt
+    
+    prompt = PROMPT_RULES + f"""
+    ------------------------------------------------------------
+    【本周期数据】
+    交易标的：{cfg['symbol']} ({cfg['timeframe']})
+    当前价格：{data['price']}
+    当前持仓：{pos_str}
+
+    【技术面仪表盘】
+    1. 趋势（SMA20/60/120）：{ind['trend']} （SMA20偏离 {ind['sma20_dist']}%）
+    2. 动能（MACD）：{ind['macd']}（柱状图 {ind['macd_hist']}）
+    3. 强弱（RSI）：{ind['rsi']}（>70超买, <30超卖）
+    4. 波动（布林带%）：{ind['bb_pct']}（0=下轨反弹，1=上轨压力）
+    5. 波动率（ATR）：{ind['atr']}
+    6. 成交量状态：量比 {ind['vol_ratio']} ( >1.0 为放量，<1.0 为缩量，>2.0 为巨量)
+    7. 其他辅助：最近K线
+    {kline_txt}
+    {mtf_txt}
+    
+    请基于以上规则分析本周期数据，严格按规定的 JSON 格式输出。
     """
 
-    try:
-        response = deepseek_client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "你是一个只输出JSON的量化交易引擎，不要输出任何Markdown格式。"},
-                {"role": "user", "content": prompt}
-            ],
-            stream=False,
-            temperature=0.1 # 低温度保证输出稳定
-        )
-        
-        raw_content = response.choices[0].message.content
-        print(f"DeepSeek原始回复: {raw_content}")
-        # 清洗可能存在的 markdown 符号
-        clean_content = re.sub(r'```json|```', '', raw_content).strip()
-        
-        result = json.loads(clean_content)
-        
-        # 简单校验
-        if result.get('signal') not in ['BUY', 'SELL', 'HOLD']:
-            result['signal'] = 'HOLD'
-            result['reason'] = 'AI返回格式异常，强制观望'
-            
-        return result
+    return prompt
 
-    except Exception as e:
-        print(f"🧠 DeepSeek 思考失败: {e}")
-        return {"signal": "HOLD", "reason": "API连接错误", "confidence": "LOW"}
+def build_messages(prompt):
+    return [
+        {"role": "system", "content": DEEPSEEK_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def parse_ai_response(raw_content, price=None, log=print):
+    """
+    解析 DeepSeek 回复: 本地容错修复 + 字段校验 (见 llm_json.parse_decision)，格式问题不再重新请求。
+    完全无法恢复时抛 DecisionParseError，由调用方兜底 HOLD
+    """
+    result, paths = parse_decision(raw_content, price)
+    json_repair_stats.record(paths)
+    if paths:
+        log(f"🩹 回复已本地修复/校正 ({', '.join(paths)}) | {json_repair_stats.summary()}")
+    return result
 
 # --- 6. 交易执行函数 (双模式) ---
 
 def execute_trade(signal, current_price):
     """执行交易指令"""
-    sig = signal['signal']
-    reason = signal.get('reason', '无')
-    conf = signal.get('confidence', 'LOW')
-    
-    print(f"🤖 AI指令: 【{sig}】 信心:{conf}")
-    print(f"📝 逻辑: {reason}")
-    if signal.get('stop_loss'):
-        print(f"🛑 建议止损: {signal['stop_loss']}")
-
-    # 过滤低信心信号
-    if conf == 'LOW' and sig != 'HOLD':
-        print("⚠️ 信心不足，放弃操作")
+    if TRADE_CONFIG['test_mode']:
+        settle_paper_funding(get_paper_ledger(), current_price, server_clock.now_ms(), TRADE_CONFIG)
+    sig = review_signal(signal)
+    if sig is None:
         return
 
     # ---------------- 模式 A: 模拟账户 (Test Mode) ----------------
     if TRADE_CONFIG['test_mode']:
-        global virtual_account
-        v_pos = virtual_account
-        contract_val = TRADE_CONFIG['contract_size']
-        
-        print(f"🧪 [模拟账户] 余额: {v_pos['balance']:.2f} U")
-
-        # 模拟买入
-        if sig == 'BUY':
-            # 平空
-            if v_pos['side'] == 'short':
-                pnl = (v_pos['entry_price'] - current_price) * v_pos['holdings'] * contract_val
-                v_pos['balance'] += pnl
-                print(f"🔄 模拟平空 | 盈亏: {pnl:+.2f} U")
-                v_pos['side'] = None
-            
-            # 开多
-            if v_pos['side'] is None:
-                cost = current_price * TRADE_CONFIG['amount'] * contract_val / TRADE_CONFIG['leverage']
-                if cost > v_pos['balance']:
-                    print("⚠️ 模拟余额不足")
-                else:
-                    v_pos['side'] = 'long'
-                    v_pos['entry_price'] = current_price
-                    v_pos['holdings'] = TRADE_CONFIG['amount']
-                    print(f"🚀 模拟开多 | 均价: {current_price}")
-
-        # 模拟卖出
-        elif sig == 'SELL':
-            # 平多
-            if v_pos['side'] == 'long':
-                pnl = (current_price - v_pos['entry_price']) * v_pos['holdings'] * contract_val
-                v_pos['balance'] += pnl
-                print(f"🔄 模拟平多 | 盈亏: {pnl:+.2f} U")
-                v_pos['side'] = None
-            
-            # 开空
-            if v_pos['side'] is None:
-                cost = current_price * TRADE_CONFIG['amount'] * contract_val / TRADE_CONFIG['leverage']
-                if cost > v_pos['balance']:
-                    print("⚠️ 模拟余额不足")
-                else:
-                    v_pos['side'] = 'short'
-                    v_pos['entry_price'] = current_price
-                    v_pos['holdings'] = TRADE_CONFIG['amount']
-                    print(f"🐻 模拟开空 | 均价: {current_price}")
-        
+        with metrics.span('order', TRADE_CONFIG['symbol']):
+            simulate_trade(get_paper_ledger(), sig, current_price, TRADE_CONFIG, server_clock.now_ms())
         return
 
     # ---------------- 模式 B: 实盘账户 (Live Mode) ----------------
+    signal_at = time.perf_counter()
     try:
         real_pos = get_real_position()
         
         # 资金检查 (放宽到95%)
-        bal = exchange.fetch_balance()['USDT']['free']
-        cost = current_price * TRADE_CONFIG['amount'] * TRADE_CONFIG['contract_size'] / TRADE_CONFIG['leverage']
-        
-        if cost > bal * 0.95:
-            print(f"💸 实盘余额不足! 需{cost:.2f}, 有{bal:.2f}")
+        with metrics.span('position', TRADE_CONFIG['symbol']):
+            bal = account_state.balance()['USDT']['free']
+        if not check_live_balance(bal, current_price, TRADE_CONFIG):
             return
 
-        # 执行下单
-        if sig == 'BUY':
-            if real_pos and real_pos['side'] == 'short':
-                print("🔄 实盘平空...")
-                exchange.create_market_order(TRADE_CONFIG['symbol'], 'buy', real_pos['size'], params={'reduceOnly': True})
-                time.sleep(2)
-            
-            if not real_pos or real_pos['side'] == 'short':
-                print("🚀 实盘开多...")
-                exchange.create_market_order(TRADE_CONFIG['symbol'], 'buy', TRADE_CONFIG['amount'])
-
-        elif sig == 'SELL':
-            if real_pos and real_pos['side'] == 'long':
-                print("🔄 实盘平多...")
-                exchange.create_market_order(TRADE_CONFIG['symbol'], 'sell', real_pos['size'], params={'reduceOnly': True})
-                time.sleep(2)
-            
-            if not real_pos or real_pos['side'] == 'long':
-                print("🐻 实盘开空...")
-                exchange.create_market_order(TRADE_CONFIG['symbol'], 'sell', TRADE_CONFIG['amount'])
+        # 执行下单 (轮询确认成交，不再固定 sleep)
+        orders = plan_live_orders(sig, real_pos, TRADE_CONFIG)
+        if not orders:
+            return
+        for order in orders:
+            print(order['msg'])
+        with metrics.span('order', TRADE_CONFIG['symbol']):
+            try:
+                filled = submit_orders(exchange, orders, TRADE_CONFIG.get('order_fill'))
+            finally:
+                account_state.on_fill(TRADE_CONFIG['symbol'])
+        report_fill(filled, signal_at, fill_latency, TRADE_CONFIG.get('reversal', 'sequential') if real_pos else 'open')
 
     except Exception as e:
         print(f"❌ 实盘下单错误: {e}")
 
-# --- 7. 主循环 ---
-def wait_until_next_candle():
-    """通用型K线对齐函数：支持任意分钟周期的精准对齐"""
-    now = datetime.now()
-    tf_str = TRADE_CONFIG['timeframe']
-    
-    # 1. 解析周期 (提取分钟数)
-    if tf_str.endswith('m'):
-        interval_min = int(tf_str[:-1]) # '15m' -> 15
-    elif tf_str.endswith('h'):
-        interval_min = int(tf_str[:-1]) * 60 # '1h' -> 60
-    else:
-        # 如果是其他奇怪的周期（如1d），默认睡1分钟
-        print(f"⚠️ 未知周期格式 {tf_str}，默认等待1分钟")
-        return 60
-
-    # 2. 计算下一个整点分钟
-    # 例如当前 13:12, 周期 5m -> 下个点是 13:15
-    # 例如当前 13:12, 周期 15m -> 下个点是 13:15
-    current_total_min = now.minute
-    
-    # 下一个周期的分钟数
-    next_cycle_min = ((current_total_min // interval_min) + 1) * interval_min
-    
-    # 计算需要等待的分钟数
-    wait_minutes = next_cycle_min - current_total_min
-    
-    # 如果下一个周期跨越了小时（比如 55分 + 15分 = 70分），逻辑依然成立，因为我们只关心差值
-    # 但为了精确计算秒数，我们将其转换为秒
-    
-    # 核心算法：(需要等待的完整分钟数 - 1) * 60 + (60 - 当前秒数)
-    # 减1是因为当前这1分钟还没过完
-    
-    seconds = (wait_minutes - 1) * 60 + (60 - now.second)
+def review_signal(signal):
+    """打印AI指令并过滤低信心信号，返回可执行的信号 (None=放弃操作)"""
+    sig = signal['signal']
+    reason = signal.get('reason', '无')
+    conf = signal.get('confidence', 'LOW')
     
-    # 防止极端情况（比如刚好在00秒运行，可能算出负数或0）
-    if seconds <= 0:
-        seconds += interval_min * 60
+    print(f"🤖 AI指令: 【{sig}】 信心:{conf}")
+    print(f"📝 逻辑: {reason}")
+    if signal.get('stop_loss'):
+        print(f"🛑 建议止损: {signal['stop_loss']}")
 
-    print(f"⏳ 周期[{tf_str}] | 当前 {now.strftime('%H:%M:%S')} | 等待 {int(seconds/60)}分 {seconds%60}秒 到达下一K线...")
-    return seconds
+    # 过滤低信心信号
+    if conf == 'LOW' and sig != 'HOLD':
+        print("⚠️ 信心不足，放弃操作")
+        return None
+    return sig
+
+def open_paper_ledger(cfg, log=print):
+    """按 cfg['paper_ledger'] 打开 (或新建) 该标的的模拟账本，已有事件文件时从快照接着回放"""
+    opts = cfg.get('paper_ledger')
+    if not opts:
+        return PaperLedger(taker_fee=0.0)
+    path = ledger_path(opts['path'], cfg['symbol']) if opts.get('path') else None
+    ledger = PaperLedger(path, opts.get('balance', 100.0), opts.get('taker_fee', 0.0),
+                         opts.get('slippage_bps', 0.0), opts.get('snapshot_every', 200))
+    if path:
+        log(f"📒 模拟账本 {path} (回放 {ledger.replayed} 条事件) | {ledger.summary()}")
+    return ledger
+
+def get_paper_ledger():
+    global paper_ledger
+    if paper_ledger is None:
+        paper_ledger = open_paper_ledger(TRADE_CONFIG)
+    return paper_ledger
+
+def fixed_funding_rate(cfg):
+    """配置了固定资金费率则返回它，None 表示要查交易所"""
+    opts = cfg.get('paper_ledger')
+    return opts.get('funding_rate', 0.0) if opts else 0.0
+
+def apply_paper_funding(ledger, due, rate, mark, log=print):
+    for ts in due:
+        event = ledger.settle_funding(ts, rate, mark)
+        log(f"💱 模拟资金费 {time.strftime('%m-%d %H:%M', time.gmtime(ts / 1000))} UTC 费率 {rate:.4%} | "
+            f"{'付出' if event['amount'] >= 0 else '收到'} {abs(event['amount']):.4f} U")
+
+def settle_paper_funding(ledger, mark, now_ms, cfg, log=print):
+    """持仓经过资金费结算点时记账 (只有到点才查一次费率，平时不增加请求)"""
+    due = ledger.funding_due(now_ms)
+    if not due:
+        return
+    rate = fixed_funding_rate(cfg)
+    if rate is None:
+        try:
+            rate = float(exchange.fetch_funding_rate(cfg['symbol'])['fundingRate'])
+        except Exception as e:
+            log(f"⚠️ 资金费率获取失败，下周期再结算: {e}")
+            return
+    apply_paper_funding(ledger, due, rate, mark, log)
+
+def simulate_trade(ledger, sig, current_price, cfg, now_ms, log=print):
+    """模拟账户成交: 反手时先平后开，每笔成交按滑点 / 手续费结算并记入账本"""
+    contract_val = cfg['contract_size']
+    side = {'BUY': 'buy', 'SELL': 'sell'}.get(sig)
 
-def job():
+    log(f"🧪 [模拟账户] {ledger.summary(current_price)}")
+    if side is None:
+        return
+    target = 'long' if side == 'buy' else 'short'
+
+    # 平掉反向持仓
+    if ledger.side and ledger.side != target:
+        before = ledger.balance
+        closing = '平空' if ledger.side == 'short' else '平多'
+        ledger.fill(side, ledger.holdings, current_price, contract_val, now_ms)
+        log(f"🔄 模拟{closing} | 盈亏: {ledger.balance - before:+.2f} U (已扣手续费)")
+
+    # 开仓
+    if ledger.side is None:
+        cost = current_price * cfg['amount'] * contract_val / cfg['leverage']
+        if cost > ledger.balance:
+            log("⚠️ 模拟余额不足")
+        else:
+            event = ledger.fill(side, cfg['amount'], current_price, contract_val, now_ms)
+            log(f"{'🚀 模拟开多' if target == 'long' else '🐻 模拟开空'} | 均价: {event['price']:.8g} | "
+                f"手续费 {event['fee']:.4f} U")
+
+def check_live_balance(bal, current_price, cfg):
+    """实盘资金检查 (放宽到95%)"""
+    cost = current_price * cfg['amount'] * cfg['contract_size'] / cfg['leverage']
+    if cost > bal * 0.95:
+        print(f"💸 实盘余额不足! 需{cost:.2f}, 有{bal:.2f}")
+        return False
+    return True
+
+def plan_live_orders(sig, real_pos, cfg):
+    """根据信号和当前实盘持仓，生成需要发送的市价单 (反手按 cfg['reversal'] 合并)"""
+    side = {'BUY': 'buy', 'SELL': 'sell'}.get(sig)
+    if side is None:
+        return []
+    opposite = 'short' if side == 'buy' else 'long'
+    if real_pos and real_pos['side'] != opposite:
+        return []  # 已持有同向仓位
+
+    open_msg = "🚀 实盘开多..." if side == 'buy' else "🐻 实盘开空..."
+    open_order = {'msg': open_msg, 'symbol': cfg['symbol'], 'side': side, 'amount': cfg['amount'], 'params': {}}
+    if not real_pos:
+        return [open_order]
+
+    mode = cfg.get('reversal', 'sequential')
+    if mode == 'net':
+        # 单向持仓模式下一笔 (持仓 + 新开) 张数的反向单即完成反手
+        arrow = "空→多" if side == 'buy' else "多→空"
+        return [{'msg': f"🔄 实盘反手 {arrow} (净额单)...", 'symbol': cfg['symbol'], 'side': side,
+                 'amount': real_pos['size'] + cfg['amount'], 'params': {}}]
+
+    close_msg = "🔄 实盘平空..." if side == 'buy' else "🔄 实盘平多..."
+    close_order = {'msg': close_msg, 'symbol': cfg['symbol'], 'side': side,
+                   'amount': real_pos['size'], 'params': {'reduceOnly': True}}
+    if mode == 'batch':
+        close_order['batch'] = open_order['batch'] = True
+    return [close_order, open_order]
+
+def report_fill(filled, signal_at, stats, mode):
+    """打印 信号 -> 成交 延迟并记入统计"""
+    elapsed = time.perf_counter() - signal_at
+    stats.record(elapsed, mode)
+    avg = [o.get('average') for o in filled if o.get('average')]
+    print(f"⚡ 信号→成交 {elapsed * 1000:.0f}ms ({len(filled)}笔, {mode})" +
+          (f" 成交均价 {avg[-1]}" if avg else "") + f" | {stats.summary()}")
+
+# --- 7. 主循环 ---
+def job(ohlcv=None):
+    """一次完整的策略周期；ws 模式传入事件循环线程里取好的K线快照 (见 run_ws_mode)"""
     print("\n" + "="*50)
     print(f"⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} K线收盘，开始执行策略")
+    drain_llm_stream_tails()
+    if not TRADE_CONFIG['test_mode']:
+        # 持仓/余额在后台预取，与K线确认和行情请求重叠
+        account_state.begin_cycle(TRADE_CONFIG['symbol'])
+
+    if TRADE_CONFIG.get('candle_confirm') and not ws_feed:
+        # ws 模式收到的就是已确认的收盘推送，无需再确认
+        with metrics.span('candle_confirm', TRADE_CONFIG['symbol']):
+            confirm_candle_close(exchange.fetch_ohlcv, TRADE_CONFIG['symbol'], TRADE_CONFIG['timeframe'],
+                                 server_clock, TRADE_CONFIG['candle_confirm'])
     
-    data = get_market_data()
+    data = get_market_data(ohlcv)
     if not data:
         print("⚠️ 数据获取失败，跳过本次")
+        metrics.end_cycle(TRADE_CONFIG['symbol'])
         return
 
     print(f"💎 标的: {TRADE_CONFIG['symbol']} | 现价: {data['price']}")
     
     decision = analyze_market(data)
     execute_trade(decision, data['price'])
+    print(f"🔌 {http_pool.stats.summary()}")
+    if not TRADE_CONFIG['test_mode']:
+        print(f"🏦 {account_state.summary()}")
+    cycle = metrics.end_cycle(TRADE_CONFIG['symbol'])
+    if cycle:
+        print(f"⏱️ 本周期耗时 {cycle['total_ms']:.0f} ms: " +
+              ", ".join(f"{k} {v:.0f}" for k, v in cycle['stages_ms'].items()))
     print("="*50 + "\n")
 
+async def run_ws_mode():
+    """WebSocket 模式: 每收到一根已收盘K线就在后台任务 (工作线程) 里跑一次 job() (上一轮未结束则跳过)"""
+    global ws_feed
+    symbol, tf = TRADE_CONFIG['symbol'], TRADE_CONFIG['timeframe']
+    limit = TRADE_CONFIG['data_points']
+    running = None  # 正在跑的 job 任务 (同时用来保留引用，防止任务被垃圾回收)
+
+    async def backfill(since):
+        if since is None:
+            return await asyncio.to_thread(exchange.fetch_ohlcv, symbol, tf, limit=limit)
+        return await asyncio.to_thread(fetch_ohlcv_since, exchange, symbol, tf, since, server_clock.now_ms())
+
+    def snapshot():
+        # K线快照在事件循环线程里取: 工作线程里读 ws_feed.closed 会与读循环的追加同时发生
+        # 还没有K线时返回 None，job 按 REST 取数
+        return ws_feed.ohlcv(limit) if ws_feed.ready else None
+
+    async def run_job(ohlcv):
+        try:
+            await asyncio.to_thread(job, ohlcv)
+        except Exception as e:
+            print(f"❌ 策略执行异常: {e}")
+
+    async def on_close(candle):
+        # on_close 由 ws 读循环直接 await: job 放进后台任务，读循环继续收心跳和推送
+        nonlocal running
+        if candle_store:
+            await asyncio.to_thread(candle_store.append, symbol, tf, [candle])
+        if running is not None and not running.done():
+            print("⚠️ 上一轮策略仍在执行，跳过本根K线")
+            return
+        running = asyncio.create_task(run_job(snapshot()))
+
+    try:
+        inst_id = exchange.market_id(symbol)
+    except Exception:
+        inst_id = okx_inst_id(symbol)
+    ws_feed = CandleFeed(inst_id, tf, exchange.parse_timeframe(tf) * 1000, on_close, backfill,
+                         url=TRADE_CONFIG['ws_feed']['url'], clock=exchange.milliseconds)
+    await ws_feed.warm_up()
+    print("🚀 启动立即执行一次分析...")
+    await asyncio.to_thread(job, snapshot())
+    await ws_feed.run()
+
 def main():
+    # 重模块在后台预导入，与交易所初始化的网络请求重叠
+    heavy = ['openai']
+    if not TRADE_CONFIG.get('incremental_indicators') and TRADE_CONFIG.get('indicator_backend') == 'pandas':
+        heavy += ['pandas', 'indicators']
+    if (TRADE_CONFIG.get('ws_feed') or {}).get('enabled'):
+        heavy += ['aiohttp']
+    warm_imports(heavy)
+
     # 启用日志
     sys.stdout = Logger()
     
@@ -558,28 +950,29 @@ def main():
         print("❌ 无法启动，请检查API配置")
         return
 
-    # 1. 启动时先立刻跑一次，看一眼当前状态
-    print("🚀 启动立即执行一次分析...")
-    job()
+    if TRADE_CONFIG.get('metrics'):
+        metrics.serve(TRADE_CONFIG['metrics']['port'])
+        print(f"📈 指标端点: http://127.0.0.1:{TRADE_CONFIG['metrics']['port']}/metrics")
 
-    # 2. 进入死循环，永远等待下一个整点
-    while True:
+    if (TRADE_CONFIG.get('ws_feed') or {}).get('enabled'):
+        print(f"📡 行情模式: WebSocket ({TRADE_CONFIG['ws_feed']['url']})")
         try:
-            # 计算需要睡多久
-            sleep_sec = wait_until_next_candle()
-            
-            # 睡觉 (为了防止睡过头，稍微多睡1秒确保K线生成)
-            time.sleep(sleep_sec + 2) 
-            
-            # 睡醒了，干活
-            job()
-            
+            asyncio.run(run_ws_mode())
         except KeyboardInterrupt:
             print("🛑 程序已停止")
-            break
-        except Exception as e:
-            print(f"⚠️ 主进程错误: {e}")
-            time.sleep(10)
+        return
+
+    # 1. 启动时先立刻跑一次，看一眼当前状态
+    print("🚀 启动立即执行一次分析...")
+    job()
+
+    # 2. 按交易所服务器时间对齐K线收盘，永远等待下一个整点 (到点后由 job() 轮询确认新K线)
+    scheduler = CandleScheduler(server_clock, delay_sec=0 if TRADE_CONFIG.get('candle_confirm') else 2)
+    scheduler.add(f"{TRADE_CONFIG['symbol']} {TRADE_CONFIG['timeframe']}", TRADE_CONFIG['timeframe'], job)
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        print(f"🛑 程序已停止 | {scheduler.summary()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,241 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from indicators import calculate_technical_indicators
+from indicator_engine import build_market_snapshot
+from candle_store import CandleStore
+
+# --- 向量化回测 ---
+# 1. 历史K线一次性算出与 calculate_technical_indicators 相同的指标列
+# 2. 决策函数对全部K线一次给出信号数组 (1=BUY, -1=SELL, 0=HOLD)
+# 3. 按 execute_trade 模拟账户的多空逻辑结算，全程使用 NumPy 数组
+
+SIGNAL_CODES = {'BUY': 1, 'SELL': -1, 'HOLD': 0}
+WARMUP_BARS = 120  # 与 get_market_data 一致：不足120根不出信号
+
+DEFAULT_ACCOUNT = {
+    'balance': 100.0,       # 与模拟账本 (paper_ledger) 初始本金一致
+    'amount': 1,            # 每次交易合约张数
+    'leverage': 3,
+    'contract_size': 1.0,   # 1张 = N 个币
+}
+
+
+# --- 1. 数据加载 ---
+
+def load_candles(symbol, timeframe, root='data/candles', limit=None):
+    """从本地K线仓库读取 (见 candle_store.py)"""
+    store = CandleStore(root)
+    n = store.count(symbol, timeframe)
+    start = 0 if limit is None else max(0, n - limit)
+    cols = {col: np.asarray(store.column(symbol, timeframe, col)[start:])
+            for col in ('ts', 'open', 'high', 'low', 'close', 'vol')}
+    return candles_to_frame(cols)
+
+
+def load_csv(path):
+    """CSV 需包含 ts(毫秒), open, high, low, close, vol 列"""
+    return candles_to_frame(pd.read_csv(path))
+
+
+def candles_to_frame(cols):
+    df = pd.DataFrame({k: cols[k] for k in ('ts', 'open', 'high', 'low', 'close', 'vol')})
+    df['ts'] = pd.to_datetime(df['ts'], unit='ms')
+    return df
+
+
+def download_history(symbol, timeframe, days, root='data/candles'):
+    """从 OKX 分页下载历史K线写入本地仓库 (只下载仓库里还没有的部分)"""
+    import ccxt
+    exchange = ccxt.okx({'options': {'defaultType': 'swap'}})
+    store = CandleStore(root)
+    tf_ms = exchange.parse_timeframe(timeframe) * 1000
+    last_ts = store.last_ts(symbol, timeframe)
+    since = last_ts + tf_ms if last_ts else exchange.milliseconds() - days * 86400 * 1000
+    while True:
+        batch = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=100)
+        # 最后一根未收盘，不入库
+        closed = [k for k in batch if k[0] + tf_ms <= exchange.milliseconds()]
+        if not closed:
+            break
+        store.append(symbol, timeframe, closed)
+        since = closed[-1][0] + tf_ms
+        print(f"📥 已下载至 {pd.to_datetime(closed[-1][0], unit='ms')} (共 {store.count(symbol, timeframe)} 根)")
+        time.sleep(exchange.rateLimit / 1000)
+    return store.count(symbol, timeframe)
+
+
+# --- 2. 决策函数 ---
+
+def to_signal_array(signals, n):
+    """决策函数返回值 -> int8 信号数组 (支持 'BUY'/'SELL'/'HOLD' 字符串)"""
+    arr = np.asarray(signals)
+    if arr.dtype.kind in 'OUS':
+        arr = np.vectorize(lambda s: SIGNAL_CODES.get(s, 0), otypes=[np.int8])(arr)
+    arr = np.sign(arr).astype(np.int8)
+    if arr.shape != (n,):
+        raise ValueError(f"决策函数应返回长度为 {n} 的信号数组，实际为 {arr.shape}")
+    return arr
+
+
+def sma_rsi_rule(df):
+    """示例规则: 多头排列且 RSI 未超买 -> 做多；空头排列且 RSI 未超卖 -> 做空"""
+    bull = (df['close'] > df['sma_20']) & (df['sma_20'] > df['sma_60']) & (df['sma_60'] > df['sma_120'])
+    bear = (df['close'] < df['sma_20']) & (df['sma_20'] < df['sma_60']) & (df['sma_60'] < df['sma_120'])
+    return np.where(bull & (df['rsi'] < 70), 1, np.where(bear & (df['rsi'] > 30), -1, 0))
+
+
+def per_bar_decision(fn, history=6):
+    """
+    把 analyze_market 风格的逐根决策函数 fn(data) -> {'signal': ..., 'confidence': ...}
+    包装成回测决策函数；data 结构与 get_market_data 返回值相同。低信心信号按 HOLD 处理。
+    """
+    def decide(df):
+        records = df.to_dict('records')
+        out = np.zeros(len(records), dtype=np.int8)
+        for i in range(WARMUP_BARS - 1, len(records)):
+            data = build_market_snapshot(records[i], records[max(0, i - history + 1):i + 1])
+            data['ts'] = records[i]['ts'].strftime('%Y-%m-%d %H:%M:%S')
+            decision = fn(data)
+            if decision.get('confidence', 'LOW') == 'LOW':
+                continue
+            out[i] = SIGNAL_CODES.get(decision.get('signal'), 0)
+        return out
+    return decide
+
+
+# --- 3. 账户模拟 ---
+
+def _events_unconstrained(sig):
+    """不考虑余额约束时的持仓变化点: 持仓方向 = 最近一次非 HOLD 信号"""
+    idx = np.where(sig != 0, np.arange(len(sig)), -1)
+    np.maximum.accumulate(idx, out=idx)
+    side = np.where(idx >= 0, sig[np.maximum(idx, 0)], 0)
+    prev = np.concatenate(([0], side[:-1]))
+    t = np.flatnonzero(side != prev)
+    return t, side[t]
+
+
+def _events_with_balance(sig, close, cfg):
+    """
+    余额不足时会跳过开仓，持仓状态依赖路径，只能顺序处理；
+    但只遍历有信号的K线，而不是逐根更新 dict。
+    """
+    unit = cfg['amount'] * cfg['contract_size']
+    balance, side, entry = cfg['balance'], 0, 0.0
+    ts, sides = [], []
+    for i in np.flatnonzero(sig):
+        s = int(sig[i])
+        if s == side:
+            continue
+        price = close[i]
+        if side != 0:
+            balance += side * (price - entry) * unit
+            side = 0
+        if price * unit / cfg['leverage'] <= balance:
+            side, entry = s, price
+        ts.append(i)
+        sides.append(side)
+    return np.asarray(ts, dtype=np.int64), np.asarray(sides, dtype=np.int8)
+
+
+def simulate_account(sig, close, cfg=None):
+    """按 execute_trade 模拟账户逻辑结算，返回权益曲线与逐笔成交"""
+    cfg = dict(DEFAULT_ACCOUNT, **(cfg or {}))
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    unit = cfg['amount'] * cfg['contract_size']
+
+    def settle(t, sides):
+        prev_sides = np.r_[0, sides][:-1].astype(np.int8)
+        prev_t = np.r_[0, t][:-1].astype(np.int64)
+        realized = prev_sides * (close[t] - close[prev_t]) * unit
+        balance_after = cfg['balance'] + np.cumsum(realized)
+        return prev_sides, realized, balance_after
+
+    t, sides = _events_unconstrained(sig)
+    prev_sides, realized, balance_after = settle(t, sides)
+    # 快速路径有效的前提: 每次开仓时余额都够
+    opened = sides != 0
+    cost = close[t] * unit / cfg['leverage']
+    if np.any(cost[opened] > balance_after[opened]):
+        t, sides = _events_with_balance(sig, close, cfg)
+        prev_sides, realized, balance_after = settle(t, sides)
+
+    # 逐根展开: 持仓方向 / 开仓价 / 已实现余额
+    pos_idx = np.searchsorted(t, np.arange(n), side='right') - 1
+    has_event = pos_idx >= 0
+    safe_idx = np.maximum(pos_idx, 0)
+    side = np.where(has_event, sides[safe_idx] if len(t) else 0, 0)
+    entry = np.where(has_event, close[t[safe_idx]] if len(t) else 0.0, 0.0)
+    balance = np.where(has_event, balance_after[safe_idx] if len(t) else cfg['balance'], cfg['balance'])
+    equity = balance + side * (close - entry) * unit
+
+    closes = prev_sides != 0
+    trades = {
+        'exit_idx': t[closes],
+        'side': prev_sides[closes],
+        'pnl': realized[closes],
+    }
+    return {'equity': equity, 'position': side, 'trades': trades, 'config': cfg}
+
+
+def summarize(result):
+    equity, pnl = result['equity'], result['trades']['pnl']
+    peak = np.maximum.accumulate(equity)
+    drawdown = np.max((peak - equity) / peak) if len(equity) else 0.0
+    start = result['config']['balance']
+    return {
+        'final_equity': float(equity[-1]) if len(equity) else start,
+        'pnl': float(equity[-1] - start) if len(equity) else 0.0,
+        'return_pct': float((equity[-1] / start - 1) * 100) if len(equity) else 0.0,
+        'max_drawdown_pct': float(drawdown * 100),
+        'trades': int(len(pnl)),
+        'win_rate': float(np.mean(pnl > 0)) if len(pnl) else 0.0,
+    }
+
+
+def run_backtest(df, decide=sma_rsi_rule, account=None, indicators_ready=False):
+    """df: ts/open/high/low/close/vol 的K线 DataFrame；decide: 决策函数 df -> 信号数组"""
+    if not indicators_ready:
+        df = calculate_technical_indicators(df.copy())
+    sig = to_signal_array(decide(df), len(df))
+    sig[:WARMUP_BARS - 1] = 0
+    result = simulate_account(sig, df['close'].to_numpy(), account)
+    result['signals'] = sig
+    result['summary'] = summarize(result)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量化回测 (默认使用示例规则 sma_rsi_rule)")
+    parser.add_argument('--symbol', default='DOGE/USDT:USDT')
+    parser.add_argument('--timeframe', default='15m')
+    parser.add_argument('--csv', help="从 CSV 读取K线，而不是本地K线仓库")
+    parser.add_argument('--download-days', type=int, default=0, help="先从 OKX 补齐最近 N 天历史")
+    parser.add_argument('--amount', type=float, default=DEFAULT_ACCOUNT['amount'])
+    parser.add_argument('--leverage', type=float, default=DEFAULT_ACCOUNT['leverage'])
+    parser.add_argument('--contract-size', type=float, default=DEFAULT_ACCOUNT['contract_size'])
+    args = parser.parse_args()
+
+    if args.download_days:
+        download_history(args.symbol, args.timeframe, args.download_days)
+    df = load_csv(args.csv) if args.csv else load_candles(args.symbol, args.timeframe)
+    if len(df) < WARMUP_BARS:
+        print(f"⚠️ K线不足 {WARMUP_BARS} 根，无法回测")
+        return
+
+    start = time.perf_counter()
+    result = run_backtest(df, account={'amount': args.amount, 'leverage': args.leverage,
+                                       'contract_size': args.contract_size})
+    elapsed = time.perf_counter() - start
+
+    print(f"📊 {args.symbol} {args.timeframe} | {len(df)} 根K线 | 耗时 {elapsed*1000:.1f} ms")
+    for k, v in result['summary'].items():
+        print(f"   {k}: {v:.4f}" if isinstance(v, float) else f"   {k}: {v}")
+
+
+if __name__ == "__main__":
+    main()
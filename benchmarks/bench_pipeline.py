@@ -0,0 +1,195 @@
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import itertools
+import tempfile
+import contextlib
+from datetime import datetime
+
+import pandas as pd
+
+# 基准测试: job() 各阶段在假交易所 / 假 DeepSeek 上的耗时
+#   python benchmarks/bench_pipeline.py                       # 跑一遍并保存结果
+#   python benchmarks/bench_pipeline.py --baseline old.json   # 与旧结果对比，退化超过阈值则退出码为 1
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DEEPSEEK_API_KEY', 'bench')  # 只为通过客户端构造检查，不会发请求
+
+import app_v2 as bot
+from candle_store import CandleStore
+from indicators import calculate_technical_indicators
+from indicator_kernels import IndicatorKernels
+from metrics import StageMetrics
+from paper_ledger import PaperLedger
+from fakes import FakeExchange, FakeLLM, FAKE_REPLY
+
+CANDLE_COUNTS = [150, 500, 2000]
+SYMBOL_COUNTS = [1, 4, 12]
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+def measure(fn, repeat, setup=None):
+    """返回每次调用耗时 (微秒) 的中位数 / p95"""
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - start) / 1000)
+    samples.sort()
+    return {'median_us': samples[len(samples) // 2],
+            'p95_us': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            'repeat': repeat}
+
+
+def install_fakes(candles):
+    """把 app_v2 的交易所和 LLM 换成进程内替身"""
+    fake = FakeExchange(timeframe=bot.TRADE_CONFIG['timeframe'])
+    bot.exchange = fake
+    bot.deepseek_llm.client = FakeLLM()
+    bot.deepseek_llm.hedge_after = None
+    bot.decision_cache = None
+    bot.candle_store = None
+    bot.indicator_engines.clear()
+    bot.metrics = StageMetrics(jsonl_path=None)  # 保留埋点开销，但不写文件
+    bot.TRADE_CONFIG['data_points'] = candles
+    bot.TRADE_CONFIG['contract_size'] = 10.0
+    bot.TRADE_CONFIG['test_mode'] = True
+    # 模拟账本只在内存记账 (execute_trade 单项另测写文件的开销)
+    bot.TRADE_CONFIG['paper_ledger'] = dict(bot.TRADE_CONFIG['paper_ledger'], path=None, funding_rate=0.0001)
+    bot.paper_ledger = None
+    bot.TRADE_CONFIG['candle_confirm'] = None  # 只测计算开销，不等待K线确认
+    return fake
+
+
+def bench_stages(candles, repeat):
+    fake = install_fakes(candles)
+    symbol = bot.TRADE_CONFIG['symbol']
+    results = {}
+
+    ohlcv = fake.fetch_ohlcv(symbol, limit=candles)
+    frame = pd.DataFrame(ohlcv, columns=['ts', 'open', 'high', 'low', 'close', 'vol'])
+    frame['ts'] = pd.to_datetime(frame['ts'], unit='ms')
+    results['calculate_technical_indicators'] = measure(
+        lambda: calculate_technical_indicators(frame.copy()), repeat)
+    kernels = IndicatorKernels()
+    results['indicator_kernels'] = measure(lambda: kernels.from_ohlcv(ohlcv), repeat)
+
+    # get_market_data: pandas 全量 / NumPy 内核全量 / 增量引擎 / 增量引擎 + 本地K线仓库
+    bot.TRADE_CONFIG['incremental_indicators'] = False
+    bot.TRADE_CONFIG['indicator_backend'] = 'pandas'
+    results['get_market_data[pandas]'] = measure(bot.get_market_data, repeat)
+    bot.TRADE_CONFIG['indicator_backend'] = 'numpy'
+    results['get_market_data[numpy]'] = measure(bot.get_market_data, repeat)
+    bot.TRADE_CONFIG['incremental_indicators'] = True
+    bot.get_market_data()  # 预热引擎
+    results['get_market_data[incremental]'] = measure(bot.get_market_data, repeat, setup=fake.advance)
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.candle_store = CandleStore(tmp)
+        bot.get_market_data()
+        results['get_market_data[incremental+store]'] = measure(bot.get_market_data, repeat, setup=fake.advance)
+        bot.candle_store = None
+
+    data = bot.get_market_data()
+    pos_str = bot.format_position_text(data, bot.TRADE_CONFIG, account=bot.get_paper_ledger())
+    results['build_prompt'] = measure(lambda: bot.build_prompt(data, pos_str, bot.TRADE_CONFIG), repeat)
+    raw = json.dumps(FAKE_REPLY, ensure_ascii=False)
+    results['parse_ai_response'] = measure(lambda: bot.parse_ai_response(f"```json\n{raw}\n```"), repeat)
+    results['analyze_market'] = measure(lambda: bot.analyze_market(data), repeat)
+    buy = dict(FAKE_REPLY, signal='BUY', confidence='HIGH')
+    sell = dict(FAKE_REPLY, signal='SELL', confidence='HIGH')
+    signals = itertools.cycle([buy, sell])  # 多空来回切换，覆盖平仓 + 开仓路径
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.paper_ledger = PaperLedger(os.path.join(tmp, 'ledger.jsonl'), slippage_bps=2)
+        results['execute_trade[test_mode]'] = measure(
+            lambda: bot.execute_trade(next(signals), data['price']), repeat)
+        bot.paper_ledger.close()
+        bot.paper_ledger = None
+    return results
+
+
+def bench_job(candles, symbols, repeat):
+    """完整 job()，每个周期对 symbols 个标的依次执行 (与多进程部署的总 CPU 相当)"""
+    fake = install_fakes(candles)
+    names = [f"SYM{i}/USDT:USDT" for i in range(symbols)]
+
+    def cycle():
+        for name in names:
+            bot.TRADE_CONFIG['symbol'] = name
+            bot.job()
+
+    original = bot.TRADE_CONFIG['symbol']
+    try:
+        cycle()  # 预热
+        return measure(cycle, repeat, setup=fake.advance)
+    finally:
+        bot.TRADE_CONFIG['symbol'] = original
+
+
+def run(repeat, candle_counts, symbol_counts):
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for candles in candle_counts:
+            for stage, r in bench_stages(candles, repeat).items():
+                results[f"{stage}[candles={candles}]"] = r
+        for candles in candle_counts:
+            for symbols in symbol_counts:
+                results[f"job[candles={candles},symbols={symbols}]"] = bench_job(candles, symbols, max(5, repeat // 5))
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_us):
+    """返回退化超过阈值的项目 (绝对差小于 min_delta_us 的微秒级抖动不算)"""
+    regressions = []
+    for key, r in sorted(results.items()):
+        old = baseline.get(key)
+        if not old:
+            continue
+        ratio = r['median_us'] / old['median_us'] if old['median_us'] else 1.0
+        regressed = ratio > 1 + threshold and r['median_us'] - old['median_us'] > min_delta_us
+        flag = "❌" if regressed else ("✅" if ratio < 1 - threshold else "  ")
+        print(f"{flag} {key:60s} {old['median_us']:>12.1f} -> {r['median_us']:>12.1f} us ({ratio:.2f}x)")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="job() 流水线基准测试")
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--candles', type=int, nargs='+', default=CANDLE_COUNTS)
+    parser.add_argument('--symbols', type=int, nargs='+', default=SYMBOL_COUNTS)
+    parser.add_argument('--output', help="结果 JSON 路径 (默认 benchmarks/results/<时间>.json)")
+    parser.add_argument('--baseline', help="对比用的旧结果 JSON")
+    parser.add_argument('--threshold', type=float, default=0.25, help="中位数变慢超过该比例视为退化")
+    parser.add_argument('--min-delta-us', type=float, default=100, help="绝对变慢小于该值 (微秒) 时忽略")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.candles, args.symbols)
+    for key, r in sorted(results.items()):
+        print(f"{key:60s} median {r['median_us']:>12.1f} us | p95 {r['p95_us']:>12.1f} us")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'created': datetime.now().isoformat(timespec='seconds'), 'results': results}, f, indent=2)
+    print(f"💾 结果已保存: {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold, args.min_delta_us)
+        if regressions:
+            print(f"❌ {len(regressions)} 项退化超过 {args.threshold:.0%}")
+            sys.exit(1)
+        print("✅ 无退化")
+
+
+if __name__ == "__main__":
+    main()
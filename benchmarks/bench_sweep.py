@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import pandas as pd
+
+# 参数扫描吞吐: 在一年 15m 随机游走K线上跑 run_sweep，对比不同进程数
+#   python benchmarks/bench_sweep.py --points 10000 --workers 1 4 8
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import optimizer
+from fakes import FakeExchange
+
+BARS_PER_YEAR_15M = 365 * 96
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=BARS_PER_YEAR_15M)
+    parser.add_argument('--points', type=int, default=2000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    fake = FakeExchange(timeframe='15m', history=args.bars)
+    rows = fake.fetch_ohlcv('SYM/USDT:USDT')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'candles.csv')
+        pd.DataFrame(rows, columns=['ts', 'open', 'high', 'low', 'close', 'vol']).to_csv(path, index=False)
+        data = optimizer.load_sweep_data('SYM/USDT:USDT', '15m', ['15m', '1h', '4h'], csv=path)
+
+    grid = {
+        'timeframe': ['15m', '1h', '4h'],
+        'sma_fast': list(range(5, 50, 5)),
+        'sma_mid': list(range(30, 130, 10)),
+        'sma_slow': list(range(100, 300, 20)),
+        'leverage': [1, 2, 3, 5, 10],
+        'amount': [1, 2, 5],
+    }
+    points = optimizer.sample_points(grid, args.points, seed=1)
+    print(f"K线 {args.bars} 根 (15m) | {len(points)} 个参数点 | CPU {os.cpu_count()} 核")
+    base = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        results = optimizer.run_sweep(data, points, {'contract_size': 10.0}, workers, progress_every=0)
+        elapsed = time.perf_counter() - start
+        base = base or elapsed
+        print(f"workers={workers:<3} {elapsed:7.2f}s | {len(results) / elapsed:7.0f} 点/秒 | 加速比 {base / elapsed:.2f}x")
+    print(optimizer.rank(results).head(5).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import json
+import asyncio
+import bisect
+import numpy as np
+from types import SimpleNamespace
+import ccxt
+
+# 进程内的假交易所 / 假 DeepSeek，用于基准测试和离线运行，不产生任何网络请求
+
+FAKE_REPLY = {
+    "signal": "HOLD",
+    "confidence": "MEDIUM",
+    "trend_range_status": "RANGE",
+    "reason": "布林带收口，MACD粘合，RSI中性，无共振信号，观望",
+    "stop_loss": None,
+    "take_profit": None,
+}
+
+
+class FakeExchange(object):
+    """按随机游走生成K线的 OKX 替身，接口与 app_v2 用到的 ccxt 方法一致"""
+
+    def __init__(self, timeframe='15m', history=5000, start_ms=1_700_000_000_000, seed=7):
+        self.timeframe = timeframe
+        self.tf_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        self.rng = np.random.default_rng(seed)
+        self.start_ms = start_ms
+        self.candles = {}  # symbol -> list
+        self.history = history
+        self.orders = []
+
+    parse_timeframe = staticmethod(ccxt.Exchange.parse_timeframe)
+
+    def _series(self, symbol):
+        if symbol not in self.candles:
+            self.candles[symbol] = []
+            self._grow(symbol, self.history)
+        return self.candles[symbol]
+
+    def _grow(self, symbol, n):
+        rows = self.candles[symbol]
+        price = rows[-1][4] if rows else 0.1
+        ts = rows[-1][0] + self.tf_ms if rows else self.start_ms
+        for _ in range(n):
+            close = max(1e-6, price * (1 + self.rng.normal(0, 0.003)))
+            high = max(price, close) * (1 + abs(self.rng.normal(0, 0.001)))
+            low = min(price, close) * (1 - abs(self.rng.normal(0, 0.001)))
+            rows.append([ts, price, high, low, close, float(self.rng.uniform(1e5, 1e6))])
+            price, ts = close, ts + self.tf_ms
+
+    def advance(self, bars=1):
+        """所有标的各收出新K线"""
+        for symbol in list(self.candles):
+            self._grow(symbol, bars)
+
+    def milliseconds(self):
+        rows = next(iter(self.candles.values()), None)
+        return rows[-1][0] + self.tf_ms // 2 if rows else self.start_ms
+
+    def fetch_ohlcv(self, symbol, timeframe=None, since=None, limit=None):
+        rows = self._series(symbol)
+        if since is not None:
+            lo = bisect.bisect_left(rows, since, key=lambda r: r[0])  # 历史越攒越长，不能每次重建时间戳列表
+            out = rows[lo:lo + limit] if limit else rows[lo:]
+        else:
+            out = rows[-limit:] if limit else rows
+        return [list(r) for r in out]
+
+    def fetch_positions(self, symbols=None):
+        return []
+
+    def fetch_balance(self):
+        return {'USDT': {'free': 1000.0, 'total': 1000.0}}
+
+    def create_market_order(self, symbol, side, amount, params=None):
+        return self.create_order(symbol, 'market', side, amount, None, params)
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        # 与 OKX 一样下单回报里没有成交状态，需要 fetch_order 确认
+        order = {'id': str(len(self.orders) + 1), 'symbol': symbol, 'type': type, 'side': side,
+                 'amount': amount, 'params': params or {}, 'status': None, 'filled': None}
+        self.orders.append(order)
+        return dict(order)
+
+    def create_orders(self, orders, params=None):
+        return [self.create_order(o['symbol'], o['type'], o['side'], o['amount'], o.get('price'), o.get('params'))
+                for o in orders]
+
+    def fetch_order(self, id, symbol=None):
+        order = self.orders[int(id) - 1]
+        order.update(status='closed', filled=order['amount'], average=self._series(order['symbol'])[-1][4])
+        return dict(order)
+
+
+class FakeCompletions(object):
+    def __init__(self, reply, latency, chunk_chars=8, chunk_latency=0.0):
+        self.reply = reply
+        self.latency = latency
+        self.chunk_chars = chunk_chars
+        self.chunk_latency = chunk_latency
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if kwargs.get('stream'):
+            return self._stream()
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.reply))],
+            usage=None,
+        )
+
+    async def _stream(self):
+        # 与 OpenAI 流式接口一致: 每个 chunk 带一段 delta.content，最后一个 chunk 只有 usage
+        for i in range(0, len(self.reply), self.chunk_chars):
+            if self.chunk_latency and i:
+                await asyncio.sleep(self.chunk_latency)
+            piece = self.reply[i:i + self.chunk_chars]
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None)
+        yield SimpleNamespace(choices=[], usage=None)
+
+
+class FakeLLM(object):
+    """AsyncOpenAI 替身: chat.completions.create 返回固定 JSON (stream=True 时分块流式返回)"""
+
+    def __init__(self, reply=None, latency=0.0, chunk_latency=0.0):
+        text = json.dumps(reply or FAKE_REPLY, ensure_ascii=False)
+        self.chat = SimpleNamespace(completions=FakeCompletions(text, latency, chunk_latency=chunk_latency))
+
+
+class FakeOKXWebSocket(object):
+    """
+    本地 OKX business WebSocket 替身: 按订阅推送 FakeExchange 的K线
+    tick() 收出一根新K线 (先推 confirm=1 的已收盘K线，再推 confirm=0 的新K线)，
+    drop() 断开所有连接并在 silent 次 tick 内不推送，用来验证重连 + REST 补数据
+    """
+
+    def __init__(self, exchange, host='127.0.0.1', port=0):
+        self.exchange = exchange
+        self.host, self.port = host, port
+        self.clients = {}  # ws -> instId 列表
+        self.silent = 0
+        self.connections = 0
+        self.runner = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/ws/v5/business"
+
+    async def start(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/ws/v5/business', self._handler)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        for ws in list(self.clients):
+            await ws.close()
+        await self.runner.cleanup()
+
+    async def _handler(self, request):
+        from aiohttp import web, WSMsgType
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        self.clients[ws] = []
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                if msg.data == 'ping':
+                    await ws.send_str('pong')
+                    continue
+                req = json.loads(msg.data)
+                if req.get('op') == 'subscribe':
+                    for arg in req['args']:
+                        self.clients[ws].append(arg)
+                        await ws.send_str(json.dumps({'event': 'subscribe', 'arg': arg}))
+        finally:
+            self.clients.pop(ws, None)
+        return ws
+
+    def _symbol(self, inst_id):
+        base, quote = inst_id.split('-')[:2]
+        return f"{base}/{quote}:{quote}"
+
+    async def tick(self):
+        self.exchange.advance()
+        if self.silent:
+            self.silent -= 1
+            return
+        for ws, args in list(self.clients.items()):
+            for arg in args:
+                rows = self.exchange.fetch_ohlcv(self._symbol(arg['instId']), limit=2)
+                for row, confirm in zip(rows, ('1', '0')):
+                    data = [str(row[0])] + [str(x) for x in row[1:6]] + ['0', '0', confirm]
+                    await ws.send_str(json.dumps({'arg': arg, 'data': [data]}))
+
+    async def drop(self, silent=2):
+        self.silent = silent
+        for ws in list(self.clients):
+            await ws.close()
@@ -0,0 +1,78 @@
+import io
+import sys
+import time
+import asyncio
+import argparse
+import contextlib
+
+# WebSocket 模式的本地演练: 假 OKX WebSocket + 假交易所 + 假 DeepSeek，
+# 检查每根收盘K线都触发 job()、断线后重连并用 REST 补齐K线，并统计 "收盘推送 -> job() 开始" 的延迟
+#   python benchmarks/ws_standin.py --candles 20 --drop-at 8
+
+from bench_pipeline import bot, install_fakes
+from fakes import FakeOKXWebSocket
+
+
+async def rehearse(candles, interval, drop_at, silent):
+    fake = install_fakes(bot.TRADE_CONFIG['data_points'])
+    server = await FakeOKXWebSocket(fake).start()
+    bot.TRADE_CONFIG['ws_feed'] = {'enabled': True, 'url': server.url}
+
+    pushed, started = {}, []
+    original_job = bot.job
+
+    def timed_job(ohlcv=None):
+        started.append(time.perf_counter())
+        original_job(ohlcv)
+    bot.job = timed_job
+
+    task = asyncio.create_task(bot.run_ws_mode())
+    try:
+        while not server.clients:
+            await asyncio.sleep(0.01)
+        for i in range(candles):
+            if i == drop_at:
+                await server.drop(silent)
+            pushed[len(started)] = time.perf_counter()
+            await server.tick()
+            await asyncio.sleep(interval)
+        await asyncio.sleep(interval * 2)
+    finally:
+        bot.ws_feed.stop()
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        await server.stop()
+        bot.job = original_job
+
+    closed = [k[0] for k in bot.ws_feed.closed]
+    gaps = sum(1 for a, b in zip(closed, closed[1:]) if b - a != fake.tf_ms)
+    expected_last = fake.fetch_ohlcv(bot.TRADE_CONFIG['symbol'], limit=2)[0][0]
+    latencies = sorted((started[n] - t) * 1000 for n, t in pushed.items() if n < len(started))
+    return {'jobs': len(started), 'connections': server.connections, 'gaps': gaps,
+            'caught_up': closed[-1] == expected_last, 'latencies_ms': latencies}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket 行情模式本地演练")
+    parser.add_argument('--candles', type=int, default=20, help="推送多少根K线")
+    parser.add_argument('--interval', type=float, default=0.3, help="每根K线间隔 (秒)")
+    parser.add_argument('--drop-at', type=int, default=8, help="第几根K线前断开连接 (-1=不断开)")
+    parser.add_argument('--silent', type=int, default=2, help="断线期间错过的K线数")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        r = asyncio.run(rehearse(args.candles, args.interval, args.drop_at, args.silent))
+
+    lat = r['latencies_ms']
+    print(f"job() 触发 {r['jobs']} 次 | 连接 {r['connections']} 次 | K线断档 {r['gaps']} 处 | "
+          f"追上最新收盘: {'是' if r['caught_up'] else '否'}")
+    if lat:
+        print(f"收盘推送 -> job() 延迟: p50 {lat[len(lat) // 2]:.1f} ms | max {lat[-1]:.1f} ms")
+    ok = r['gaps'] == 0 and r['caught_up'] and r['connections'] >= (2 if args.drop_at >= 0 else 1)
+    print("✅ 通过" if ok else "❌ 未通过")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
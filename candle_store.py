@@ -0,0 +1,111 @@
+import os
+import re
+import threading
+import numpy as np
+
+# 本地K线仓库：每个 (symbol, timeframe) 一个目录，每列一个只追加的二进制文件
+#   ts.bin -> int64 毫秒时间戳, open/high/low/close/vol.bin -> float64
+# 只保存已收盘K线，读取时用 np.memmap 直接映射，重启后无需重新下载历史
+# 每个 (symbol, timeframe) 首次访问时修复一次并缓存行数和各列 memmap，之后只在本进程 append 后刷新；
+# 其他进程同时往同一目录追加的K线，本进程重新打开仓库后才能看到
+
+COLUMNS = [('ts', np.int64), ('open', np.float64), ('high', np.float64),
+           ('low', np.float64), ('close', np.float64), ('vol', np.float64)]
+
+
+class CandleStore(object):
+    """按列存储的只追加K线仓库"""
+
+    def __init__(self, root='data/candles'):
+        self.root = root
+        self._series = {}  # (symbol, timeframe) -> {'count': 行数, 'maps': {列名: memmap}}，append 后整体替换
+        self._lock = threading.RLock()
+
+    def _dir(self, symbol, timeframe):
+        name = re.sub(r'[^A-Za-z0-9]+', '-', symbol).strip('-')
+        return os.path.join(self.root, f"{name}_{timeframe}")
+
+    def _path(self, symbol, timeframe, col):
+        return os.path.join(self._dir(symbol, timeframe), f"{col}.bin")
+
+    def _file_count(self, symbol, timeframe):
+        """按文件大小算的K线数量 (取各列最短者，兼容写到一半崩溃的情况)"""
+        lengths = []
+        for col, dtype in COLUMNS:
+            path = self._path(symbol, timeframe, col)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            lengths.append(size // np.dtype(dtype).itemsize)
+        return min(lengths)
+
+    def _repair(self, symbol, timeframe):
+        """把各列截断到相同长度"""
+        n = self._file_count(symbol, timeframe)
+        for col, dtype in COLUMNS:
+            path = self._path(symbol, timeframe, col)
+            if os.path.exists(path) and os.path.getsize(path) != n * np.dtype(dtype).itemsize:
+                with open(path, 'r+b') as f:
+                    f.truncate(n * np.dtype(dtype).itemsize)
+        return n
+
+    def _state(self, symbol, timeframe):
+        """缓存的行数 / memmap，首次访问时修复各列长度"""
+        key = (symbol, timeframe)
+        state = self._series.get(key)
+        if state is None:
+            with self._lock:
+                state = self._series.get(key)
+                if state is None:
+                    state = self._series[key] = {'count': self._repair(symbol, timeframe), 'maps': {}}
+        return state
+
+    def count(self, symbol, timeframe):
+        """已保存的K线数量"""
+        return self._state(symbol, timeframe)['count']
+
+    def column(self, symbol, timeframe, col):
+        """以 memmap 方式只读映射某一列 (映射缓存到下一次 append)"""
+        state = self._state(symbol, timeframe)
+        arr = state['maps'].get(col)
+        if arr is None:
+            n, dtype = state['count'], dict(COLUMNS)[col]
+            if n == 0:
+                arr = np.empty(0, dtype=dtype)
+            else:
+                arr = np.memmap(self._path(symbol, timeframe, col), dtype=dtype, mode='r', shape=(n,))
+            state['maps'][col] = arr
+        return arr
+
+    def last_ts(self, symbol, timeframe):
+        """最后一根已保存K线的开盘时间 (毫秒)，没有则返回 None"""
+        ts = self.column(symbol, timeframe, 'ts')
+        return int(ts[-1]) if len(ts) else None
+
+    def append(self, symbol, timeframe, ohlcv):
+        """追加已收盘K线，自动丢弃 ts <= last_ts 的重复数据，返回实际写入条数"""
+        with self._lock:
+            n = self.count(symbol, timeframe)
+            if n == 0:
+                os.makedirs(self._dir(symbol, timeframe), exist_ok=True)
+            last = self.last_ts(symbol, timeframe)
+            rows = [k for k in ohlcv if last is None or k[0] > last]
+            if not rows:
+                return 0
+            rows.sort(key=lambda k: k[0])
+            try:
+                for i, (col, dtype) in enumerate(COLUMNS):
+                    arr = np.asarray([k[i] for k in rows], dtype=dtype)
+                    with open(self._path(symbol, timeframe, col), 'ab') as f:
+                        f.write(arr.tobytes())
+            except BaseException:
+                self._series.pop((symbol, timeframe), None)  # 写到一半失败: 下次访问重新修复
+                raise
+            # 换一份新状态 (旧 memmap 只映射到旧长度)，正在读旧状态的线程不受影响
+            self._series[(symbol, timeframe)] = {'count': n + len(rows), 'maps': {}}
+        return len(rows)
+
+    def tail(self, symbol, timeframe, n):
+        """读取最近 n 根K线，返回与 fetch_ohlcv 相同的 [[ts, o, h, l, c, v], ...] 结构"""
+        cols = [self.column(symbol, timeframe, col)[-n:] for col, _ in COLUMNS]
+        ts = cols[0].tolist()
+        rest = np.column_stack(cols[1:]).tolist() if len(ts) else []
+        return [[t] + r for t, r in zip(ts, rest)]
@@ -0,0 +1,70 @@
+import time
+import copy
+from collections import OrderedDict
+
+# DeepSeek 决策缓存：指标快照按配置量化后 + 持仓状态作为 key，
+# 行情几乎没变时直接复用上次的决策，省掉一次 LLM 往返
+
+DEFAULT_QUANTIZE = {
+    'trend': None,        # None = 原值精确匹配
+    'rsi': 1.0,           # RSI 按 1 个点分桶
+    'bb_pct': 0.1,        # 布林带位置按 0.1 分桶
+    'macd_hist': 'sign',  # 只看柱状图方向 (MACD 绝对值随币价变化，不适合固定步长)
+    'sma20_dist': 0.5,    # 距 SMA20 的百分比按 0.5% 分桶
+    'vol_ratio': 0.5,     # 量比按 0.5 分桶
+    'mtf_trend': None,    # 多周期趋势摘要 (开启本地合成时才有)
+}
+
+
+def quantize_value(value, spec):
+    if spec is None:
+        return value
+    if spec == 'sign':
+        return (value > 0) - (value < 0)
+    return int(round(value / spec))
+
+
+class DecisionCache(object):
+    """带 TTL 的 LRU 决策缓存，并统计命中率"""
+
+    def __init__(self, quantize=None, ttl_sec=3600, max_size=512):
+        self.quantize = DEFAULT_QUANTIZE if quantize is None else quantize
+        self.ttl_sec = ttl_sec
+        self.max_size = max_size
+        self.entries = OrderedDict()  # key -> (expire_at, decision)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(self, symbol, timeframe, indicators, position_side):
+        buckets = tuple((name, quantize_value(indicators[name], spec))
+                        for name, spec in sorted(self.quantize.items()) if name in indicators)
+        return (symbol, timeframe, position_side) + buckets
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            del self.entries[key]  # 过期
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(entry[1])
+
+    def put(self, key, decision):
+        self.entries[key] = (time.monotonic() + self.ttl_sec, copy.deepcopy(decision))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def summary(self):
+        return (f"命中率 {self.hit_rate:.0%} (命中 {self.hits} / 未命中 {self.misses}, "
+                f"条目 {len(self.entries)}, 淘汰 {self.evictions})")
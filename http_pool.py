@@ -0,0 +1,114 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+# 统一的 HTTP 连接池：交易所 (ccxt)、DeepSeek (openai/httpx) 都从这里取会话，
+# 长连接复用，避免每根K线都对各个域名重新做 TLS 握手；并统计连接复用率
+
+POOL_CONFIG = {
+    'pool_maxsize': 16,       # 单域名最大保持连接数 (多标的并发时按标的数量调大)
+    'keepalive_expiry': None,  # 空闲连接保留秒数，None=按K线周期推算 (一个周期 + 60秒，两根K线之间不回收)
+    'timeout': 15,             # 默认请求超时
+}
+KEEPALIVE_MARGIN_SEC = 60
+
+
+class PoolStats(object):
+    """各客户端的请求数 / 新建连接数"""
+
+    def __init__(self):
+        self.requests = {}
+        self.connections = {}
+        self.sources = {}  # name -> 返回当前新建连接数的函数 (requests 会话用)
+
+    def on_request(self, name):
+        self.requests[name] = self.requests.get(name, 0) + 1
+
+    def on_connect(self, name):
+        self.connections[name] = self.connections.get(name, 0) + 1
+
+    def snapshot(self):
+        result = {}
+        for name in sorted(set(self.requests) | set(self.connections) | set(self.sources)):
+            reqs = self.requests.get(name, 0)
+            conns = self.sources[name]() if name in self.sources else self.connections.get(name, 0)
+            result[name] = {'requests': reqs, 'connections': conns,
+                            'reuse_rate': 1 - conns / reqs if reqs else 0.0}
+        return result
+
+    def summary(self):
+        parts = [f"{name} {s['requests']}次/{s['connections']}连接 (复用 {s['reuse_rate']:.0%})"
+                 for name, s in self.snapshot().items()]
+        return "连接池: " + (" | ".join(parts) if parts else "暂无请求")
+
+
+stats = PoolStats()
+
+
+def keepalive_expiry(timeframe=None):
+    """
+    httpx / aiohttp 空闲连接的本地保留秒数: 每根K线只用一次连接池，保留时间必须超过一个K线周期，
+    否则每个周期都要重新握手。requests (urllib3) 不按时间回收，不受影响
+    """
+    if POOL_CONFIG['keepalive_expiry'] is not None:
+        return POOL_CONFIG['keepalive_expiry']
+    from ccxt import Exchange
+    return Exchange.parse_timeframe(timeframe or '15m') + KEEPALIVE_MARGIN_SEC
+
+
+def requests_session(name, pool_maxsize=None, retries=0):
+    """同步 requests 会话 (sync ccxt)"""
+    pool_maxsize = pool_maxsize or POOL_CONFIG['pool_maxsize']
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.hooks['response'].append(lambda r, *args, **kwargs: stats.on_request(name))
+
+    def opened_connections():
+        pools = adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+    stats.sources[name] = opened_connections
+    return session
+
+
+def httpx_async_client(name, max_connections=None, timeframe=None):
+    """DeepSeek 用的 httpx.AsyncClient (传给 AsyncOpenAI(http_client=...))，timeframe 决定空闲连接保留时间"""
+    import httpx
+    max_connections = max_connections or POOL_CONFIG['pool_maxsize']
+
+    async def trace(event, info):
+        if event == 'connection.connect_tcp.complete':
+            stats.on_connect(name)
+
+    async def on_request(request):
+        stats.on_request(name)
+        request.extensions['trace'] = trace
+
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=max_connections,
+                            max_keepalive_connections=max_connections,
+                            keepalive_expiry=keepalive_expiry(timeframe)),
+        timeout=httpx.Timeout(POOL_CONFIG['timeout'] * 4, connect=POOL_CONFIG['timeout']),
+        event_hooks={'request': [on_request]},
+    )
+
+
+def aiohttp_session(name, limit=None, timeframe=None):
+    """异步 ccxt 用的 aiohttp 会话 (必须在事件循环内创建)，timeframe 同 httpx_async_client"""
+    import aiohttp
+    limit = limit or POOL_CONFIG['pool_maxsize']
+
+    async def on_request_start(session, ctx, params):
+        stats.on_request(name)
+
+    async def on_connection_create_end(session, ctx, params):
+        stats.on_connect(name)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit,
+                                     keepalive_timeout=keepalive_expiry(timeframe),
+                                     ttl_dns_cache=300, enable_cleanup_closed=True)
+    return aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+
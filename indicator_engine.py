@@ -0,0 +1,254 @@
+import math
+from collections import deque
+from datetime import datetime, timezone
+
+# 增量指标引擎：每根K线收盘只做 O(1) 更新，口径与 calculate_technical_indicators 一致
+# (rolling 均值 / 标准差、ewm(adjust=True)、RSI 简单均值、ATR、量比)
+# 注：EMA 依赖起算点。引擎从第一根K线一直累积，pandas 版本每次只从最近 data_points 根起算，
+#     因此 MACD / macd_hist 在第4位小数上可能有 1~3 个单位的差异，其余字段完全一致
+
+NAN = float('nan')
+
+
+def _nz(x):
+    """等价于 df.fillna(0)"""
+    return 0.0 if x != x else x
+
+
+def _div(a, b):
+    """模拟 pandas 的浮点除法 (除0得 inf / nan，而不是抛异常)"""
+    if a != a or b != b:
+        return NAN
+    if b == 0:
+        if a == 0:
+            return NAN
+        return math.copysign(math.inf, a)
+    return a / b
+
+
+def ts_to_datetime(ts):
+    """毫秒时间戳 -> naive UTC datetime (与 pd.to_datetime(unit='ms') 一致)"""
+    return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+class RollingWindow(object):
+    """定长窗口的滑动和 / 平方和，用于 rolling(n).mean() 与 rolling(n).std()"""
+
+    def __init__(self, n):
+        self.n = n
+        self.values = deque(maxlen=n)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self._pushes = 0
+
+    def _next_sums(self, x):
+        total, total_sq = self.total + x, self.total_sq + x * x
+        if len(self.values) == self.n:
+            old = self.values[0]
+            total -= old
+            total_sq -= old * old
+        return total, total_sq, min(len(self.values) + 1, self.n)
+
+    def peek_mean(self, x):
+        total, _, count = self._next_sums(x)
+        return total / self.n if count == self.n else NAN
+
+    def peek_std(self, x):
+        total, total_sq, count = self._next_sums(x)
+        if count < self.n:
+            return NAN
+        var = (total_sq - total * total / self.n) / (self.n - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+    def push(self, x):
+        self.total, self.total_sq, _ = self._next_sums(x)
+        self.values.append(x)
+        self._pushes += 1
+        # 定期重算，防止浮点累积误差
+        if self._pushes % (self.n * 8) == 0:
+            self.total = math.fsum(self.values)
+            self.total_sq = math.fsum(v * v for v in self.values)
+
+    @property
+    def mean(self):
+        return self.total / self.n if len(self.values) == self.n else NAN
+
+    @property
+    def std(self):
+        if len(self.values) < self.n:
+            return NAN
+        var = (self.total_sq - self.total * self.total / self.n) / (self.n - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+
+class EwmState(object):
+    """ewm(span=N, adjust=True).mean() 的递推形式"""
+
+    def __init__(self, span):
+        self.decay = 1 - 2.0 / (span + 1)
+        self.num = 0.0
+        self.den = 0.0
+
+    def peek(self, x):
+        return (self.num * self.decay + x) / (self.den * self.decay + 1)
+
+    def push(self, x):
+        self.num = self.num * self.decay + x
+        self.den = self.den * self.decay + 1
+        return self.num / self.den
+
+
+class IndicatorEngine(object):
+    """单个 (symbol, timeframe) 的增量指标状态"""
+
+    HISTORY_ROWS = 6  # 对应 df.tail(6)
+
+    def __init__(self, timeframe_ms=None):
+        self.timeframe_ms = timeframe_ms
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.last_ts = None
+        self.prev_close = None
+        self.sma = {20: RollingWindow(20), 60: RollingWindow(60), 120: RollingWindow(120)}
+        self.ema12 = EwmState(12)
+        self.ema26 = EwmState(26)
+        self.macd_signal = EwmState(9)
+        self.gain = RollingWindow(14)
+        self.loss = RollingWindow(14)
+        self.tr = RollingWindow(14)
+        self.vol = RollingWindow(20)
+        self.history = deque(maxlen=self.HISTORY_ROWS)
+
+    # --- 单步计算 ---
+    def _row(self, candle, commit):
+        """计算一根K线对应的指标行；commit=True 时写入状态"""
+        ts, o, h, l, c, v = [float(x) for x in candle[:6]]
+        prev = self.prev_close
+
+        delta = NAN if prev is None else c - prev
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        if prev is None:
+            tr = h - l
+        else:
+            tr = max(h - l, abs(h - prev), abs(l - prev))
+
+        if commit:
+            for w in self.sma.values():
+                w.push(c)
+            self.gain.push(gain)
+            self.loss.push(loss)
+            self.tr.push(tr)
+            self.vol.push(v)
+            ema12, ema26 = self.ema12.push(c), self.ema26.push(c)
+            macd = ema12 - ema26
+            macd_signal = self.macd_signal.push(macd)
+            sma = {n: w.mean for n, w in self.sma.items()}
+            std20 = self.sma[20].std
+            avg_gain, avg_loss = self.gain.mean, self.loss.mean
+            atr, vol_ma20 = self.tr.mean, self.vol.mean
+        else:
+            macd = self.ema12.peek(c) - self.ema26.peek(c)
+            macd_signal = self.macd_signal.peek(macd)
+            sma = {n: w.peek_mean(c) for n, w in self.sma.items()}
+            std20 = self.sma[20].peek_std(c)
+            avg_gain, avg_loss = self.gain.peek_mean(gain), self.loss.peek_mean(loss)
+            atr, vol_ma20 = self.tr.peek_mean(tr), self.vol.peek_mean(v)
+
+        rsi = 100 - _div(100, 1 + _div(avg_gain, avg_loss))
+        bb_upper = sma[20] + 2 * std20
+        bb_lower = sma[20] - 2 * std20
+
+        row = {
+            'ts': ts_to_datetime(ts),
+            'open': o, 'high': h, 'low': l, 'close': c, 'vol': v,
+            'sma_20': sma[20], 'sma_60': sma[60], 'sma_120': sma[120],
+            'macd': macd, 'macd_signal': macd_signal, 'macd_hist': macd - macd_signal,
+            'rsi': rsi,
+            'bb_upper': bb_upper, 'bb_lower': bb_lower,
+            'bb_pct': _div(c - bb_lower, bb_upper - bb_lower),
+            'atr': atr,
+            'vol_ma20': vol_ma20, 'vol_ratio': _div(v, vol_ma20),
+        }
+        row = {k: (_nz(val) if isinstance(val, float) else val) for k, val in row.items()}
+
+        if commit:
+            self.prev_close = c
+            self.last_ts = int(ts)
+            self.count += 1
+            self.history.append(row)
+        return row
+
+    # --- 对外接口 ---
+    def update(self, candle):
+        """提交一根已收盘K线 [ts, open, high, low, close, vol]，O(1)"""
+        return self._row(candle, commit=True)
+
+    def sync(self, ohlcv):
+        """
+        把交易所返回的K线列表同步进引擎，只处理 last_ts 之后的已收盘K线。
+        最后一根视为未收盘K线，不提交。若与已有状态出现断档则整体重建。
+        返回未收盘K线 (可能为 None)。
+        """
+        if not ohlcv:
+            return None
+        closed, live = ohlcv[:-1], ohlcv[-1]
+
+        if self.last_ts is not None:
+            new = [k for k in closed if k[0] > self.last_ts]
+            if new and self.timeframe_ms and new[0][0] - self.last_ts > self.timeframe_ms:
+                self.reset()  # 断档 (停机太久)，从头预热
+                new = closed
+        else:
+            new = closed
+
+        for k in new:
+            self.update(k)
+        return live
+
+    def snapshot(self, live=None):
+        """
+        生成与 get_market_data 相同结构的结果；live 为未收盘K线时，
+        在不修改状态的前提下把它当作最后一行计算。
+        """
+        rows = list(self.history)
+        if live is not None and (self.last_ts is None or live[0] > self.last_ts):
+            rows.append(self._row(live, commit=False))
+            rows = rows[-self.HISTORY_ROWS:]
+        if not rows:
+            return None
+        return build_market_snapshot(rows[-1], rows)
+
+
+def describe_trend(curr):
+    """趋势预判文本化"""
+    trend_desc = "震荡"
+    if curr['close'] > curr['sma_20'] > curr['sma_60'] > curr['sma_120']:
+        trend_desc = "强多头排列"
+    elif curr['close'] < curr['sma_20'] < curr['sma_60'] < curr['sma_120']:
+        trend_desc = "强空头排列"
+    elif curr['close'] > curr['sma_20']:
+        trend_desc = "短期偏多"
+    elif curr['close'] < curr['sma_20']:
+        trend_desc = "短期偏空"
+    return trend_desc
+
+
+def build_market_snapshot(curr, kline_history):
+    """把最后一行指标整理成 get_market_data 的返回结构 (不含 ts)"""
+    return {
+        'price': curr['close'],
+        'indicators': {
+            'trend': describe_trend(curr),
+            'sma20_dist': round((curr['close'] - curr['sma_20'])/curr['sma_20']*100, 2),
+            'macd': round(curr['macd'], 4),
+            'macd_hist': round(curr['macd_hist'], 4),
+            'rsi': round(curr['rsi'], 2),
+            'bb_pct': round(curr['bb_pct'], 2),
+            'atr': round(curr['atr'], 4),
+            'vol_ratio': round(curr['vol_ratio'], 2) # 告诉AI是否放量 (大于1代表放量)
+        },
+        'kline_history': list(kline_history)
+    }
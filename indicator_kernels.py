@@ -0,0 +1,189 @@
+import math
+
+import numpy as np
+
+from indicator_engine import build_market_snapshot, ts_to_datetime
+
+# NumPy 指标内核: 输入连续的 float64 数组，结果写进预分配的缓冲区，全程不经过 pandas
+# 口径与 calculate_technical_indicators 一致 (rolling 前 N-1 行为 NaN、ewm(adjust=True)、最后 fillna(0))，
+# 150 根K线时 pandas 的 rolling / ewm / concat / fillna 开销比计算本身还大
+# 注: 完全平盘的窗口按数学结果给出 (均值即该值，标准差 0)；pandas 在线算法在这种窗口上偶尔残留 1e-11 级的标准差
+
+COLUMNS = ('sma_20', 'sma_60', 'sma_120', 'macd', 'macd_signal', 'macd_hist', 'rsi',
+           'bb_upper', 'bb_lower', 'bb_pct', 'atr', 'vol_ma20', 'vol_ratio')
+OHLCV = ('ts', 'open', 'high', 'low', 'close', 'vol')
+_SCRATCH = ('ema12', 'ema26', 'gain', 'loss', 'avg_gain', 'avg_loss', 'std', 'tr', 'tmp')
+
+_EWM_BLOCKS = {}  # span -> (decay, decay 的幂次, 1/幂次 的前缀和)
+
+
+def _windows(x, n):
+    """长度为 n 的滑动窗口视图 (len(x)-n+1, n)，不复制数据 (x 须为连续数组)"""
+    return np.ndarray((len(x) - n + 1, n), x.dtype, x, strides=(x.strides[0], x.strides[0]))
+
+
+def _flat_windows(x, n):
+    """
+    窗口内数值全部相同的位置。pandas 对这种窗口直接返回该值 (标准差为 0)，
+    而直接求和再除 n 会差 1 个 ulp，平盘时 close > sma_20 之类的比较就会翻转
+    """
+    changes = np.empty(len(x), dtype=np.int64)
+    changes[0] = 0
+    np.cumsum(x[1:] != x[:-1], out=changes[1:])
+    return changes[n - 1:] == changes[:len(x) - n + 1]
+
+
+def rolling_mean(x, n, out):
+    """rolling(n).mean()"""
+    out[:n - 1] = np.nan
+    if len(x) >= n:
+        tail = out[n - 1:]
+        np.add.reduce(_windows(x, n), axis=1, out=tail)
+        tail /= n
+        flat = _flat_windows(x, n)
+        if flat.any():
+            tail[flat] = x[n - 1:][flat]
+    return out
+
+
+def rolling_std(x, n, out, mean):
+    """rolling(n).std() (样本标准差 ddof=1)，mean 为同窗口的 rolling_mean 结果"""
+    out[:n - 1] = np.nan
+    if len(x) >= n:
+        tail = out[n - 1:]
+        dev = _windows(x, n) - mean[n - 1:, None]
+        np.square(dev, out=dev)
+        np.add.reduce(dev, axis=1, out=tail)
+        tail /= n - 1
+        np.sqrt(tail, out=tail)
+        tail[_flat_windows(x, n)] = 0.0
+    return out
+
+
+def _ewm_block(span):
+    cached = _EWM_BLOCKS.get(span)
+    if cached is None:
+        decay = 1 - 2.0 / (span + 1)
+        size = max(1, int(math.log(1e15) / -math.log(decay)))  # 块内 decay^-i 不超过 1e15，远离溢出
+        powers = decay ** np.arange(size)
+        cached = _EWM_BLOCKS[span] = (decay, powers, np.cumsum(1 / powers))
+    return cached
+
+
+def ewm_mean(x, span, out):
+    """
+    ewm(span=span, adjust=True).mean()。递推 num_t = x_t + d * num_{t-1} (den 同理) 按块展开:
+    块内 num_{s+j} = d^j * (d * num_{s-1} + cumsum(x_{s+i} / d^i)[j])，每块一次 cumsum
+    """
+    decay, powers, den_sums = _ewm_block(span)
+    size = len(powers)
+    num = den = 0.0
+    for start in range(0, len(x), size):
+        end = min(len(x), start + size)
+        p = powers[:end - start]
+        nums = p * (decay * num + np.cumsum(x[start:end] / p))
+        dens = p * (decay * den + den_sums[:end - start])
+        np.divide(nums, dens, out=out[start:end])
+        num, den = nums[-1], dens[-1]
+    return out
+
+
+class IndicatorKernels(object):
+    """
+    一组按K线数量预分配的输出缓冲区，每次 compute 复用 (行数变多时才重新分配)。
+    compute 返回的列是缓冲区的视图，下一次 compute 会覆盖
+    """
+
+    def __init__(self, capacity=0):
+        self.capacity = 0
+        self.buffers = {}
+        self._alloc(capacity)
+
+    def _alloc(self, n):
+        # 所有列放在同一块二维内存里，fillna 一次处理全部输出列
+        self.capacity = n
+        self.block = np.empty((len(COLUMNS) + len(_SCRATCH), n))
+        self.buffers = dict(zip(COLUMNS + _SCRATCH, self.block))
+
+    def compute(self, high, low, close, vol):
+        """输入各列 float64 数组，返回 {列名: 数组}"""
+        n = len(close)
+        if n > self.capacity:
+            self._alloc(n)
+        b = {name: buf[:n] for name, buf in self.buffers.items()}
+
+        # 1. 均线
+        for window in (20, 60, 120):
+            rolling_mean(close, window, b[f'sma_{window}'])
+
+        # 2. MACD
+        ewm_mean(close, 12, b['ema12'])
+        ewm_mean(close, 26, b['ema26'])
+        np.subtract(b['ema12'], b['ema26'], out=b['macd'])
+        ewm_mean(b['macd'], 9, b['macd_signal'])
+        np.subtract(b['macd'], b['macd_signal'], out=b['macd_hist'])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 3. RSI (第一根 diff 为 NaN，与 where(delta > 0, 0) 一样记 0)
+            gain, loss = b['gain'], b['loss']
+            gain[:1] = 0.0
+            np.subtract(close[1:], close[:-1], out=gain[1:])
+            np.negative(gain, out=loss)
+            np.maximum(gain, 0.0, out=gain)
+            np.maximum(loss, 0.0, out=loss)
+            rolling_mean(gain, 14, b['avg_gain'])
+            rolling_mean(loss, 14, b['avg_loss'])
+            rsi = b['rsi']
+            np.divide(b['avg_gain'], b['avg_loss'], out=rsi)
+            rsi += 1
+            np.divide(100.0, rsi, out=rsi)
+            np.subtract(100.0, rsi, out=rsi)
+
+            # 4. 布林带 (中轨即 sma_20)
+            std = rolling_std(close, 20, b['std'], b['sma_20'])
+            np.multiply(std, 2, out=std)
+            np.add(b['sma_20'], std, out=b['bb_upper'])
+            np.subtract(b['sma_20'], std, out=b['bb_lower'])
+            np.subtract(b['bb_upper'], b['bb_lower'], out=b['tmp'])
+            np.subtract(close, b['bb_lower'], out=b['bb_pct'])
+            np.divide(b['bb_pct'], b['tmp'], out=b['bb_pct'])
+
+            # 5. ATR: TR = max(高-低, |高-前收|, |低-前收|)，第一根只有 高-低
+            tr, tmp = b['tr'], b['tmp']
+            np.subtract(high, low, out=tr)
+            for side in (high, low):
+                np.subtract(side[1:], close[:-1], out=tmp[1:])
+                np.abs(tmp[1:], out=tmp[1:])
+                np.maximum(tr[1:], tmp[1:], out=tr[1:])
+            rolling_mean(tr, 14, b['atr'])
+
+            # 6. 量比
+            rolling_mean(vol, 20, b['vol_ma20'])
+            np.divide(vol, b['vol_ma20'], out=b['vol_ratio'])
+
+        outputs = self.block[:len(COLUMNS), :n]
+        np.copyto(outputs, 0.0, where=np.isnan(outputs))  # fillna(0)，inf 保留
+        return {name: b[name] for name in COLUMNS}
+
+    def from_ohlcv(self, ohlcv):
+        """交易所格式的K线列表 -> (各列连续数组, 指标列)"""
+        cols = dict(zip(OHLCV, np.array(ohlcv, dtype=np.float64).T.copy()))
+        return cols, self.compute(cols['high'], cols['low'], cols['close'], cols['vol'])
+
+
+def indicator_rows(cols, ind, start):
+    """第 start 行到最后一行，转成与 df.to_dict('records') 相同键的字典列表"""
+    rows = []
+    for i in range(start, len(cols['close'])):
+        row = {'ts': ts_to_datetime(cols['ts'][i])}
+        row.update((name, float(cols[name][i])) for name in OHLCV[1:])
+        row.update((name, float(ind[name][i])) for name in COLUMNS)
+        rows.append(row)
+    return rows
+
+
+def market_snapshot(kernels, ohlcv, history_rows=6):
+    """与 build_market_data 的 pandas 版返回相同结构 (不含 ts)"""
+    cols, ind = kernels.from_ohlcv(ohlcv)
+    rows = indicator_rows(cols, ind, max(0, len(ohlcv) - history_rows))
+    return build_market_snapshot(rows[-1], rows)
@@ -0,0 +1,55 @@
+import pandas as pd
+
+# 技术指标计算 (实盘 get_market_data 与回测 backtest.py 共用同一套口径)
+
+def calculate_technical_indicators(df):
+    """计算丰富指标 (适配高级Prompt)"""
+    try:
+        close = df['close']
+        high = df['high']
+        low = df['low']
+        vol = df['vol']
+
+        # 1. 均线系统 (适配 Prompt 的 SMA20/60/120)
+        df['sma_20'] = close.rolling(20).mean()
+        df['sma_60'] = close.rolling(60).mean()  # 新增
+        df['sma_120'] = close.rolling(120).mean() # 新增
+
+        # 2. MACD
+        ema12 = close.ewm(span=12).mean()
+        ema26 = close.ewm(span=26).mean()
+        df['macd'] = ema12 - ema26
+        df['macd_signal'] = df['macd'].ewm(span=9).mean()
+        df['macd_hist'] = df['macd'] - df['macd_signal']
+
+        # 3. RSI
+        delta = close.diff()
+        gain = (delta.where(delta > 0, 0)).rolling(14).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+        rs = gain / loss
+        df['rsi'] = 100 - (100 / (1 + rs))
+
+        # 4. 布林带
+        mid = close.rolling(20).mean()
+        std = close.rolling(20).std()
+        df['bb_upper'] = mid + 2 * std
+        df['bb_lower'] = mid - 2 * std
+        df['bb_pct'] = (close - df['bb_lower']) / (df['bb_upper'] - df['bb_lower'])
+
+        # 5. ATR (用于止损)
+        tr1 = high - low
+        tr2 = abs(high - close.shift())
+        tr3 = abs(low - close.shift())
+        tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
+        df['atr'] = tr.rolling(14).mean()
+
+        # 6. 成交量比率 (新增：用于判断放量/缩量)
+        # 当前成交量 / 过去20根K线平均成交量
+        df['vol_ma20'] = vol.rolling(20).mean()
+        df['vol_ratio'] = vol / df['vol_ma20']
+
+        df = df.fillna(0)
+        return df
+    except Exception as e:
+        print(f"指标计算出错: {e}")
+        return df
@@ -0,0 +1,160 @@
+import os
+import json
+import zlib
+import struct
+import hashlib
+import inspect
+from types import SimpleNamespace
+
+# DeepSeek 回复录制 / 回放 ("磁带")
+# 文件格式: 连续的 [32字节 sha256(请求)][4字节长度][zlib(JSON)] 记录，只追加；
+# 打开时只扫描记录头建立内存索引，回放时按偏移读取，无需网络。
+#
+# 模式: off    - 不启用
+#       record - 正常请求，并把回复写入磁带
+#       replay - 只从磁带回答，未命中直接报错 (离线 / 确定性运行)
+#       auto   - 命中则回放，未命中则请求并录制
+
+HEADER = struct.Struct('<32sI')
+MODES = ('off', 'record', 'replay', 'auto')
+
+
+class CassetteMiss(Exception):
+    """回放模式下磁带里没有这条请求"""
+
+
+def request_key(kwargs):
+    """同一请求 (模型 / 参数 / messages) 得到同一个 key"""
+    payload = json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).digest()
+
+
+class LLMCassette(object):
+    def __init__(self, path='data/llm_cassette.bin', mode='auto'):
+        if mode not in MODES:
+            raise ValueError(f"未知磁带模式 {mode}，可选: {', '.join(MODES)}")
+        self.path = path
+        self.mode = mode
+        self.index = {}  # key -> (payload 偏移, 长度)
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        if mode != 'off':
+            self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            offset = 0
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                key, length = HEADER.unpack(header)
+                offset += HEADER.size
+                if offset + length > os.fstat(f.fileno()).st_size:
+                    break  # 写到一半的尾部记录，忽略
+                self.index[key] = (offset, length)
+                offset += length
+                f.seek(offset)
+
+    def lookup(self, key):
+        pos = self.index.get(key)
+        if pos is None:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(pos[0])
+            return json.loads(zlib.decompress(f.read(pos[1])))
+
+    def store(self, key, record):
+        if key in self.index:
+            return
+        data = zlib.compress(json.dumps(record, ensure_ascii=False).encode('utf-8'))
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'ab') as f:
+            offset = f.tell() + HEADER.size
+            f.write(HEADER.pack(key, len(data)) + data)
+        self.index[key] = (offset, len(data))
+        self.recorded += 1
+
+    def summary(self):
+        return f"磁带[{self.mode}] 命中 {self.hits} / 未命中 {self.misses} / 新录制 {self.recorded} (共 {len(self.index)} 条)"
+
+
+def response_to_record(response):
+    usage = getattr(response, 'usage', None)
+    if usage is not None and hasattr(usage, 'model_dump'):
+        usage = usage.model_dump()
+    return {'content': response.choices[0].message.content, 'usage': usage}
+
+
+def record_to_response(record):
+    usage = record.get('usage')
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=record['content']))],
+        usage=SimpleNamespace(**usage) if isinstance(usage, dict) else None,
+        from_cassette=True,
+    )
+
+
+class _CassetteCompletions(object):
+    def __init__(self, inner, cassette):
+        self.inner = inner
+        self.cassette = cassette
+        # 与被包装的客户端保持一致: OpenAI -> 同步, AsyncOpenAI -> 异步
+        # (openai 用普通的同步装饰器包了一层 create，要解开 __wrapped__ 才能看出是协程函数)
+        if inspect.iscoroutinefunction(inspect.unwrap(inner.create)):
+            self.create = self._create_async
+        else:
+            self.create = self._create_sync
+
+    def _before(self, kwargs):
+        key = request_key(kwargs)
+        cassette = self.cassette
+        if cassette.mode in ('replay', 'auto'):
+            record = cassette.lookup(key)
+            if record is not None:
+                cassette.hits += 1
+                return key, record_to_response(record)
+            cassette.misses += 1
+            if cassette.mode == 'replay':
+                print(f"📼 磁带未命中 {key.hex()[:12]} | {cassette.summary()}")
+                raise CassetteMiss(f"磁带中没有该请求 ({key.hex()[:12]})")
+        return key, None
+
+    def _after(self, key, response):
+        if self.cassette.mode in ('record', 'auto'):
+            self.cassette.store(key, response_to_record(response))
+        return response
+
+    def _create_sync(self, **kwargs):
+        key, replayed = self._before(kwargs)
+        if replayed is not None:
+            return replayed
+        return self._after(key, self.inner.create(**kwargs))
+
+    async def _create_async(self, **kwargs):
+        key, replayed = self._before(kwargs)
+        if replayed is not None:
+            return replayed
+        return self._after(key, await self.inner.create(**kwargs))
+
+
+class CassetteClient(object):
+    """包装 OpenAI / AsyncOpenAI 客户端，只拦截 chat.completions.create，其余属性透传"""
+
+    def __init__(self, client, cassette):
+        self._client = client
+        self.cassette = cassette
+        self.chat = SimpleNamespace(completions=_CassetteCompletions(client.chat.completions, cassette))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def wrap_client(client, cassette):
+    """磁带未启用时原样返回客户端"""
+    if cassette is None or cassette.mode == 'off':
+        return client
+    return CassetteClient(client, cassette)
@@ -0,0 +1,269 @@
+import time
+import asyncio
+import threading
+from collections import deque
+
+from llm_json import JSONFieldStream
+
+# DeepSeek 异步调用层：截止时间 + 对冲请求 (hedged request) + 延迟分位统计
+# 流式模式下边收边解析 JSON，signal / confidence 一到就先交出决策
+
+
+class LLMDeadlineExceeded(Exception):
+    """在截止时间前没有拿到任何回复"""
+
+
+class LazyClient(object):
+    """首次访问属性时才调用 factory 构造真实客户端，把 openai 等重模块的导入推迟到第一次请求"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+class LatencyStats(object):
+    """最近 window 次调用的延迟，用于计算 p50/p95/p99"""
+
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.outcomes = {}
+
+    def record(self, seconds, outcome):
+        # outcome: primary / hedge / timeout / error
+        if seconds is not None:
+            self.samples.append(seconds)
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        data = sorted(self.samples)
+        idx = min(len(data) - 1, max(0, int(round(q / 100 * (len(data) - 1)))))
+        return data[idx]
+
+    def percentiles(self):
+        return {'p50': self.percentile(50), 'p95': self.percentile(95),
+                'p99': self.percentile(99), 'n': len(self.samples)}
+
+    def summary(self):
+        p = self.percentiles()
+        outcomes = ' '.join(f"{k}={v}" for k, v in sorted(self.outcomes.items()))
+        if not p['n']:
+            return f"暂无成功样本 ({outcomes})"
+        return f"p50={p['p50']:.2f}s p95={p['p95']:.2f}s p99={p['p99']:.2f}s (n={p['n']}, {outcomes})"
+
+
+class PromptCacheStats(object):
+    """
+    DeepSeek 前缀缓存命中统计: usage.prompt_cache_hit_tokens / prompt_cache_miss_tokens
+    (兼容 OpenAI 风格的 usage.prompt_tokens_details.cached_tokens)
+    """
+
+    def __init__(self):
+        self.hit_tokens = 0
+        self.miss_tokens = 0
+        self.last = None
+
+    def record(self, usage):
+        if usage is None:
+            return None
+        hit = getattr(usage, 'prompt_cache_hit_tokens', None)
+        miss = getattr(usage, 'prompt_cache_miss_tokens', None)
+        if hit is None:
+            details = getattr(usage, 'prompt_tokens_details', None)
+            hit = getattr(details, 'cached_tokens', None) if details is not None else None
+            if hit is None:
+                return None
+            miss = (getattr(usage, 'prompt_tokens', 0) or 0) - hit
+        self.hit_tokens += hit
+        self.miss_tokens += miss or 0
+        self.last = (hit, miss or 0)
+        return self.last
+
+    def summary(self):
+        if self.last is None:
+            return "前缀缓存: 暂无 usage 数据"
+        hit, miss = self.last
+        total = self.hit_tokens + self.miss_tokens
+        return (f"前缀缓存: 本次命中 {hit}/{hit + miss} tokens | "
+                f"累计命中率 {self.hit_tokens / total:.0%}" if total else "前缀缓存: 0 tokens")
+
+
+def _chunk_text(chunk):
+    """流式 chunk 取 delta.content；非流式的完整回复 (如磁带回放) 取 message.content"""
+    choices = getattr(chunk, 'choices', None) or []
+    if not choices:
+        return ''
+    delta = getattr(choices[0], 'delta', None)
+    if delta is not None:
+        return getattr(delta, 'content', None) or ''
+    return getattr(getattr(choices[0], 'message', None), 'content', None) or ''
+
+
+async def _close_stream(stream):
+    """关闭流式回复、释放连接池里的连接 (openai 的 AsyncStream.close / 异步生成器的 aclose)，出错忽略"""
+    close = getattr(stream, 'close', None) or getattr(stream, 'aclose', None)
+    if close is None:
+        return
+    try:
+        await close()
+    except Exception:
+        pass
+
+
+_releasing = set()  # 正在关闭的落败流，保留引用防止任务被回收
+
+
+def _discard(task, release=None):
+    """竞速中落败的请求: 取消；已经成功拿到结果的交给 release 释放 (如关闭流式连接)，异常取走不再报警"""
+    task.cancel()
+
+    def done(t):
+        if t.cancelled() or t.exception() is not None or release is None:
+            return
+        closing = asyncio.ensure_future(release(t.result()))
+        _releasing.add(closing)
+        closing.add_done_callback(_releasing.discard)
+    task.add_done_callback(done)
+
+
+class HedgedLLM(object):
+    """
+    带截止时间的 chat.completions 调用:
+    - 主请求超过 hedge_after 秒仍未返回时，再发一个相同的备份请求，谁先成功用谁
+    - 到达 deadline (time.time() 时间戳) 仍无结果则取消所有请求并抛 LLMDeadlineExceeded
+    - stream(): 流式请求，对冲比的是谁先吐出第一个 chunk；另外统计首token延迟 (TTFT) 和出决策延迟
+    """
+
+    def __init__(self, client, request, hedge_after=None, stats=None):
+        self.client = client
+        self.request = dict(request)
+        self.hedge_after = hedge_after
+        self.stats = stats if stats is not None else LatencyStats()
+        self.ttft_stats = LatencyStats()  # 首个 chunk 到达
+        self.ttd_stats = LatencyStats()   # signal + confidence 解析完成
+
+    async def _call(self, messages):
+        return await self.client.chat.completions.create(messages=messages, **self.request)
+
+    async def _open_stream(self, messages):
+        """发起流式请求并等到第一个 chunk，返回 (流, 迭代器, 第一个 chunk)；等待中被取消 / 出错时先关闭流"""
+        request = dict(self.request, stream=True, stream_options={'include_usage': True})
+        stream = await self.client.chat.completions.create(messages=messages, **request)
+        if not hasattr(stream, '__aiter__'):
+            return None, None, stream  # 不支持流式的客户端直接给了完整回复
+        it = stream.__aiter__()
+        try:
+            return stream, it, await it.__anext__()
+        except StopAsyncIteration:
+            return None, None, None
+        except BaseException:
+            await _close_stream(stream)
+            raise
+
+    async def _race(self, call, deadline, start, release=None):
+        """
+        主请求 (+ 对冲请求) 竞速，返回 (结果, 'primary'/'hedge')；失败 / 超时记入 stats 后抛出。
+        落败的请求取消，若它也已拿到结果则交给 release(结果) 释放
+        """
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            self.stats.record(None, 'timeout')
+            raise LLMDeadlineExceeded("截止时间已过")
+
+        primary = asyncio.ensure_future(call())
+        pending = {primary}
+        hedge = winner = None
+        last_error = None
+        try:
+            while pending:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                wait_for = remaining
+                if hedge is None and self.hedge_after is not None:
+                    wait_for = min(wait_for, max(0.0, self.hedge_after - (time.monotonic() - start)))
+
+                done, pending = await asyncio.wait(pending, timeout=wait_for,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        return task.result(), 'hedge' if task is hedge else 'primary'
+                    last_error = task.exception()
+
+                # 主请求迟迟不回 (或已经失败)，发出对冲请求
+                if hedge is None and self.hedge_after is not None \
+                        and (not pending or time.monotonic() - start >= self.hedge_after):
+                    hedge = asyncio.ensure_future(call())
+                    pending.add(hedge)
+        finally:
+            for task in (primary, hedge):
+                if task is not None and task is not winner:
+                    _discard(task, release)
+
+        if last_error is not None and deadline - time.time() > 0:
+            self.stats.record(None, 'error')
+            raise last_error
+        self.stats.record(None, 'timeout')
+        raise LLMDeadlineExceeded(f"{time.monotonic() - start:.1f}s 内未收到回复")
+
+    async def complete(self, messages, deadline):
+        start = time.monotonic()
+        response, outcome = await self._race(lambda: self._call(messages), deadline, start)
+        self.stats.record(time.monotonic() - start, outcome)
+        return response
+
+    async def stream(self, messages, deadline, early_fields=('signal', 'confidence'), on_early=None):
+        """
+        流式调用: early_fields 全部解析出来时调用 on_early(fields) (只调用一次)，之后继续接收剩余字段。
+        返回 {'content', 'fields', 'usage', 'ttft', 'ttd', 'total', 'outcome'}，时间单位秒
+        """
+        start = time.monotonic()
+        (stream, it, chunk), outcome = await self._race(lambda: self._open_stream(messages), deadline, start,
+                                                        release=lambda res: _close_stream(res[0]))
+        ttft = time.monotonic() - start
+        self.ttft_stats.record(ttft, outcome)
+
+        parser = JSONFieldStream()
+        usage, ttd = None, None
+        try:
+            while chunk is not None:
+                usage = getattr(chunk, 'usage', None) or usage
+                parser.feed(_chunk_text(chunk))
+                if ttd is None and parser.has(early_fields):
+                    ttd = time.monotonic() - start
+                    self.ttd_stats.record(ttd, outcome)
+                    if on_early is not None:
+                        on_early(dict(parser.fields))
+                if it is None:
+                    break
+                remaining = deadline - time.time()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    chunk = await asyncio.wait_for(it.__anext__(), remaining)
+                except StopAsyncIteration:
+                    chunk = None
+                except asyncio.TimeoutError:
+                    self.stats.record(None, 'timeout')
+                    raise LLMDeadlineExceeded(f"{time.monotonic() - start:.1f}s 内回复未接收完")
+        finally:
+            if chunk is not None:
+                await _close_stream(stream)  # 超时 / 出错提前退出: 关掉流，连接放回连接池
+
+        total = time.monotonic() - start
+        self.stats.record(total, outcome)
+        return {'content': parser.text, 'fields': parser.fields, 'usage': usage,
+                'ttft': ttft, 'ttd': ttd, 'total': total, 'outcome': outcome}
@@ -0,0 +1,423 @@
+import re
+import json
+
+# DeepSeek 回复的 JSON 处理
+# JSONFieldStream: 流式增量解析，顶层字段一完整就可读取 (signal / confidence 先到先用)
+# parse_decision: 本地容错修复 + 字段校验，格式问题不再花一次 LLM 往返重问
+
+SIGNALS = ('BUY', 'SELL', 'HOLD')
+CONFIDENCES = ('HIGH', 'MEDIUM', 'LOW')
+TREND_STATUSES = ('TREND', 'RANGE', 'WEAKENING')
+SIGNAL_ALIASES = {'LONG': 'BUY', '做多': 'BUY', '买入': 'BUY', '开多': 'BUY',
+                  'SHORT': 'SELL', '做空': 'SELL', '卖出': 'SELL', '开空': 'SELL',
+                  '观望': 'HOLD', 'WAIT': 'HOLD', 'NONE': 'HOLD'}
+CONFIDENCE_ALIASES = {'高': 'HIGH', '中': 'MEDIUM', '低': 'LOW', 'MID': 'MEDIUM'}
+DECISION_FIELDS = ('signal', 'confidence', 'trend_range_status', 'reason', 'stop_loss', 'take_profit')
+INVALID_SIGNAL_REASON = 'AI返回格式异常，强制观望'
+
+_QUOTES = {'"': '"', "'": "'", '“': '”'}
+_FULLWIDTH = {'：': ':', '，': ',', '｛': '{', '｝': '}'}
+_PY_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_BARE_END = set(',:{}[]"\'“\n') | set(_FULLWIDTH)
+_NUMBER = re.compile(r'-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?$')
+_NEXT_KEY = re.compile(r'["\'“][\w ]+["\'”]\s*[:：]')  # 缺逗号时紧跟的下一个 key
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class DecisionParseError(ValueError):
+    """回复里找不到可恢复的决策"""
+
+
+class JSONFieldStream(object):
+    """
+    逐块喂入文本，单遍扫描，顶层对象的每个字段值完整后立刻写入 fields。
+    第一个 '{' 之前的内容 (如 ```json 代码块标记) 直接跳过；数字等标量遇到 ',' 或 '}' 才算完整，
+    不会把被切断的 "0.1" 当成 0.1
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.fields = {}
+        self.pos = 0            # 已扫描到的位置
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.token_start = None  # 当前字符串 / 标量 / 嵌套值的起点
+        self.key = None
+        self.expect = 'key'      # key / colon / value / scalar / nested / comma
+        self.done = False
+
+    def feed(self, chunk):
+        """喂入一段文本，返回本次新完成的字段名列表"""
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self.pos, len(text)):
+            if self.done:
+                break
+            ch = text[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self._string_done(text[self.token_start:i + 1], completed)
+                continue
+
+            if self.depth == 0:
+                if ch == '{':
+                    self.depth = 1
+                continue
+
+            if self.expect == 'scalar' and (ch in ',}' or ch.isspace()):
+                self._set(text[self.token_start:i], completed)
+                self.expect = 'comma'
+
+            if ch == '"':
+                self.in_string = True
+                if self.depth == 1:
+                    self.token_start = i
+            elif ch in '{[':
+                if self.depth == 1 and self.expect == 'value':
+                    self.token_start = i
+                    self.expect = 'nested'
+                self.depth += 1
+            elif ch in '}]':
+                self.depth -= 1
+                if self.depth == 1 and self.expect == 'nested':
+                    self._set(text[self.token_start:i + 1], completed)
+                    self.expect = 'comma'
+                elif self.depth == 0:
+                    self.done = True
+            elif self.depth == 1:
+                if ch == ':':
+                    self.expect = 'value'
+                elif ch == ',':
+                    self.expect = 'key'
+                elif self.expect == 'value' and not ch.isspace():
+                    self.token_start = i
+                    self.expect = 'scalar'
+        self.pos = len(text)
+        return completed
+
+    def _string_done(self, raw, completed):
+        if self.expect == 'key':
+            self.key = json.loads(raw)
+            self.expect = 'colon'
+        elif self.expect == 'value':
+            self._set(raw, completed)
+            self.expect = 'comma'
+
+    def _set(self, raw, completed):
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw  # 非标准写法原样保留，交给后续校验
+        if self.key is not None:
+            self.fields[self.key] = value
+            completed.append(self.key)
+        self.key = None
+
+    def has(self, names):
+        return all(name in self.fields for name in names)
+
+
+class RepairStats(object):
+    """各修复路径的触发次数 (clean = 原样即可解析)"""
+
+    def __init__(self):
+        self.replies = 0
+        self.counts = {}
+
+    def record(self, paths):
+        self.replies += 1
+        for path in paths or ['clean']:
+            self.counts[path] = self.counts.get(path, 0) + 1
+
+    def summary(self):
+        counts = ' '.join(f"{k}={v}" for k, v in sorted(self.counts.items(), key=lambda kv: -kv[1]))
+        return f"JSON 修复统计: {self.replies} 条回复 ({counts})"
+
+
+def _read_string(text, i, closer, paths):
+    """从引号后的 i 开始读字符串，返回 (内容, 结束位置, 是否闭合)"""
+    buf = []
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch == '\\' and i + 1 < n:
+            esc = text[i + 1]
+            if esc == 'u' and i + 6 <= n:
+                buf.append(chr(int(text[i + 2:i + 6], 16)) if re.match(r'[0-9a-fA-F]{4}$', text[i + 2:i + 6])
+                           else text[i:i + 6])
+                i += 6
+            else:
+                buf.append(_ESCAPES.get(esc, esc))
+                i += 2
+            continue
+        if ch == closer:
+            # 后面紧跟分隔符 (或结尾) 才算字符串结束，否则是没转义的内部引号
+            j = i + 1
+            while j < n and text[j].isspace():
+                j += 1
+            if j == n or text[j] in ',:}]，：｝' or _NEXT_KEY.match(text, j):
+                return ''.join(buf), i + 1, True
+            _note(paths, 'inner_quotes')
+        buf.append(ch)
+        i += 1
+    return ''.join(buf), n, False
+
+
+def _note(paths, path):
+    if path not in paths:
+        paths.append(path)
+
+
+def _rewrite(text, i, paths):
+    """
+    从第一个 '{' 开始单遍扫描，边读边输出合法 JSON:
+    单引号 / 中文引号、中文冒号逗号、裸 key / 裸字符串、True/None、缺失或多余的逗号、
+    注释、被截断的结尾 (补齐引号和括号，截断的数字置 null)
+    """
+    out, stack = [], []
+    last = None            # open / key / colon / value / comma
+    n = len(text)
+
+    def prefix(kind):
+        # 输出 key 或 value 前按上下文补上逗号 / 冒号
+        nonlocal last
+        in_object = stack and stack[-1] == '{'
+        if kind == 'value' and in_object:
+            if last == 'key':
+                _note(paths, 'missing_colon')
+                out.append(':')
+            elif last in ('open', 'comma', 'value'):
+                kind = 'key'  # 对象里该出现 key 的位置
+        if kind == 'key' or not in_object:
+            if last == 'comma':
+                out.append(',')
+            elif last == 'value':
+                _note(paths, 'missing_comma')
+                out.append(',')
+        last = kind
+
+    while i < n:
+        ch = text[i]
+        if ch in _FULLWIDTH:
+            _note(paths, 'fullwidth')
+            ch = _FULLWIDTH[ch]
+        if ch.isspace():
+            i += 1
+        elif ch in _QUOTES:
+            if ch != '"':
+                _note(paths, 'quotes')
+            value, i, closed = _read_string(text, i + 1, _QUOTES[ch], paths)
+            if not closed:
+                _note(paths, 'truncated')
+            prefix('value')
+            out.append(json.dumps(value, ensure_ascii=False))
+        elif ch in '{[':
+            prefix('value')
+            out.append(ch)
+            stack.append(ch)
+            last = 'open'
+            i += 1
+        elif ch in '}]':
+            if last == 'comma':
+                _note(paths, 'trailing_comma')
+            elif last in ('key', 'colon'):
+                _note(paths, 'missing_value')
+                out.append(':null' if last == 'key' else 'null')
+            closer = '}' if stack.pop() == '{' else ']'
+            if closer != ch:
+                _note(paths, 'brackets')
+            out.append(closer)
+            last = 'value'
+            i += 1
+            if not stack:
+                return ''.join(out)
+        elif ch == ',':
+            if last in ('open', 'comma'):
+                _note(paths, 'extra_comma')
+            elif last in ('key', 'colon'):
+                _note(paths, 'missing_value')
+                out.append(':null' if last == 'key' else 'null')
+                last = 'comma'
+            else:
+                last = 'comma'
+            i += 1
+        elif ch == ':':
+            if last == 'key':
+                out.append(':')
+                last = 'colon'
+            i += 1
+        elif text.startswith('//', i) or text.startswith('/*', i):
+            _note(paths, 'comments')
+            end = text.find('\n' if text[i + 1] == '/' else '*/', i + 2)
+            i = n if end < 0 else end + (1 if text[i + 1] == '/' else 2)
+        else:
+            j = i
+            while j < n and text[j] not in _BARE_END:
+                j += 1
+            token = text[i:j].strip()
+            in_key = stack[-1] == '{' and last in ('open', 'comma')
+            if in_key:
+                _note(paths, 'bare_keys')
+                prefix('key')
+                out.append(json.dumps(token, ensure_ascii=False))
+            else:
+                prefix('value')
+                if j == n:
+                    _note(paths, 'truncated')
+                    token = 'null' if _NUMBER.match(token) else token  # 截断处的数字不可信
+                if token in ('true', 'false', 'null') or _NUMBER.match(token):
+                    out.append(token)
+                elif token in _PY_LITERALS:
+                    _note(paths, 'python_literals')
+                    out.append(_PY_LITERALS[token])
+                else:
+                    _note(paths, 'bare_values')
+                    out.append(json.dumps(token, ensure_ascii=False))
+            i = j
+
+    _note(paths, 'truncated')
+    if last in ('key', 'colon'):
+        out.append(':null' if last == 'key' else 'null')
+    out.extend('}' if c == '{' else ']' for c in reversed(stack))
+    return ''.join(out)
+
+
+def _regex_fields(text):
+    """结构彻底坏掉时的兜底: 按字段名逐个抠值"""
+    fields = {}
+    for name in DECISION_FIELDS:
+        m = re.search(r'["\'“]?%s["\'”]?\s*[:：]\s*["\'“]?([^"\'”,，}\n]*)' % name, text)
+        if m:
+            fields[name] = m.group(1).strip()
+    return fields
+
+
+def repair_json(text):
+    """
+    从回复中提取第一个 JSON 对象，能直接解析就直接返回，否则单遍修复后再解析，再不行按字段名抠值。
+    返回 (dict, 触发的修复路径)；找不到任何字段时抛 DecisionParseError
+    """
+    paths = []
+    start = text.find('{')
+    if start < 0:
+        start = text.find('｛')
+    if start < 0:
+        fields = _regex_fields(text)
+        if not fields:
+            raise DecisionParseError(f"回复中没有 JSON 对象: {text[:80]!r}")
+        return fields, ['regex']
+
+    end = text.rfind('}')
+    outside = text[:start] + (text[end + 1:] if end > start else '')
+    if re.sub(r'```(json)?', '', outside).strip():
+        paths.append('extract')  # 前后夹杂说明文字 (```json 代码块标记不算)
+    if end > start:
+        try:
+            obj = json.loads(text[start:end + 1])
+            if isinstance(obj, dict):
+                return obj, paths
+        except ValueError:
+            pass
+
+    try:
+        obj = json.loads(_rewrite(text, start, paths))
+    except (ValueError, IndexError):
+        obj = None
+    if not isinstance(obj, dict):
+        obj = _regex_fields(text)
+        if not obj:
+            raise DecisionParseError(f"JSON 无法修复: {text[:80]!r}")
+        paths.append('regex')
+    return obj, paths
+
+
+def _to_price(value, paths):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, (list, dict)):
+        _note(paths, 'price_invalid')
+        return None
+    text = str(value).strip()
+    if text.lower() in ('', 'null', 'none', 'n/a', '无'):
+        return None
+    # 保留紧贴数字的负号 ("-0.5" 是 -0.5，不能当成 0.5)，非正数由 validate_decision 丢弃；
+    # "0.15-0.16" 这类区间取第一个数
+    m = re.search(r'(?<![\d.])[-−]?\d+(?:\.\d+)?', text.replace(',', ''))
+    if m is None:
+        _note(paths, 'price_invalid')
+        return None
+    _note(paths, 'price_string')
+    return float(m.group(0).replace('−', '-'))
+
+
+def _enum(value, choices, aliases):
+    text = str(value or '').strip().strip('【】[]()').upper()
+    if text in choices:
+        return text, False
+    for alias, target in list(zip(choices, choices)) + list(aliases.items()):
+        rest = text[len(alias):len(alias) + 1]
+        if text.startswith(alias) and not (rest.isascii() and rest.isalpha()):  # 如 "BUY (做多)"，但不认 "BUYY"
+            return target, True
+    return None, False
+
+
+def validate_decision(fields, price=None, paths=None):
+    """
+    把解析出的字段整理成固定结构的决策: signal / confidence 归一到枚举，
+    止损止盈转成 float 并检查在现价的正确一侧 (做多: 止损<现价<止盈)，不合理的置 None
+    """
+    paths = paths if paths is not None else []
+    signal, aliased = _enum(fields.get('signal'), SIGNALS, SIGNAL_ALIASES)
+    if aliased:
+        _note(paths, 'signal_alias')
+    confidence, aliased = _enum(fields.get('confidence'), CONFIDENCES, CONFIDENCE_ALIASES)
+    if aliased:
+        _note(paths, 'confidence_alias')
+    if confidence is None:
+        _note(paths, 'confidence_invalid')
+        confidence = 'LOW'
+    status = str(fields.get('trend_range_status') or '').strip().upper()
+
+    decision = {
+        'signal': signal or 'HOLD',
+        'confidence': confidence,
+        'trend_range_status': status if status in TREND_STATUSES else None,
+        'reason': str(fields.get('reason') or '无'),
+        'stop_loss': _to_price(fields.get('stop_loss'), paths),
+        'take_profit': _to_price(fields.get('take_profit'), paths),
+    }
+    if signal is None:
+        _note(paths, 'signal_invalid')
+        decision['reason'] = INVALID_SIGNAL_REASON
+
+    for name in ('stop_loss', 'take_profit'):
+        level = decision[name]
+        if level is not None and level <= 0:
+            decision[name] = None
+            _note(paths, f'{name}_dropped')
+    if price and decision['signal'] in ('BUY', 'SELL'):
+        long = decision['signal'] == 'BUY'
+        sl, tp = decision['stop_loss'], decision['take_profit']
+        if sl is not None and (sl >= price if long else sl <= price):
+            decision['stop_loss'] = None
+            _note(paths, 'stop_loss_dropped')
+        if tp is not None and (tp <= price if long else tp >= price):
+            decision['take_profit'] = None
+            _note(paths, 'take_profit_dropped')
+    return decision, paths
+
+
+def parse_decision(text, price=None):
+    """repair_json + validate_decision，返回 (决策, 修复路径)"""
+    fields, paths = repair_json(text)
+    return validate_decision(fields, price, paths)
@@ -0,0 +1,98 @@
+import os
+import sys
+import gzip
+import queue
+import atexit
+import shutil
+import threading
+from datetime import datetime
+
+# 日志系统：终端照常输出，写文件交给后台线程批量完成，
+# 主流程 print 不再等待磁盘 flush；按大小 / 日期切分并 gzip 压缩旧文件
+
+
+class Logger(object):
+    _STOP = object()
+
+    def __init__(self, log_dir='logs', max_bytes=20 * 1024 * 1024, flush_interval=1.0, batch_size=256):
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.terminal = sys.stdout
+        self.queue = queue.SimpleQueue()
+        self._open_new_file()
+        print(f"📄 日志文件已创建: {self.filename}")
+
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+        # 进程退出前保证剩余日志全部落盘
+        atexit.register(self.close)
+
+    def _open_new_file(self):
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.filename = os.path.join(self.log_dir, f"log_{timestamp}.log")
+        seq = 1
+        while os.path.exists(self.filename) or os.path.exists(self.filename + '.gz'):
+            self.filename = os.path.join(self.log_dir, f"log_{timestamp}_{seq}.log")
+            seq += 1
+        self.log = open(self.filename, 'a', encoding='utf-8')
+        self.opened_day = datetime.now().date()
+
+    def write(self, message):
+        self.terminal.write(message)
+        if not self._closed:
+            self.queue.put(message)
+
+    def flush(self):
+        # 文件由后台线程定时 flush，这里只刷终端
+        self.terminal.flush()
+
+    def __getattr__(self, name):
+        # isatty / encoding 等属性透传给原始 stdout
+        return getattr(self.__dict__.get('terminal', sys.__stdout__), name)
+
+    # --- 后台写线程 ---
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = []
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+                while True:
+                    if item is self._STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    item = self.queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            if batch:
+                self.log.write(''.join(batch))
+                self.log.flush()
+            self._maybe_rotate()
+        self.log.close()
+
+    def _maybe_rotate(self):
+        if self.log.tell() < self.max_bytes and datetime.now().date() == self.opened_day:
+            return
+        old = self.filename
+        self.log.close()
+        self._open_new_file()
+        with open(old, 'rb') as src, gzip.open(old + '.gz', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(old)
+
+    def close(self):
+        """停止后台线程并写完队列中剩余内容 (可重复调用)"""
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put(self._STOP)
+        self._thread.join(timeout=10)
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 分阶段耗时埋点: 单调纳秒计时 -> 按 (阶段, 标的) 聚合成直方图，
+# 以 Prometheus 文本格式在本地端口暴露 (/metrics)，同时每个周期追加一行到 JSONL
+
+STAGES = ('candle_confirm', 'ohlcv_fetch', 'indicators', 'position', 'prompt_build', 'llm_call', 'json_parse', 'order')
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram(object):
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.total += seconds
+        self.count += 1
+
+
+class StageMetrics(object):
+    def __init__(self, jsonl_path=None):
+        self.jsonl_path = jsonl_path
+        self.histograms = {}  # (stage, symbol) -> Histogram
+        self.cycles = {}      # symbol -> 本周期各阶段耗时 (ms)
+        self.lock = threading.Lock()
+
+    def observe(self, stage, symbol, seconds):
+        with self.lock:
+            hist = self.histograms.get((stage, symbol))
+            if hist is None:
+                hist = self.histograms[(stage, symbol)] = Histogram()
+            hist.observe(seconds)
+            cycle = self.cycles.setdefault(symbol, {})
+            cycle[stage] = round(cycle.get(stage, 0.0) + seconds * 1000, 3)
+
+    @contextmanager
+    def span(self, stage, symbol):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.observe(stage, symbol, (time.perf_counter_ns() - start) / 1e9)
+
+    def end_cycle(self, symbol):
+        """本周期结束: 各阶段耗时追加写入 JSONL，并返回该记录"""
+        with self.lock:
+            stages = self.cycles.pop(symbol, {})
+        record = {'ts': time.time(), 'symbol': symbol, 'stages_ms': stages,
+                  'total_ms': round(sum(stages.values()), 3)}
+        if self.jsonl_path:
+            os.makedirs(os.path.dirname(self.jsonl_path) or '.', exist_ok=True)
+            with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return record
+
+    def render_prometheus(self):
+        lines = ['# HELP tradingbot_stage_seconds Latency of each trading pipeline stage.',
+                 '# TYPE tradingbot_stage_seconds histogram']
+        with self.lock:
+            items = sorted(self.histograms.items())
+            for (stage, symbol), hist in items:
+                labels = f'stage="{stage}",symbol="{symbol}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS, hist.counts):
+                    cumulative += count
+                    lines.append(f'tradingbot_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'tradingbot_stage_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+                lines.append(f'tradingbot_stage_seconds_sum{{{labels}}} {hist.total:.9f}')
+                lines.append(f'tradingbot_stage_seconds_count{{{labels}}} {hist.count}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        """后台线程启动 /metrics 端点，返回 server (可 shutdown)"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # 不刷屏
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
+
+
+class _NullMetrics(object):
+    """未启用埋点时的空实现，调用方无需判断"""
+
+    @contextmanager
+    def span(self, stage, symbol):
+        yield
+
+    def end_cycle(self, symbol):
+        return None
+
+
+NULL_METRICS = _NullMetrics()
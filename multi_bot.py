@@ -0,0 +1,313 @@
+import os
+import sys
+import copy
+import time
+import asyncio
+from datetime import datetime
+import ccxt.async_support as ccxt_async
+from openai import AsyncOpenAI
+
+import app_v2 as bot
+from llm_client import HedgedLLM, LatencyStats, LLMDeadlineExceeded
+from llm_cassette import wrap_client
+from llm_json import DecisionParseError
+import http_pool
+from account_state import AsyncAccountState
+from order_exec import submit_orders_async
+from startup import load_markets_cached_async
+from scheduler import CandleScheduler, ServerClock, confirm_candle_close_async
+
+# --- 多标的并发版 ---
+# 一个进程、一个交易所会话、一个 DeepSeek 客户端，每个标的一个 asyncio 任务，
+# K线获取 / LLM 请求 / 下单在不同标的之间互相重叠，不再串行阻塞。
+
+# 每个标的可以覆盖 TRADE_CONFIG 中的任意字段
+SYMBOL_CONFIGS = [
+    {'symbol': 'DOGE/USDT:USDT'},
+    {'symbol': 'BTC/USDT:USDT', 'amount': 0.01, 'leverage': 2},
+    {'symbol': 'ETH/USDT:USDT', 'amount': 0.1, 'leverage': 2},
+]
+
+MAX_CONCURRENT_LLM = 8  # 同时在途的 DeepSeek 请求上限
+
+
+class SymbolBot(object):
+    """单个标的的交易任务"""
+
+    def __init__(self, overrides, exchange, llm, llm_slots, clock=None, account_state=None):
+        self.cfg = copy.deepcopy(bot.TRADE_CONFIG)
+        self.cfg.update(overrides)
+        self.symbol = self.cfg['symbol']
+        self.exchange = exchange
+        self.llm = llm
+        self.llm_slots = llm_slots
+        self.clock = clock or ServerClock()
+        self.resampler = None  # 多周期本地合成 (cfg['resample'] 开启时)
+        self.account_state = account_state or AsyncAccountState(exchange)
+        # 每个标的独立的模拟账本 (各自一个事件文件)
+        self.account = bot.open_paper_ledger(self.cfg, self.log) if self.cfg['test_mode'] else None
+
+    def log(self, msg):
+        print(f"[{self.symbol}] {msg}")
+
+    async def setup(self):
+        """设置杠杆 + 读取合约面值"""
+        try:
+            await self.exchange.set_leverage(self.cfg['leverage'], self.symbol, {'mgnMode': 'cross'})
+            self.cfg['contract_size'] = float(self.exchange.markets[self.symbol]['contractSize'])
+            self.log(f"✅ 全仓 {self.cfg['leverage']}x | 1张 = {self.cfg['contract_size']} 个币")
+            return True
+        except Exception as e:
+            self.log(f"❌ 初始化失败: {e}")
+            return False
+
+    async def fetch_ohlcv(self):
+        """主周期K线: 有本地仓库时走 app_v2 的增量逻辑 (异步版，仓库读写在线程里)"""
+        if not bot.candle_store:
+            return await self.exchange.fetch_ohlcv(self.symbol, self.cfg['timeframe'], limit=self.cfg['data_points'])
+        return await bot.fetch_ohlcv_with_store_async(self.exchange, self.cfg, self.clock.now_ms())
+
+    async def get_market_data(self):
+        try:
+            rs = None
+            with bot.metrics.span('ohlcv_fetch', self.symbol):
+                if self.cfg.get('resample'):
+                    rs = self.resampler = await bot.sync_resampler_async(self.exchange, self.cfg, self.resampler,
+                                                                         self.clock.now_ms())
+                    ohlcv = rs.ohlcv(self.cfg['timeframe'], self.cfg['data_points'])
+                else:
+                    ohlcv = await self.fetch_ohlcv()
+            with bot.metrics.span('indicators', self.symbol):
+                data = bot.build_market_data(ohlcv, self.cfg)
+                if data and rs:
+                    bot.attach_mtf_context(data, rs, self.cfg)
+                return data
+        except Exception as e:
+            self.log(f"数据获取失败: {e}")
+            return None
+
+    async def get_real_position(self):
+        try:
+            with bot.metrics.span('position', self.symbol):
+                positions = await self.account_state.positions(self.symbol)
+            return bot.parse_real_position(positions, self.symbol)
+        except:
+            return None
+
+    async def analyze_market(self, data):
+        """请求DeepSeek分析 (异步)"""
+        if self.cfg['test_mode']:
+            pos_side = self.account.side
+            pos_str = bot.format_position_text(data, self.cfg, account=self.account)
+        else:
+            real_pos = await self.get_real_position()
+            pos_side = real_pos['side'] if real_pos else None
+            pos_str = bot.format_position_text(data, self.cfg, real_pos=real_pos)
+
+        # 决策缓存在所有标的间共享 (key 中包含标的和周期)
+        cache_key = None
+        if bot.decision_cache:
+            cache_key = bot.decision_cache.make_key(self.symbol, self.cfg['timeframe'],
+                                                    data['indicators'], pos_side)
+            cached = bot.decision_cache.get(cache_key)
+            if cached:
+                self.log(f"♻️ 命中决策缓存，跳过 DeepSeek | {bot.decision_cache.summary()}")
+                return cached
+
+        with bot.metrics.span('prompt_build', self.symbol):
+            prompt = bot.build_prompt(data, pos_str, self.cfg)
+
+        try:
+            if bot.llm_stream_enabled():
+                return await self.analyze_market_stream(data, prompt, cache_key)
+
+            with bot.metrics.span('llm_call', self.symbol):
+                async with self.llm_slots:
+                    response = await self.llm.complete(
+                        bot.build_messages(prompt), bot.llm_deadline(data, self.cfg)
+                    )
+            self.log(f"⏱️ DeepSeek 延迟: {self.llm.stats.summary()}")
+            # 所有标的共用同一段静态 prompt 前缀，命中统计也共用一份
+            if bot.prompt_cache_stats.record(getattr(response, 'usage', None)):
+                self.log(f"🧩 {bot.prompt_cache_stats.summary()}")
+            raw_content = response.choices[0].message.content
+            self.log(f"DeepSeek原始回复: {raw_content}")
+            with bot.metrics.span('json_parse', self.symbol):
+                result = bot.parse_ai_response(raw_content, data['price'], self.log)
+            if cache_key is not None:
+                bot.decision_cache.put(cache_key, result)
+            return result
+        except LLMDeadlineExceeded as e:
+            self.log(f"⌛ DeepSeek 超时: {e}")
+            return bot.LLM_TIMEOUT_DECISION.copy()
+        except DecisionParseError as e:
+            self.log(f"🧩 DeepSeek 回复无法解析: {e} | {bot.json_repair_stats.summary()}")
+            return bot.LLM_UNPARSEABLE_DECISION.copy()
+        except Exception as e:
+            self.log(f"🧠 DeepSeek 思考失败: {e}")
+            return {"signal": "HOLD", "reason": "API连接错误", "confidence": "LOW"}
+
+    async def analyze_market_stream(self, data, prompt, cache_key):
+        """流式版: signal + confidence 到齐即返回，剩余字段由后台任务接收 (见 app_v2.analyze_market_stream)"""
+        early = asyncio.get_running_loop().create_future()
+
+        async def run():
+            async with self.llm_slots:
+                return await self.llm.stream(bot.build_messages(prompt), bot.llm_deadline(data, self.cfg),
+                                             on_early=early.set_result)
+
+        full = asyncio.ensure_future(run())
+        with bot.metrics.span('llm_call', self.symbol):
+            await asyncio.wait([early, full], return_when=asyncio.FIRST_COMPLETED)
+
+        with bot.metrics.span('json_parse', self.symbol):
+            if not early.done():
+                return bot.finish_llm_stream(full.result(), data['price'], cache_key, self.llm, self.log)
+            full.add_done_callback(lambda f: bot.finish_llm_stream_tail(f, data['price'], cache_key,
+                                                                        self.llm, self.log))
+            return bot.early_decision(early.result(), self.llm, self.log)
+
+    async def settle_paper_funding(self, mark, now_ms):
+        """与 app_v2.settle_paper_funding 相同 (异步查费率)"""
+        due = self.account.funding_due(now_ms)
+        if not due:
+            return
+        rate = bot.fixed_funding_rate(self.cfg)
+        if rate is None:
+            try:
+                rate = float((await self.exchange.fetch_funding_rate(self.symbol))['fundingRate'])
+            except Exception as e:
+                self.log(f"⚠️ 资金费率获取失败，下周期再结算: {e}")
+                return
+        bot.apply_paper_funding(self.account, due, rate, mark, self.log)
+
+    async def execute_trade(self, signal, current_price):
+        if self.cfg['test_mode']:
+            await self.settle_paper_funding(current_price, self.clock.now_ms())
+        sig = bot.review_signal(signal)
+        if sig is None:
+            return
+
+        if self.cfg['test_mode']:
+            with bot.metrics.span('order', self.symbol):
+                bot.simulate_trade(self.account, sig, current_price, self.cfg, self.clock.now_ms(), self.log)
+            return
+
+        signal_at = time.perf_counter()
+        try:
+            # 周期开始时已预取，这里直接读缓存
+            real_pos, balance = await asyncio.gather(
+                self.get_real_position(), self.account_state.balance()
+            )
+            if not bot.check_live_balance(balance['USDT']['free'], current_price, self.cfg):
+                return
+
+            orders = bot.plan_live_orders(sig, real_pos, self.cfg)
+            if not orders:
+                return
+            for order in orders:
+                self.log(order['msg'])
+            with bot.metrics.span('order', self.symbol):
+                try:
+                    filled = await submit_orders_async(self.exchange, orders, self.cfg.get('order_fill'))
+                finally:
+                    self.account_state.on_fill(self.symbol)
+            bot.report_fill(filled, signal_at, bot.fill_latency,
+                            self.cfg.get('reversal', 'sequential') if real_pos else 'open')
+        except Exception as e:
+            self.log(f"❌ 实盘下单错误: {e}")
+
+    async def job(self):
+        self.log(f"⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} K线收盘，开始执行策略")
+        if not self.cfg['test_mode']:
+            self.account_state.begin_cycle(self.symbol)
+        if self.cfg.get('candle_confirm'):
+            with bot.metrics.span('candle_confirm', self.symbol):
+                await confirm_candle_close_async(self.exchange.fetch_ohlcv, self.symbol, self.cfg['timeframe'],
+                                                 self.clock, self.cfg['candle_confirm'])
+        data = await self.get_market_data()
+        if not data:
+            self.log("⚠️ 数据获取失败，跳过本次")
+            bot.metrics.end_cycle(self.symbol)
+            return
+
+        self.log(f"💎 现价: {data['price']}")
+        decision = await self.analyze_market(data)
+        await self.execute_trade(decision, data['price'])
+        self.log(f"🔌 {http_pool.stats.summary()}")
+        cycle = bot.metrics.end_cycle(self.symbol)
+        if cycle:
+            self.log(f"⏱️ 本周期耗时 {cycle['total_ms']:.0f} ms")
+
+
+async def run_all(symbol_configs):
+    # 连接池按标的数量放大: 每个标的同时可能有行情 + 持仓/余额 + 下单请求在途
+    pool_size = max(http_pool.POOL_CONFIG['pool_maxsize'], 3 * len(symbol_configs))
+    # 空闲连接至少保留到周期最长的标的下一根K线
+    timeframe = max((c.get('timeframe', bot.TRADE_CONFIG['timeframe']) for c in symbol_configs),
+                    key=ccxt_async.Exchange.parse_timeframe)
+    okx_session = http_pool.aiohttp_session('okx', limit=pool_size, timeframe=timeframe)
+    exchange = ccxt_async.okx({
+        'options': {'defaultType': 'swap'},
+        'apiKey': os.getenv('OKX_API_KEY'),
+        'secret': os.getenv('OKX_SECRET'),
+        'password': os.getenv('OKX_PASSWORD'),
+        'session': okx_session,
+    })
+    llm_client = AsyncOpenAI(
+        api_key=os.getenv('DEEPSEEK_API_KEY'),
+        base_url="https://api.deepseek.com",
+        http_client=http_pool.httpx_async_client('deepseek', max_connections=2 * MAX_CONCURRENT_LLM,
+                                                 timeframe=timeframe)
+    )
+    # 所有标的共享一份延迟统计
+    llm = HedgedLLM(wrap_client(llm_client, bot.llm_cassette), bot.DEEPSEEK_REQUEST,
+                    hedge_after=bot.TRADE_CONFIG.get('llm_hedge_after_sec'), stats=LatencyStats())
+    llm_slots = asyncio.Semaphore(MAX_CONCURRENT_LLM)
+
+    try:
+        if bot.TRADE_CONFIG.get('market_cache'):
+            await load_markets_cached_async(exchange, bot.TRADE_CONFIG['market_cache'])
+        else:
+            await exchange.load_markets()
+        clock = ServerClock(exchange.fetch_time)
+        await clock.sync_async()
+        # 余额是全账户的，所有标的共享一份账户缓存
+        account_state = AsyncAccountState(exchange)
+        bots = [SymbolBot(c, exchange, llm, llm_slots, clock, account_state) for c in symbol_configs]
+        ready = await asyncio.gather(*(b.setup() for b in bots))
+        bots = [b for b, ok in zip(bots, ready) if ok]
+        if not bots:
+            print("❌ 无法启动，请检查API配置")
+            return
+
+        print(f"🚀 并发运行 {len(bots)} 个标的: {', '.join(b.symbol for b in bots)}")
+        if bot.TRADE_CONFIG.get('metrics'):
+            bot.metrics.serve(bot.TRADE_CONFIG['metrics']['port'])
+        # 先立刻跑一次，之后由同一个调度堆按各自周期对齐K线收盘触发
+        await asyncio.gather(*(b.job() for b in bots))
+        scheduler = CandleScheduler(clock, delay_sec=0 if bot.TRADE_CONFIG.get('candle_confirm') else 2)
+        for b in bots:
+            scheduler.add(f"{b.symbol} {b.cfg['timeframe']}", b.cfg['timeframe'], b.job)
+        await scheduler.run_async()
+    finally:
+        await exchange.close()
+        await okx_session.close()
+        await llm_client.close()
+
+
+def main():
+    # 启用日志
+    sys.stdout = bot.Logger()
+
+    print("🤖 DeepSeek 智能交易机器人 (多标的并发版)")
+    print(f"⚙️ 模式: {'🧪 模拟测试' if bot.TRADE_CONFIG['test_mode'] else '💸 实盘交易'}")
+
+    try:
+        asyncio.run(run_all(SYMBOL_CONFIGS))
+    except KeyboardInterrupt:
+        print("🛑 程序已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+import os
+import time
+import random
+import argparse
+import itertools
+import functools
+import contextlib
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+
+from backtest import WARMUP_BARS, DEFAULT_ACCOUNT, load_candles, load_csv, sma_rsi_rule, simulate_account, summarize
+from indicator_kernels import IndicatorKernels, rolling_mean
+from scheduler import candle_open
+from shared_arrays import SharedArrays, SharedSpec, attach
+
+# --- 参数扫描 (多进程) ---
+# 1. 主进程把每个周期的K线和 RSI 一次性算成 NumPy 数组
+# 2. 参数点用到的均线也一次算好，连同K线一起放进 shared_memory；工作进程按名字挂载只读视图 (不 pickle)，各自缓存信号
+# 3. 每个参数点跑一次向量化回测，结果汇总成按收益排序的表
+#   python optimizer.py --grid leverage=1,2,3,5 --grid sma_fast=10:30:5 --grid timeframe=15m,1h --workers 8
+#   python optimizer.py --samples 10000 --seed 1    # 在网格范围内随机抽样
+
+# 信号参数在前、账户参数在后: 展开网格时相邻的点共用同一组信号，工作进程的缓存命中率高
+SIGNAL_PARAMS = ('timeframe', 'sma_fast', 'sma_mid', 'sma_slow')
+ACCOUNT_PARAMS = ('leverage', 'amount')
+
+DEFAULT_GRID = {
+    'sma_fast': [10, 20, 30],
+    'sma_mid': [40, 60, 80],
+    'sma_slow': [100, 120, 160],
+    'leverage': [1, 2, 3, 5],
+    'amount': [1],
+}
+
+RESULT_COLUMNS = ('pnl', 'return_pct', 'max_drawdown_pct', 'trades', 'win_rate', 'final_equity')
+
+_DATA = {}  # 工作进程内: timeframe -> {'ts': ..., 'close': ..., 'rsi': ..., 'sma_N': ...} (只读)
+
+
+# --- 1. 数据准备 (主进程) ---
+
+def resample_arrays(cols, timeframe):
+    """把小周期K线数组合成 timeframe 周期 (丢弃最后一根可能未走完的K线)"""
+    opens = np.fromiter((candle_open(int(t), timeframe) for t in cols['ts']), dtype=np.int64, count=len(cols['ts']))
+    starts = np.flatnonzero(np.r_[True, opens[1:] != opens[:-1]])
+    out = {
+        'ts': opens[starts].astype(np.float64),
+        'open': cols['open'][starts],
+        'high': np.maximum.reduceat(cols['high'], starts),
+        'low': np.minimum.reduceat(cols['low'], starts),
+        'close': cols['close'][np.r_[starts[1:] - 1, len(opens) - 1]],
+        'vol': np.add.reduceat(cols['vol'], starts),
+    }
+    return {k: np.ascontiguousarray(v[:-1]) for k, v in out.items()}
+
+
+def load_sweep_data(symbol, base_timeframe, timeframes, csv=None, root='data/candles'):
+    """
+    每个周期只准备一次: 时间戳 + 收盘价 + RSI (RSI 与均线周期无关)。
+    本地仓库没有的周期由 base_timeframe 合成
+    """
+    def frame_to_cols(df):
+        cols = {k: df[k].to_numpy(dtype=np.float64) for k in ('open', 'high', 'low', 'close', 'vol')}
+        cols['ts'] = df['ts'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+        return cols
+
+    base = frame_to_cols(load_csv(csv) if csv else load_candles(symbol, base_timeframe, root))
+    kernels = IndicatorKernels()
+    data = {}
+    for tf in timeframes:
+        cols = base
+        if tf != base_timeframe:
+            df = None if csv else load_candles(symbol, tf, root)
+            cols = frame_to_cols(df) if df is not None and len(df) else resample_arrays(base, tf)
+        ind = kernels.compute(cols['high'], cols['low'], cols['close'], cols['vol'])
+        data[tf] = {'ts': np.ascontiguousarray(cols['ts'], dtype=np.int64),
+                    'close': np.ascontiguousarray(cols['close']), 'rsi': ind['rsi'].copy()}
+    return data
+
+
+def add_smas(data, points):
+    """参数点用到的均线在主进程一次算好加进 data (随 data 进共享内存，各工作进程不再各算一遍)"""
+    periods = {}
+    for p in points:
+        periods.setdefault(p['timeframe'], set()).update((p['sma_fast'], p['sma_mid'], p['sma_slow']))
+    out = {}
+    for tf, d in data.items():
+        cols = dict(d)
+        for n in sorted(periods.get(tf, ())):
+            if f'sma_{n}' not in cols:
+                cols[f'sma_{n}'] = rolling_mean(d['close'], n, np.empty_like(d['close']))
+        out[tf] = cols
+    return out
+
+
+# --- 2. 参数点 ---
+
+def parse_values(text):
+    """'1,2,3' -> [1, 2, 3]；'10:30:5' -> [10, 15, 20, 25, 30]；非数字按字符串处理 (如周期 15m,1h)"""
+    def num(s):
+        try:
+            return int(s)
+        except ValueError:
+            try:
+                return float(s)
+            except ValueError:
+                return s
+    if ':' in text:
+        lo, hi, step = (num(s) for s in text.split(':'))
+        if all(isinstance(v, int) for v in (lo, hi, step)):
+            return list(range(lo, hi + 1, step))
+        return np.arange(lo, hi + step / 2, step).round(10).tolist()
+    return [num(s) for s in text.split(',')]
+
+
+def is_valid(point):
+    return point['sma_fast'] < point['sma_mid'] < point['sma_slow']
+
+
+def grid_points(grid):
+    """网格全展开，跳过均线周期不递增的组合"""
+    keys = [k for k in SIGNAL_PARAMS + ACCOUNT_PARAMS if k in grid]
+    for values in itertools.product(*(grid[k] for k in keys)):
+        point = dict(zip(keys, values))
+        if is_valid(point):
+            yield point
+
+
+def sample_points(grid, n, seed=None):
+    """在网格取值范围内随机抽 n 个不重复的合法点 (按信号参数排序，便于缓存)"""
+    rng = random.Random(seed)
+    keys = [k for k in SIGNAL_PARAMS + ACCOUNT_PARAMS if k in grid]
+    total = int(np.prod([len(grid[k]) for k in keys]))
+    seen, points = set(), []
+    attempts = 0
+    while len(points) < n and attempts < 20 * n and len(seen) < total:
+        attempts += 1
+        values = tuple(rng.choice(grid[k]) for k in keys)
+        if values in seen:
+            continue
+        seen.add(values)
+        point = dict(zip(keys, values))
+        if is_valid(point):
+            points.append(point)
+    points.sort(key=lambda p: tuple(str(p[k]) for k in keys))
+    return points
+
+
+# --- 3. 工作进程 ---
+
+def _init_worker(data):
+    """data: 数组 dict (当前进程内执行) 或共享内存的 SharedSpec (工作进程挂载)"""
+    _DATA.clear()
+    _DATA.update(attach(data) if isinstance(data, SharedSpec) else data)
+    _sma.cache_clear()
+    _signals.cache_clear()
+
+
+@functools.lru_cache(maxsize=64)
+def _sma(timeframe, period):
+    pre = _DATA[timeframe].get(f'sma_{period}')
+    if pre is not None:
+        return pre
+    close = _DATA[timeframe]['close']
+    return rolling_mean(close, period, np.empty_like(close))
+
+
+@functools.lru_cache(maxsize=256)
+def _signals(timeframe, fast, mid, slow):
+    d = _DATA[timeframe]
+    # 示例规则按列名取三条均线，参数点的周期映射到这三列
+    frame = {'close': d['close'], 'rsi': d['rsi'],
+             'sma_20': _sma(timeframe, fast), 'sma_60': _sma(timeframe, mid), 'sma_120': _sma(timeframe, slow)}
+    sig = np.sign(sma_rsi_rule(frame)).astype(np.int8)
+    sig[:max(WARMUP_BARS, slow) - 1] = 0
+    sig.setflags(write=False)
+    return sig
+
+
+def run_point(args):
+    """单个参数点: 信号 (缓存) -> 账户模拟 -> 汇总指标"""
+    point, base_account = args
+    tf = point['timeframe']
+    sig = _signals(tf, point['sma_fast'], point['sma_mid'], point['sma_slow'])
+    account = dict(base_account, **{k: point[k] for k in ACCOUNT_PARAMS if k in point})
+    summary = summarize(simulate_account(sig, _DATA[tf]['close'], account))
+    return dict(point, **{k: summary[k] for k in RESULT_COLUMNS})
+
+
+# --- 4. 调度 ---
+
+@contextlib.contextmanager
+def worker_pool(data, workers):
+    """data 整体拷进一块共享内存再起进程池，工作进程只收到共享内存名和各数组的偏移 / 形状 / dtype"""
+    methods = mp.get_all_start_methods()
+    ctx = mp.get_context('fork' if 'fork' in methods else 'spawn')
+    with SharedArrays(data) as shared:
+        # 进程池先退出，共享内存才释放
+        with ctx.Pool(workers, initializer=_init_worker, initargs=(shared.spec,)) as pool:
+            yield pool
+
+
+def chunk_size(tasks, workers):
+    # 块太大负载不均，太小调度开销大；相邻点共用信号缓存
+    return max(1, min(256, tasks // (workers * 8)))
+
+
+def run_sweep(data, points, account=None, workers=None, progress_every=2000):
+    """
+    把参数点分给 workers 个进程 (K线 / 均线放在共享内存，不复制)，返回结果 DataFrame。
+    workers=1 时在当前进程内执行
+    """
+    account = dict(DEFAULT_ACCOUNT, **(account or {}))
+    points = list(points)
+    data = add_smas(data, points)
+    workers = workers or os.cpu_count() or 1
+    tasks = [(p, account) for p in points]
+    rows = []
+    start = time.perf_counter()
+
+    def collect(it):
+        for row in it:
+            rows.append(row)
+            if progress_every and len(rows) % progress_every == 0:
+                rate = len(rows) / (time.perf_counter() - start)
+                print(f"⏳ {len(rows)}/{len(points)} 点 ({rate:.0f} 点/秒)")
+
+    if workers == 1:
+        _init_worker(data)
+        collect(map(run_point, tasks))
+    else:
+        with worker_pool(data, workers) as pool:
+            collect(pool.imap_unordered(run_point, tasks, chunksize=chunk_size(len(tasks), workers)))
+    return pd.DataFrame(rows)
+
+
+def rank(results, sort='pnl', ascending=None):
+    """按指标排序 (回撤默认升序，其余降序)"""
+    if results.empty:
+        return results
+    if ascending is None:
+        ascending = sort == 'max_drawdown_pct'
+    return results.sort_values(sort, ascending=ascending, kind='stable').reset_index(drop=True)
+
+
+def add_sweep_arguments(parser):
+    """数据源 / 网格 / 进程数等参数 (walkforward.py 共用)"""
+    parser.add_argument('--symbol', default='DOGE/USDT:USDT')
+    parser.add_argument('--timeframe', default='15m', help="基础周期 (其他周期由它合成)")
+    parser.add_argument('--csv', help="从 CSV 读取基础周期K线，而不是本地K线仓库")
+    parser.add_argument('--grid', action='append', default=[], metavar='NAME=VALUES',
+                        help="如 leverage=1,2,3 / sma_fast=10:30:5 / timeframe=15m,1h，可多次指定")
+    parser.add_argument('--samples', type=int, default=0, help="随机抽样点数 (0=网格全展开)")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument('--contract-size', type=float, default=DEFAULT_ACCOUNT['contract_size'])
+    parser.add_argument('--sort', default='pnl', choices=RESULT_COLUMNS)
+
+
+def build_grid(parser, args):
+    grid = dict(DEFAULT_GRID, timeframe=[args.timeframe])
+    for spec in args.grid:
+        name, _, values = spec.partition('=')
+        if name not in SIGNAL_PARAMS + ACCOUNT_PARAMS:
+            parser.error(f"未知参数 {name} (可选: {', '.join(SIGNAL_PARAMS + ACCOUNT_PARAMS)})")
+        grid[name] = parse_values(values)
+    return grid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程参数扫描 (示例规则 sma_rsi_rule 的均线周期 + 账户参数)")
+    add_sweep_arguments(parser)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', help="完整结果保存为 CSV")
+    args = parser.parse_args()
+    grid = build_grid(parser, args)
+
+    load_start = time.perf_counter()
+    data = load_sweep_data(args.symbol, args.timeframe, grid['timeframe'], csv=args.csv)
+    bars = ', '.join(f"{tf} {len(d['close'])}根" for tf, d in data.items())
+    print(f"📥 K线准备完成: {bars} | {(time.perf_counter() - load_start) * 1000:.0f} ms")
+    if min(len(d['close']) for d in data.values()) < WARMUP_BARS:
+        print(f"⚠️ K线不足 {WARMUP_BARS} 根，无法回测")
+        return
+
+    points = sample_points(grid, args.samples, args.seed) if args.samples else list(grid_points(grid))
+    workers = args.workers or os.cpu_count() or 1
+    print(f"🔍 {len(points)} 个参数点 | {workers} 个进程")
+    start = time.perf_counter()
+    results = rank(run_sweep(data, points, {'contract_size': args.contract_size}, workers), args.sort)
+    elapsed = time.perf_counter() - start
+    print(f"✅ 完成 {len(results)} 点 | 耗时 {elapsed:.1f}s ({len(results) / max(elapsed, 1e-9):.0f} 点/秒)")
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"💾 结果已保存: {args.output}")
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(results.head(args.top).to_string(float_format=lambda v: f"{v:.4f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import time
+import asyncio
+
+# 实盘下单: 反手用一笔净额单 (或交易所批量下单接口) 完成，不再 "平仓 -> sleep(2) -> 开仓"，
+# 成交用 fetch_order 轮询 (指数退避) 确认，并统计 信号 -> 成交 的延迟
+
+FILL_DEFAULTS = {'first_poll_sec': 0.05, 'max_poll_sec': 0.5, 'backoff': 1.5, 'timeout_sec': 10}
+
+
+def is_filled(order):
+    if order.get('status') == 'closed':
+        return True
+    amount, filled = order.get('amount'), order.get('filled')
+    return bool(amount) and filled is not None and filled >= amount
+
+
+def _create_args(order):
+    return (order['symbol'], 'market', order['side'], order['amount'], None, order['params'])
+
+
+def wait_for_fill(exchange, order, symbol, cfg=None):
+    """轮询订单状态直到完全成交，返回最新订单；超时或订单被撤销时抛出 RuntimeError"""
+    cfg = dict(FILL_DEFAULTS, **(cfg or {}))
+    start, delay = time.perf_counter(), cfg['first_poll_sec']
+    while not is_filled(order):
+        if order.get('status') in ('canceled', 'rejected', 'expired'):
+            raise RuntimeError(f"订单 {order.get('id')} 状态 {order['status']}")
+        if time.perf_counter() - start > cfg['timeout_sec']:
+            raise RuntimeError(f"订单 {order.get('id')} {cfg['timeout_sec']}秒内未成交")
+        time.sleep(delay)
+        delay = min(cfg['max_poll_sec'], delay * cfg['backoff'])
+        order = exchange.fetch_order(order['id'], symbol)
+    return order
+
+
+async def wait_for_fill_async(exchange, order, symbol, cfg=None):
+    """wait_for_fill 的协程版 (异步 ccxt)"""
+    cfg = dict(FILL_DEFAULTS, **(cfg or {}))
+    start, delay = time.perf_counter(), cfg['first_poll_sec']
+    while not is_filled(order):
+        if order.get('status') in ('canceled', 'rejected', 'expired'):
+            raise RuntimeError(f"订单 {order.get('id')} 状态 {order['status']}")
+        if time.perf_counter() - start > cfg['timeout_sec']:
+            raise RuntimeError(f"订单 {order.get('id')} {cfg['timeout_sec']}秒内未成交")
+        await asyncio.sleep(delay)
+        delay = min(cfg['max_poll_sec'], delay * cfg['backoff'])
+        order = await exchange.fetch_order(order['id'], symbol)
+    return order
+
+
+def submit_orders(exchange, orders, cfg=None):
+    """
+    依次提交 plan_live_orders 的结果并确认成交，返回成交后的订单列表。
+    标记了 batch 的多笔单走一次批量下单请求；否则逐笔下单，每笔成交后再发下一笔
+    """
+    if len(orders) > 1 and all(o.get('batch') for o in orders):
+        created = exchange.create_orders([dict(zip(('symbol', 'type', 'side', 'amount', 'price', 'params'),
+                                                   _create_args(o))) for o in orders])
+        return [wait_for_fill(exchange, c, o['symbol'], cfg) for c, o in zip(created, orders)]
+    filled = []
+    for o in orders:
+        created = exchange.create_order(*_create_args(o))
+        filled.append(wait_for_fill(exchange, created, o['symbol'], cfg))
+    return filled
+
+
+async def submit_orders_async(exchange, orders, cfg=None):
+    """submit_orders 的协程版"""
+    if len(orders) > 1 and all(o.get('batch') for o in orders):
+        created = await exchange.create_orders([dict(zip(('symbol', 'type', 'side', 'amount', 'price', 'params'),
+                                                         _create_args(o))) for o in orders])
+        return list(await asyncio.gather(*(wait_for_fill_async(exchange, c, o['symbol'], cfg)
+                                           for c, o in zip(created, orders))))
+    filled = []
+    for o in orders:
+        created = await exchange.create_order(*_create_args(o))
+        filled.append(await wait_for_fill_async(exchange, created, o['symbol'], cfg))
+    return filled
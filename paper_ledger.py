@@ -0,0 +1,198 @@
+import os
+import re
+import json
+import atexit
+
+# 模拟盘账本 (事件溯源): 每笔模拟成交 / 资金费结算作为一行 JSON 追加到事件文件，
+# 余额、持仓、已实现盈亏等聚合值随事件增量更新，读取都是 O(1)；
+# 每 snapshot_every 条事件写一次快照 (聚合值 + 文件偏移)，重启时从快照处接着回放，不必重放全部历史
+# 事件里记的是已经算好滑点的成交价和手续费金额，回放不依赖当时的配置，结果与运行时逐位相同
+
+FUNDING_INTERVAL_MS = 8 * 3600 * 1000  # 永续合约资金费: 每 8 小时 (UTC 0/8/16 点) 结算一次
+_EPS = 1e-12
+
+STATE_FIELDS = ('seq', 'balance', 'position', 'entry_price', 'contract_size', 'realized_pnl', 'fees_paid',
+                'funding_paid', 'trades', 'wins', 'trade_pnl', 'last_ts')
+
+
+def ledger_path(template, symbol):
+    """'data/paper/{symbol}.jsonl' -> data/paper/DOGE-USDT-USDT.jsonl"""
+    return template.format(symbol=re.sub(r'[^A-Za-z0-9]+', '-', symbol).strip('-'))
+
+
+def _sign(x):
+    return (x > 0) - (x < 0)
+
+
+class PaperLedger(object):
+    """
+    单个标的的模拟账户。path=None 时只在内存里记账 (重启清零)。
+    position 为带符号张数 (多为正、空为负)，entry_price 为持仓均价
+    """
+
+    def __init__(self, path=None, balance=100.0, taker_fee=0.0005, slippage_bps=0.0, snapshot_every=200):
+        self.path = path
+        self.taker_fee = taker_fee
+        self.slippage_bps = slippage_bps
+        self.snapshot_every = snapshot_every
+        self.seq = 0
+        self.balance = 0.0          # 已实现余额 (含已扣手续费 / 资金费)
+        self.position = 0.0
+        self.entry_price = 0.0
+        self.contract_size = 1.0
+        self.realized_pnl = 0.0     # 平仓盈亏 (未扣费)
+        self.fees_paid = 0.0
+        self.funding_paid = 0.0     # 正数=付出，负数=收到
+        self.trades = 0             # 已完整平仓的交易笔数
+        self.wins = 0               # 其中扣除手续费和资金费后仍盈利的笔数
+        self.trade_pnl = 0.0        # 当前这笔交易累计的净盈亏
+        self.last_ts = None         # 最后一条事件的时间 (毫秒)
+        self.replayed = 0           # 启动时回放的事件数 (不含快照覆盖的部分)
+        self._file = None
+        if path:
+            self._load()
+            atexit.register(self.close)  # 退出时写一次快照，下次启动不用回放
+        if self.seq == 0:
+            self._record({'type': 'open', 'balance': float(balance)})
+
+    # --- 持久化 ---
+    def _snapshot_path(self):
+        return self.path + '.snapshot'
+
+    def _load(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        offset = 0
+        try:
+            with open(self._snapshot_path(), 'r', encoding='utf-8') as f:
+                snap = json.load(f)
+            if snap['offset'] <= os.path.getsize(self.path):
+                self.__dict__.update((k, snap[k]) for k in STATE_FIELDS)
+                offset = snap['offset']
+        except (OSError, ValueError, KeyError):
+            pass  # 没有快照或快照损坏: 从头回放
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # 写到一半的尾部事件，丢弃
+                    self._apply(json.loads(line))
+                    offset += len(line)
+                    self.replayed += 1
+            if offset < os.path.getsize(self.path):
+                with open(self.path, 'r+b') as f:
+                    f.truncate(offset)
+        self._file = open(self.path, 'ab')
+
+    def _record(self, event):
+        """事件先更新聚合值，再追加到文件 (flush 到系统缓冲区，进程崩溃也不丢)"""
+        event['seq'] = self.seq + 1
+        self._apply(event)
+        if self._file is not None:
+            self._file.write(json.dumps(event, separators=(',', ':')).encode('utf-8') + b'\n')
+            self._file.flush()
+            if self.snapshot_every and self.seq % self.snapshot_every == 0:
+                self.snapshot()
+        return event
+
+    def snapshot(self):
+        """聚合值 + 事件文件当前长度写入快照 (先写临时文件再替换，不会留下半个快照)"""
+        if self._file is None:
+            return
+        snap = {k: getattr(self, k) for k in STATE_FIELDS}
+        snap['offset'] = self._file.tell()
+        tmp = self._snapshot_path() + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(snap, f)
+        os.replace(tmp, self._snapshot_path())
+
+    def close(self):
+        if self._file is not None:
+            self.snapshot()
+            self._file.close()
+            self._file = None
+
+    # --- 事件 -> 聚合值 (运行时和回放共用) ---
+    def _apply(self, event):
+        kind = event['type']
+        if kind == 'open':
+            self.balance = event['balance']
+        elif kind == 'fill':
+            self._apply_fill(event)
+        elif kind == 'funding':
+            self.balance -= event['amount']
+            self.funding_paid += event['amount']
+            self.trade_pnl -= event['amount']
+        self.seq = event['seq']
+        self.last_ts = event.get('ts', self.last_ts)
+
+    def _apply_fill(self, event):
+        qty = event['contracts'] if event['side'] == 'buy' else -event['contracts']
+        price, fee = event['price'], event['fee']
+        self.contract_size = event['contract_size']
+        self.balance -= fee
+        self.fees_paid += fee
+        pos = self.position
+        if pos and _sign(qty) != _sign(pos):
+            closed = min(abs(qty), abs(pos))
+            pnl = closed * self.contract_size * (price - self.entry_price) * _sign(pos)
+            self.balance += pnl
+            self.realized_pnl += pnl
+            # 一笔成交既平仓又反向开仓时，手续费按张数拆分
+            self.trade_pnl += pnl - fee * closed / abs(qty)
+            fee *= 1 - closed / abs(qty)
+            pos += _sign(qty) * closed
+            qty -= _sign(qty) * closed
+            if abs(pos) < _EPS:
+                self.trades += 1
+                self.wins += self.trade_pnl > 0
+                pos, self.entry_price, self.trade_pnl = 0.0, 0.0, 0.0
+        if abs(qty) >= _EPS:
+            self.entry_price = (self.entry_price * abs(pos) + price * abs(qty)) / (abs(pos) + abs(qty))
+            self.trade_pnl -= fee
+            pos += qty
+        self.position = pos
+
+    # --- 写入 ---
+    def fill(self, side, contracts, mark, contract_size, ts):
+        """按市价 mark 成交 contracts 张 (side='buy'/'sell')，按滑点和 taker 费率结算"""
+        slip = self.slippage_bps / 10000.0
+        price = mark * (1 + slip) if side == 'buy' else mark * (1 - slip)
+        fee = price * contracts * contract_size * self.taker_fee
+        return self._record({'type': 'fill', 'ts': int(ts), 'side': side, 'contracts': contracts,
+                             'price': price, 'fee': fee, 'contract_size': contract_size})
+
+    def funding_due(self, now_ms):
+        """上次事件之后、now_ms 之前经过的资金费结算时间点 (空仓时没有)"""
+        if not self.position or self.last_ts is None:
+            return []
+        first = self.last_ts // FUNDING_INTERVAL_MS + 1
+        last = int(now_ms) // FUNDING_INTERVAL_MS
+        return [k * FUNDING_INTERVAL_MS for k in range(first, last + 1)]
+
+    def settle_funding(self, ts, rate, mark):
+        """资金费: 持仓名义价值 × 费率，多头在费率为正时付出"""
+        amount = self.position * self.contract_size * mark * rate
+        return self._record({'type': 'funding', 'ts': ts, 'rate': rate, 'mark': mark, 'amount': amount})
+
+    # --- 读取 (O(1)) ---
+    @property
+    def side(self):
+        return 'long' if self.position > 0 else 'short' if self.position < 0 else None
+
+    @property
+    def holdings(self):
+        return abs(self.position)
+
+    def unrealized(self, mark):
+        return self.position * self.contract_size * (mark - self.entry_price) if self.position else 0.0
+
+    def equity(self, mark):
+        return self.balance + self.unrealized(mark)
+
+    def summary(self, mark=None):
+        text = (f"余额 {self.balance:.2f} U | 已实现 {self.realized_pnl:+.2f} | 手续费 {self.fees_paid:.2f} | "
+                f"资金费 {self.funding_paid:+.2f} | {self.trades} 笔 胜率 {self.wins / self.trades if self.trades else 0:.0%}")
+        if mark is not None and self.position:
+            text += f" | 浮盈 {self.unrealized(mark):+.2f} | 权益 {self.equity(mark):.2f}"
+        return text
@@ -0,0 +1,119 @@
+from collections import deque
+
+import ccxt
+
+from indicator_engine import describe_trend
+from indicator_kernels import IndicatorKernels, indicator_rows
+from scheduler import candle_open, next_candle_close
+
+# 本地K线合成: 每个标的只维护一条 1m 基础K线流，5m/15m/1h/4h 等高周期随 1m 收盘增量合成，
+# 多周期上下文只需要一个交易所数据源，而不是每个周期各调一次 fetch_ohlcv (省限频额度)
+# 启动时每个周期各下载一次历史做种子，之后只拉 1m 增量
+
+
+def _merge(bar, candle):
+    bar[2] = max(bar[2], candle[2])
+    bar[3] = min(bar[3], candle[3])
+    bar[4] = candle[4]
+    bar[5] += candle[5]
+
+
+class Resampler(object):
+    """单个标的: 1m 基础K线 -> 多个高周期 OHLCV (已收盘 + 当前未收盘)"""
+
+    def __init__(self, timeframes, base='1m', maxlen=1000):
+        self.base = base
+        self.base_ms = ccxt.Exchange.parse_timeframe(base) * 1000
+        self.timeframes = list(timeframes)
+        self.closed = {tf: deque(maxlen=maxlen) for tf in self.timeframes}
+        self.partial = {tf: None for tf in self.timeframes}  # 由已收盘 1m 合成的未完成K线
+        self.live = None           # 当前未收盘的 1m K线
+        self.last_base_ts = None
+
+    def seed(self, timeframe, bars):
+        """用交易所下载的已收盘K线做历史种子"""
+        self.closed[timeframe].extend(list(k) for k in bars)
+
+    def resume_ms(self):
+        """补建各周期未完成K线需要的最早 1m 时间"""
+        starts = [next_candle_close(self.closed[tf][-1][0], tf) for tf in self.timeframes if self.closed[tf]]
+        return min(starts) if starts else None
+
+    def push(self, candle):
+        """喂入一根已收盘的 1m K线，返回本次收盘的 [(周期, K线)]"""
+        ts = candle[0]
+        if self.last_base_ts is not None and ts <= self.last_base_ts:
+            return []
+        self.last_base_ts = ts
+        done = []
+        for tf in self.timeframes:
+            open_ms = candle_open(ts, tf)
+            closed = self.closed[tf]
+            if closed and open_ms <= closed[-1][0]:
+                continue  # 种子已覆盖
+            bar = self.partial[tf]
+            if bar is not None and bar[0] != open_ms:
+                # 跨周期了但上一根没等到最后一根 1m (缺数据)，照常收盘
+                closed.append(bar)
+                done.append((tf, bar))
+                bar = None
+            if bar is None:
+                bar = [open_ms] + list(candle[1:6])
+            else:
+                _merge(bar, candle)
+            if candle_open(ts + self.base_ms, tf) != open_ms:
+                # 本周期最后一根 1m 已收盘 -> 高周期K线收盘
+                closed.append(bar)
+                done.append((tf, bar))
+                bar = None
+            self.partial[tf] = bar
+        return done
+
+    def extend(self, candles, now_ms):
+        """喂入一批 1m K线: 已收盘的逐根合成，未收盘的最后一根留作 live"""
+        self.live = None
+        done = []
+        for k in candles:
+            if k[0] + self.base_ms <= now_ms:
+                done += self.push(k)
+            else:
+                self.live = list(k)
+        return done
+
+    def current(self, timeframe):
+        """当前未收盘的高周期K线 (未完成部分 + live 1m)"""
+        bar = list(self.partial[timeframe]) if self.partial[timeframe] else None
+        live = self.live
+        if live is not None and (not self.closed[timeframe] or live[0] >= next_candle_close(
+                self.closed[timeframe][-1][0], timeframe)):
+            open_ms = candle_open(live[0], timeframe)
+            if bar is None or bar[0] != open_ms:
+                bar = [open_ms] + list(live[1:6])
+            else:
+                _merge(bar, live)
+        return bar
+
+    def ohlcv(self, timeframe, limit):
+        """最近 limit 根，最后一根为当前未收盘K线，结构与 fetch_ohlcv 相同"""
+        current = self.current(timeframe)
+        rows = [list(k) for k in self.closed[timeframe]][-(limit - 1 if current else limit):]
+        return rows + [current] if current else rows
+
+
+def mtf_context(resampler, timeframes, limit, kernels=None):
+    """各高周期用 NumPy 指标内核算一遍 (口径同 calculate_technical_indicators)，提炼成 prompt 用的摘要"""
+    kernels = kernels or IndicatorKernels()
+    context = {}
+    for tf in timeframes:
+        rows = resampler.ohlcv(tf, limit)
+        if len(rows) < 30:
+            continue
+        cols, ind = kernels.from_ohlcv(rows)
+        curr = indicator_rows(cols, ind, len(rows) - 1)[-1]
+        context[tf] = {
+            'trend': describe_trend(curr),
+            'rsi': round(curr['rsi'], 2),
+            'macd_hist': round(curr['macd_hist'], 4),
+            'bb_pct': round(curr['bb_pct'], 2),
+        }
+    return context
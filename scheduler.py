@@ -0,0 +1,272 @@
+import time
+import heapq
+import asyncio
+import calendar
+from datetime import datetime, timezone
+
+# K线收盘调度器: 一个优先队列 (堆) 保存所有 (标的, 周期) 任务的下次触发时间，
+# 按交易所服务器时间对齐K线边界，支持 ccxt 全部周期 (1m ... 1h, 4h, 1d, 1w, 1M)，
+# 每次触发记录漂移 (实际触发 - 计划触发) 和抖动 (相邻两次漂移之差)
+
+WEEK_ANCHOR_MS = 4 * 86400 * 1000  # 1970-01-05 (周一)，周K线从周一 00:00 UTC 开始
+
+
+def parse_timeframe(timeframe):
+    """'15m' -> (15, 'm')"""
+    return int(timeframe[:-1] or 1), timeframe[-1]
+
+
+def _candle_bounds(now_ms, timeframe, step):
+    """now_ms 所在K线的开盘时间 (step=0) 或收盘时间 (step=1)，UTC 毫秒"""
+    amount, unit = parse_timeframe(timeframe)
+    if unit in ('M', 'y'):
+        now = datetime.fromtimestamp(now_ms / 1000, tz=timezone.utc)
+        months = amount * (12 if unit == 'y' else 1)
+        index = (now.year * 12 + now.month - 1) // months * months + months * step
+        year, month = divmod(index, 12)
+        return calendar.timegm((year, month + 1, 1, 0, 0, 0)) * 1000
+    seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}[unit]
+    tf_ms = amount * seconds * 1000
+    anchor = WEEK_ANCHOR_MS if unit == 'w' else 0
+    return (now_ms - anchor) // tf_ms * tf_ms + tf_ms * step + anchor
+
+
+def next_candle_close(now_ms, timeframe):
+    """now_ms 之后最近的一个K线边界 (即当前K线的收盘时间，UTC 毫秒)"""
+    return _candle_bounds(now_ms, timeframe, 1)
+
+
+def candle_open(now_ms, timeframe):
+    """now_ms 所在K线 (正在形成的那根) 的开盘时间"""
+    return _candle_bounds(now_ms, timeframe, 0)
+
+
+class ServerClock(object):
+    """
+    交易所服务器时钟: 用 fetch_time() 估计本机与服务器的时差 (取请求往返的中点)，
+    之后 now_ms() 只做本地计算，每 resync_sec 秒重新校准一次
+    """
+
+    def __init__(self, fetch_time=None, resync_sec=3600):
+        self.fetch_time = fetch_time
+        self.resync_sec = resync_sec
+        self.offset_ms = 0.0
+        self.rtt_ms = None
+        self.synced_at = None
+
+    def now_ms(self):
+        return time.time() * 1000 + self.offset_ms
+
+    def needs_sync(self):
+        if self.fetch_time is None:
+            return False
+        return self.synced_at is None or time.monotonic() - self.synced_at >= self.resync_sec
+
+    def _apply(self, server_ms, t0, t1):
+        self.offset_ms = server_ms - (t0 + t1) / 2
+        self.rtt_ms = t1 - t0
+        self.synced_at = time.monotonic()
+
+    def sync(self):
+        t0 = time.time() * 1000
+        try:
+            server_ms = self.fetch_time()
+        except Exception as e:
+            print(f"⚠️ 服务器时间校准失败，沿用旧时差 {self.offset_ms:+.0f}ms: {e}")
+            self.synced_at = time.monotonic()
+            return self.offset_ms
+        self._apply(server_ms, t0, time.time() * 1000)
+        return self.offset_ms
+
+    async def sync_async(self):
+        t0 = time.time() * 1000
+        try:
+            server_ms = await self.fetch_time()
+        except Exception as e:
+            print(f"⚠️ 服务器时间校准失败，沿用旧时差 {self.offset_ms:+.0f}ms: {e}")
+            self.synced_at = time.monotonic()
+            return self.offset_ms
+        self._apply(server_ms, t0, time.time() * 1000)
+        return self.offset_ms
+
+
+class FiringStats(object):
+    """单个任务的触发漂移 / 抖动统计 (毫秒)"""
+
+    def __init__(self):
+        self.count = 0
+        self.last_drift = None
+        self.max_drift = 0.0
+        self.total_jitter = 0.0
+
+    def record(self, drift_ms):
+        jitter = abs(drift_ms - self.last_drift) if self.last_drift is not None else 0.0
+        if self.count:
+            self.total_jitter += jitter
+        self.count += 1
+        self.last_drift = drift_ms
+        self.max_drift = max(self.max_drift, abs(drift_ms))
+        return jitter
+
+    @property
+    def mean_jitter(self):
+        return self.total_jitter / (self.count - 1) if self.count > 1 else 0.0
+
+
+class CandleScheduler(object):
+    """
+    多周期调度: add() 注册任务，run_forever() (同步回调) 或 run_async() (协程回调) 驱动。
+    delay_sec: 收盘后再等多少秒触发 (给交易所生成新K线的时间)
+    """
+
+    def __init__(self, clock=None, delay_sec=0.0):
+        self.clock = clock or ServerClock()
+        self.delay_ms = delay_sec * 1000
+        self.heap = []   # (计划触发时间, 序号, 名称)
+        self.jobs = {}   # 名称 -> (周期, 回调)
+        self.stats = {}  # 名称 -> FiringStats
+        self.seq = 0
+
+    def add(self, name, timeframe, callback):
+        self.jobs[name] = (timeframe, callback)
+        self.stats[name] = FiringStats()
+        self._schedule(name, self.clock.now_ms())
+
+    def _schedule(self, name, after_ms):
+        timeframe = self.jobs[name][0]
+        fire_ms = next_candle_close(after_ms - self.delay_ms, timeframe) + self.delay_ms
+        self.seq += 1
+        heapq.heappush(self.heap, (fire_ms, self.seq, name))
+
+    def _replan(self, old_offset):
+        """时差校准后按新的服务器时间重排所有任务"""
+        if abs(self.clock.offset_ms - old_offset) < 1:
+            return
+        now_ms = self.clock.now_ms()
+        self.heap = []
+        for name in self.jobs:
+            self._schedule(name, now_ms)
+
+    def seconds_until_next(self):
+        return max(0.0, (self.heap[0][0] - self.clock.now_ms()) / 1000) if self.heap else None
+
+    def pop_due(self):
+        """弹出所有已到期的任务，记录漂移并排好下一次，返回 [(名称, 回调)]"""
+        now_ms = self.clock.now_ms()
+        due = []
+        while self.heap and self.heap[0][0] <= now_ms:
+            fire_ms, _, name = heapq.heappop(self.heap)
+            callback = self.jobs[name][1]
+            drift = now_ms - fire_ms
+            jitter = self.stats[name].record(drift)
+            print(f"⏰ [{name}] 触发漂移 {drift:+.0f}ms | 抖动 {jitter:.0f}ms | "
+                  f"时差 {self.clock.offset_ms:+.0f}ms")
+            # 执行过慢错过了后续K线时直接跳到下一个未来边界
+            self._schedule(name, max(fire_ms, now_ms))
+            due.append((name, callback))
+        return due
+
+    def _announce(self):
+        fire_ms, _, name = self.heap[0]
+        wait = max(0, int((fire_ms - self.clock.now_ms()) / 1000))
+        at = datetime.fromtimestamp(fire_ms / 1000).strftime('%H:%M:%S')
+        print(f"⏳ 下次: {name} @ {at} | 等待 {wait // 60}分 {wait % 60}秒")
+
+    def run_forever(self):
+        while self.heap:
+            if self.clock.needs_sync():
+                old_offset = self.clock.offset_ms
+                self.clock.sync()
+                self._replan(old_offset)
+            self._announce()
+            time.sleep(self.seconds_until_next())
+            for name, callback in self.pop_due():
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"⚠️ [{name}] 任务错误: {e}")
+
+    async def run_async(self):
+        """协程版: 到期任务各自作为 asyncio 任务并发执行，互不推迟"""
+        running = set()
+
+        async def guarded(name, callback):
+            try:
+                await callback()
+            except Exception as e:
+                print(f"⚠️ [{name}] 任务错误: {e}")
+
+        while self.heap:
+            if self.clock.needs_sync():
+                old_offset = self.clock.offset_ms
+                await self.clock.sync_async()
+                self._replan(old_offset)
+            self._announce()
+            await asyncio.sleep(self.seconds_until_next())
+            for name, callback in self.pop_due():
+                task = asyncio.create_task(guarded(name, callback))
+                running.add(task)
+                task.add_done_callback(running.discard)
+
+    def summary(self):
+        parts = [f"{name} {s.count}次 漂移max {s.max_drift:.0f}ms 抖动avg {s.mean_jitter:.0f}ms"
+                 for name, s in self.stats.items()]
+        return "调度: " + (" | ".join(parts) if parts else "暂无任务")
+
+
+# --- K线收盘确认: 取代收盘后固定多睡 2 秒 ---
+# 到点后用 limit=1 的轻量请求轮询最新K线，新K线 (开盘时间 = 刚过去的边界) 出现即说明上一根已收盘，
+# 轮询间隔从 first_poll_sec 开始按 backoff 倍数退避到 max_poll_sec，超过 timeout_sec 仍未出现则照常执行
+
+CONFIRM_DEFAULTS = {'first_poll_sec': 0.1, 'max_poll_sec': 0.5, 'backoff': 1.5, 'timeout_sec': 10}
+
+
+def _confirm_plan(timeframe, clock, cfg):
+    cfg = dict(CONFIRM_DEFAULTS, **(cfg or {}))
+    return int(candle_open(clock.now_ms(), timeframe)), cfg
+
+
+def _confirm_result(confirmed, start, polls, open_ms):
+    result = {'confirmed': confirmed, 'wait_ms': (time.perf_counter() - start) * 1000,
+              'polls': polls, 'open_ms': open_ms}
+    if confirmed:
+        print(f"🕯️ K线收盘确认 {result['wait_ms']:.0f}ms (轮询 {polls} 次)")
+    else:
+        print(f"⚠️ {result['wait_ms'] / 1000:.1f}秒内未等到新K线 (轮询 {polls} 次)，按现有数据执行")
+    return result
+
+
+def confirm_candle_close(fetch_ohlcv, symbol, timeframe, clock, cfg=None):
+    """轮询直到开盘时间为当前边界的K线出现，返回 {'confirmed', 'wait_ms', 'polls', 'open_ms'}"""
+    open_ms, cfg = _confirm_plan(timeframe, clock, cfg)
+    start, polls, delay = time.perf_counter(), 0, cfg['first_poll_sec']
+    while True:
+        polls += 1
+        try:
+            rows = fetch_ohlcv(symbol, timeframe, limit=1)
+            if rows and rows[-1][0] >= open_ms:
+                return _confirm_result(True, start, polls, open_ms)
+        except Exception as e:
+            print(f"⚠️ K线确认请求失败: {e}")
+        if time.perf_counter() - start + delay > cfg['timeout_sec']:
+            return _confirm_result(False, start, polls, open_ms)
+        time.sleep(delay)
+        delay = min(cfg['max_poll_sec'], delay * cfg['backoff'])
+
+
+async def confirm_candle_close_async(fetch_ohlcv, symbol, timeframe, clock, cfg=None):
+    """confirm_candle_close 的协程版 (异步 ccxt)"""
+    open_ms, cfg = _confirm_plan(timeframe, clock, cfg)
+    start, polls, delay = time.perf_counter(), 0, cfg['first_poll_sec']
+    while True:
+        polls += 1
+        try:
+            rows = await fetch_ohlcv(symbol, timeframe, limit=1)
+            if rows and rows[-1][0] >= open_ms:
+                return _confirm_result(True, start, polls, open_ms)
+        except Exception as e:
+            print(f"⚠️ K线确认请求失败: {e}")
+        if time.perf_counter() - start + delay > cfg['timeout_sec']:
+            return _confirm_result(False, start, polls, open_ms)
+        await asyncio.sleep(delay)
+        delay = min(cfg['max_poll_sec'], delay * cfg['backoff'])
@@ -0,0 +1,93 @@
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# 多进程只读共享的 NumPy 数组: 主进程把 (可嵌套 dict 的) 数组整体打包进一块 shared_memory，
+# 工作进程凭 spec 按名字挂载后直接在上面建视图，不 pickle、不复制
+
+SharedSpec = namedtuple('SharedSpec', 'name layout')  # 可 pickle，交给工作进程
+
+_ALIGN = 64
+_MAPPED = {}  # 本进程已映射的块: name -> (SharedMemory, 视图)；fork 出的子进程直接继承
+
+
+def _layout(arrays, offset=0):
+    """计算每个数组在块内的 (偏移, 形状, dtype)，保持 dict 嵌套结构"""
+    layout = {}
+    for key, value in arrays.items():
+        if isinstance(value, dict):
+            layout[key], offset = _layout(value, offset)
+        else:
+            arr = np.asarray(value)
+            layout[key] = (offset, arr.shape, arr.dtype.str)
+            offset += (arr.nbytes + _ALIGN - 1) // _ALIGN * _ALIGN
+    return layout, offset
+
+
+def _views(buf, layout):
+    views = {}
+    for key, entry in layout.items():
+        if isinstance(entry, dict):
+            views[key] = _views(buf, entry)
+        else:
+            offset, shape, dtype = entry
+            view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=buf, offset=offset)
+            views[key] = view
+    return views
+
+
+def _copy_in(views, arrays):
+    for key, value in arrays.items():
+        if isinstance(value, dict):
+            _copy_in(views[key], value)
+        else:
+            views[key][...] = value
+            views[key].setflags(write=False)
+
+
+class SharedArrays(object):
+    """
+    主进程持有: 创建共享内存并拷入数组，arrays 为只读视图，spec 交给工作进程 attach。
+    用完 close() (或 with 语句) 释放并删除共享内存
+    """
+
+    def __init__(self, arrays):
+        layout, size = _layout(arrays)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.spec = SharedSpec(self.shm.name, layout)
+        self.nbytes = size
+        self.arrays = _views(self.shm.buf, layout)
+        _copy_in(self.arrays, arrays)
+        _MAPPED[self.shm.name] = (self.shm, self.arrays)
+
+    def close(self):
+        if self.shm is None:
+            return
+        _MAPPED.pop(self.shm.name, None)
+        self.arrays = None  # 视图释放后才能关闭映射
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(spec):
+    """工作进程: 按 spec 挂载共享内存，返回与原结构相同的只读视图 (fork 继承来的映射直接复用)"""
+    mapped = _MAPPED.get(spec.name)
+    if mapped is not None:
+        return mapped[1]
+    shm = shared_memory.SharedMemory(name=spec.name)
+    views = _views(shm.buf, spec.layout)
+
+    def freeze(v):
+        for value in v.values():
+            freeze(value) if isinstance(value, dict) else value.setflags(write=False)
+    freeze(views)
+    _MAPPED[spec.name] = (shm, views)  # 保持映射存活，直到进程退出
+    return views
@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 冷启动加速: 重模块在后台线程预导入 (与交易所初始化的网络请求重叠)，
+# load_markets 的结果缓存到本地 (带 TTL)，初始化里互不依赖的请求并发执行
+
+MARKET_CACHE = {'path': 'data/markets_{exchange}.json', 'ttl_sec': 6 * 3600}
+
+
+def warm_imports(modules):
+    """后台线程预导入模块，返回线程 (join 后保证都已导入)"""
+    def run():
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                print(f"⚠️ 预导入 {name} 失败: {e}")
+    thread = threading.Thread(target=run, name='warm-imports', daemon=True)
+    thread.start()
+    return thread
+
+
+def _cache_path(exchange, cfg):
+    return cfg['path'].format(exchange=exchange.id)
+
+
+def _read_cache(exchange, cfg):
+    path = _cache_path(exchange, cfg)
+    try:
+        if time.time() - os.path.getmtime(path) > cfg['ttl_sec']:
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(exchange, cfg):
+    path = _cache_path(exchange, cfg)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'markets': exchange.markets, 'currencies': exchange.currencies}, f)
+    os.replace(tmp, path)  # 原子替换，崩溃时不会留下半个文件
+
+
+def load_markets_cached(exchange, cfg=None):
+    """本地缓存未过期时直接 set_markets，否则 load_markets 后写缓存；返回是否命中缓存"""
+    cfg = cfg or MARKET_CACHE
+    cached = _read_cache(exchange, cfg)
+    if cached:
+        exchange.set_markets(cached['markets'], cached.get('currencies'))
+        return True
+    exchange.load_markets()
+    _write_cache(exchange, cfg)
+    return False
+
+
+async def load_markets_cached_async(exchange, cfg=None):
+    """load_markets_cached 的异步 ccxt 版"""
+    cfg = cfg or MARKET_CACHE
+    cached = _read_cache(exchange, cfg)
+    if cached:
+        exchange.set_markets(cached['markets'], cached.get('currencies'))
+        return True
+    await exchange.load_markets()
+    _write_cache(exchange, cfg)
+    return False
+
+
+def run_concurrently(calls):
+    """并发执行 {名称: 无参函数}，返回 {名称: 结果或异常}"""
+    with ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix='setup') as pool:
+        futures = {name: pool.submit(fn) for name, fn in calls.items()}
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            results[name] = e
+    return results
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# 模块都在仓库根目录，测试直接按模块名导入
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+os.environ.setdefault('DEEPSEEK_API_KEY', 'test')  # 只为通过客户端构造检查，不会发请求
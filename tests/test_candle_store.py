@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+
+from candle_store import CandleStore
+
+SYMBOL = 'DOGE/USDT:USDT'
+
+
+def candles(start, n):
+    return [[t, 1.0 + t, 2.0 + t, 0.5 + t, 1.5 + t, 10.0 * t] for t in range(start, start + n)]
+
+
+def test_append_skips_duplicates_and_refreshes_cache(tmp_path):
+    store = CandleStore(str(tmp_path))
+    assert store.count(SYMBOL, '15m') == 0
+    assert store.tail(SYMBOL, '15m', 5) == []
+    assert store.append(SYMBOL, '15m', candles(0, 3)) == 3
+    ts = store.column(SYMBOL, '15m', 'ts')
+    assert store.column(SYMBOL, '15m', 'ts') is ts  # 两次 append 之间复用同一个 memmap
+    assert store.append(SYMBOL, '15m', candles(1, 4)) == 2  # ts 1、2 已存在
+    assert store.count(SYMBOL, '15m') == 5
+    assert len(ts) == 3  # 旧映射不受影响
+    assert store.last_ts(SYMBOL, '15m') == 4
+    assert store.tail(SYMBOL, '15m', 2) == candles(3, 2)
+
+
+def test_torn_column_repaired_once_on_open(tmp_path):
+    store = CandleStore(str(tmp_path))
+    store.append(SYMBOL, '1h', candles(0, 4))
+    path = store._path(SYMBOL, '1h', 'close')
+    with open(path, 'ab') as f:
+        f.write(np.float64(9.9).tobytes())  # 模拟崩溃: close 列多写了一根
+    with open(store._path(SYMBOL, '1h', 'vol'), 'r+b') as f:
+        f.truncate(3 * 8)  # vol 列少写了一根
+
+    reopened = CandleStore(str(tmp_path))
+    assert reopened.count(SYMBOL, '1h') == 3
+    assert os.path.getsize(path) == 3 * 8
+    assert reopened.append(SYMBOL, '1h', candles(3, 2)) == 2
+    assert CandleStore(str(tmp_path)).tail(SYMBOL, '1h', 10) == candles(0, 5)
@@ -0,0 +1,15 @@
+import pytest
+
+import http_pool
+
+
+@pytest.mark.parametrize('timeframe, seconds', [('1m', 60), ('15m', 900), ('4h', 14400)])
+def test_keepalive_outlives_one_candle(timeframe, seconds):
+    assert http_pool.keepalive_expiry(timeframe) > seconds
+    client = http_pool.httpx_async_client('test', timeframe=timeframe)
+    assert client._transport._pool._keepalive_expiry > seconds
+
+
+def test_fixed_keepalive(monkeypatch):
+    monkeypatch.setitem(http_pool.POOL_CONFIG, 'keepalive_expiry', 30)
+    assert http_pool.keepalive_expiry('1h') == 30
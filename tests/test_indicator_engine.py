@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from fakes import FakeExchange
+from indicators import calculate_technical_indicators
+from indicator_engine import IndicatorEngine
+from indicator_kernels import COLUMNS
+
+TF_MS = 15 * 60 * 1000
+
+
+@pytest.fixture(scope='module')
+def ohlcv():
+    return FakeExchange(history=400, seed=3).fetch_ohlcv('DOGE/USDT:USDT')
+
+
+def reference(ohlcv):
+    df = pd.DataFrame(ohlcv, columns=['ts', 'open', 'high', 'low', 'close', 'vol'])
+    return calculate_technical_indicators(df)
+
+
+def test_engine_matches_pandas(ohlcv):
+    engine = IndicatorEngine(TF_MS)
+    live = engine.sync(ohlcv[:300])
+    for i in range(300, len(ohlcv)):  # 之后每根新K线增量提交
+        live = engine.sync(ohlcv[:i + 1])
+    expected = reference(ohlcv).iloc[-7:-1]  # 最后一根视为未收盘
+    for row, (_, exp) in zip(engine.history, expected.iterrows()):
+        for name in COLUMNS:
+            assert row[name] == pytest.approx(exp[name], rel=1e-9, abs=1e-12), name
+
+    # 未收盘K线按最后一行算，但不改状态
+    last = reference(ohlcv).iloc[-1]
+    count = engine.count
+    snap = engine.snapshot(live)
+    assert snap['price'] == ohlcv[-1][4]
+    assert engine.count == count
+    assert engine._row(live, commit=False)['rsi'] == pytest.approx(last['rsi'], rel=1e-9)
+
+
+def test_engine_rebuilds_after_gap(ohlcv):
+    engine = IndicatorEngine(TF_MS)
+    engine.sync(ohlcv[:200])
+    engine.sync(ohlcv[250:])  # 断档: 从头预热，只用新的这段
+    fresh = IndicatorEngine(TF_MS)
+    fresh.sync(ohlcv[250:])
+    assert engine.count == fresh.count
+    assert list(engine.history) == list(fresh.history)
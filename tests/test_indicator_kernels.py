@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fakes import FakeExchange
+from indicators import calculate_technical_indicators
+from indicator_kernels import COLUMNS, IndicatorKernels
+
+
+@pytest.fixture(scope='module')
+def ohlcv():
+    return FakeExchange(history=400, seed=3).fetch_ohlcv('DOGE/USDT:USDT')
+
+
+def reference(ohlcv):
+    df = pd.DataFrame(ohlcv, columns=['ts', 'open', 'high', 'low', 'close', 'vol'])
+    return calculate_technical_indicators(df)
+
+
+def test_kernels_match_pandas(ohlcv):
+    expected = reference(ohlcv)
+    _, ind = IndicatorKernels().from_ohlcv(ohlcv)
+    for name in COLUMNS:
+        np.testing.assert_allclose(ind[name], expected[name].to_numpy(), rtol=1e-9, atol=1e-12, err_msg=name)
+
+
+def test_kernels_reuse_buffers(ohlcv):
+    kernels = IndicatorKernels()
+    kernels.from_ohlcv(ohlcv)
+    _, ind = kernels.from_ohlcv(ohlcv[:150])  # 缓冲区变短复用，结果不能带上次的尾巴
+    expected = reference(ohlcv[:150])
+    np.testing.assert_allclose(ind['rsi'], expected['rsi'].to_numpy(), rtol=1e-9)
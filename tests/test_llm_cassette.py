@@ -0,0 +1,95 @@
+import json
+import asyncio
+
+import httpx
+import pytest
+from openai import AsyncOpenAI, OpenAI
+
+from llm_cassette import HEADER, CassetteMiss, LLMCassette, wrap_client
+
+REQUEST = {'model': 'deepseek-chat', 'messages': [{'role': 'user', 'content': 'hi'}]}
+
+
+def completion(content):
+    return {
+        'id': 'chatcmpl-1', 'object': 'chat.completion', 'created': 0, 'model': 'deepseek-chat',
+        'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+        'usage': {'prompt_tokens': 5, 'completion_tokens': 2, 'total_tokens': 7},
+    }
+
+
+class Server(object):
+    """httpx.MockTransport 的处理函数: 记录请求次数，按顺序返回回复"""
+
+    def __init__(self, *contents):
+        self.contents = list(contents)
+        self.calls = 0
+
+    def __call__(self, request):
+        self.calls += 1
+        return httpx.Response(200, json=completion(self.contents.pop(0)))
+
+
+def async_client(server):
+    return AsyncOpenAI(api_key='test', base_url='http://deepseek.test/v1',
+                       http_client=httpx.AsyncClient(transport=httpx.MockTransport(server)))
+
+
+def sync_client(server):
+    return OpenAI(api_key='test', base_url='http://deepseek.test/v1',
+                  http_client=httpx.Client(transport=httpx.MockTransport(server)))
+
+
+def run_async(client, cassette):
+    async def call():
+        return await wrap_client(client, cassette).chat.completions.create(**REQUEST)
+    return asyncio.run(call())
+
+
+def test_async_record_then_replay(tmp_path):
+    path = str(tmp_path / 'tape.bin')
+    server = Server('{"signal": "BUY"}')
+    response = run_async(async_client(server), LLMCassette(path, 'record'))
+    assert response.choices[0].message.content == '{"signal": "BUY"}'
+    assert server.calls == 1
+
+    offline = Server()  # 回放时不应再发请求
+    replayed = run_async(async_client(offline), LLMCassette(path, 'replay'))
+    assert replayed.choices[0].message.content == '{"signal": "BUY"}'
+    assert replayed.usage.total_tokens == 7
+    assert offline.calls == 0
+
+
+def test_async_auto_records_once(tmp_path):
+    cassette = LLMCassette(str(tmp_path / 'tape.bin'), 'auto')
+    server = Server('first', 'second')
+    client = async_client(server)
+    assert run_async(client, cassette).choices[0].message.content == 'first'
+    assert run_async(client, cassette).choices[0].message.content == 'first'
+    assert server.calls == 1
+    assert (cassette.hits, cassette.misses, cassette.recorded) == (1, 1, 1)
+
+
+def test_async_replay_miss_raises(tmp_path):
+    with pytest.raises(CassetteMiss):
+        run_async(async_client(Server()), LLMCassette(str(tmp_path / 'tape.bin'), 'replay'))
+
+
+def test_sync_client_record_then_replay(tmp_path):
+    path = str(tmp_path / 'tape.bin')
+    server = Server('hello')
+    recorded = wrap_client(sync_client(server), LLMCassette(path, 'record')).chat.completions.create(**REQUEST)
+    assert recorded.choices[0].message.content == 'hello'
+    replayed = wrap_client(sync_client(Server()), LLMCassette(path, 'replay')).chat.completions.create(**REQUEST)
+    assert replayed.choices[0].message.content == 'hello'
+    assert server.calls == 1
+
+
+def test_truncated_tail_is_ignored(tmp_path):
+    path = tmp_path / 'tape.bin'
+    run_async(async_client(Server(json.dumps({'signal': 'HOLD'}))), LLMCassette(str(path), 'record'))
+    with open(path, 'ab') as f:
+        f.write(HEADER.pack(b'\x01' * 32, 100) + b'partial')  # 进程在写 payload 时崩溃
+    cassette = LLMCassette(str(path), 'replay')
+    assert len(cassette.index) == 1
+    assert run_async(async_client(Server()), cassette).choices[0].message.content == '{"signal": "HOLD"}'
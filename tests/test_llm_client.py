@@ -0,0 +1,112 @@
+import time
+import threading
+import asyncio
+from types import SimpleNamespace
+from datetime import datetime, timezone
+from concurrent.futures import Future
+
+import app_v2 as bot
+from fakes import FakeLLM
+from llm_client import HedgedLLM
+
+REPLY = '{"signal": "BUY", "confidence": "HIGH", "reason": "ok"}'
+
+
+class Stream(object):
+    """模拟 openai AsyncStream: 首个 chunk 前等待 delay 秒，记录是否被 close()"""
+
+    def __init__(self, delay, gate=None):
+        self.delay = delay
+        self.gate = gate
+        self.closed = False
+
+    async def _chunks(self):
+        await asyncio.sleep(self.delay)
+        if self.gate is not None:
+            await self.gate.wait()
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=REPLY))], usage=None)
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def close(self):
+        self.closed = True
+
+
+class Completions(object):
+    def __init__(self, *delays, together=False):
+        self.delays = list(delays)
+        self.together = together
+        self.gate = None
+        self.streams = []
+
+    async def create(self, **kwargs):
+        if self.together and self.gate is None:
+            self.gate = asyncio.Event()
+        stream = Stream(self.delays.pop(0), self.gate)
+        self.streams.append(stream)
+        if self.together and len(self.streams) == 2:
+            self.gate.set()  # 两个流同时吐出首个 chunk
+        return stream
+
+
+def run_stream(completions, hedge_after):
+    llm = HedgedLLM(SimpleNamespace(chat=SimpleNamespace(completions=completions)), {}, hedge_after=hedge_after)
+
+    async def call():
+        res = await llm.stream([], time.time() + 5)
+        await asyncio.sleep(0.05)  # 让落败请求的取消 / 关闭回调跑完
+        return res
+    return asyncio.run(call())
+
+
+def test_hedge_loser_waiting_for_first_chunk_is_closed():
+    completions = Completions(1.0, 0.0)
+    res = run_stream(completions, hedge_after=0.05)
+    assert res['outcome'] == 'hedge'
+    assert res['fields']['signal'] == 'BUY'
+    primary, hedge = completions.streams
+    assert primary.closed
+
+
+def test_hedge_loser_finishing_together_is_closed():
+    # 两个请求在同一轮 wait 里都拿到首个 chunk: 只用一个，另一个也要关掉
+    completions = Completions(0.0, 0.0, together=True)
+    res = run_stream(completions, hedge_after=0.02)
+    assert res['fields']['signal'] == 'BUY'
+    winner = completions.streams[0] if res['outcome'] == 'primary' else completions.streams[1]
+    loser = completions.streams[1] if res['outcome'] == 'primary' else completions.streams[0]
+    assert loser.closed
+    assert not winner.closed  # 完整读完的流由 openai 自行释放
+
+
+def test_stream_tail_handles_cancel_and_error():
+    logs = []
+    cancelled = Future()
+    cancelled.cancel()
+    bot.finish_llm_stream_tail(cancelled, 1.0, None, None, logs.append)
+    failed = Future()
+    failed.set_exception(RuntimeError("boom"))
+    bot.finish_llm_stream_tail(failed, 1.0, None, None, logs.append)
+    assert len(logs) == 2
+    assert 'boom' in logs[1]
+
+
+def test_stream_tail_is_handled_on_the_cycle_thread(monkeypatch):
+    # 提前交出决策后，完整回复在 LLM 线程接收完，但缓存 / 统计 / 打印都留到下个周期开头在主线程做
+    calls = []
+    monkeypatch.setattr(bot, 'finish_llm_stream_tail', lambda *args: calls.append(threading.get_ident()))
+    monkeypatch.setattr(bot.deepseek_llm, 'client', FakeLLM(chunk_latency=0.02))
+    monkeypatch.setattr(bot.deepseek_llm, 'hedge_after', None)
+    data = {'price': 0.15, 'kline_history': [{'ts': datetime.now(timezone.utc).replace(tzinfo=None)}]}
+    decision = bot.analyze_market_stream(data, 'prompt', None)
+    assert decision['signal'] == 'HOLD'
+
+    deadline = time.time() + 5
+    while bot.llm_stream_tails.empty() and time.time() < deadline:
+        time.sleep(0.01)
+    assert not bot.llm_stream_tails.empty()
+    assert calls == []
+    bot.drain_llm_stream_tails()
+    assert calls == [threading.get_ident()]
+    assert bot.llm_stream_tails.empty()
@@ -0,0 +1,84 @@
+import pytest
+
+from llm_json import DecisionParseError, JSONFieldStream, parse_decision, repair_json, validate_decision
+
+
+@pytest.mark.parametrize('text, fields, path', [
+    ('好的，分析如下：```json\n{"signal": "BUY", "confidence": "HIGH",}\n``` 仅供参考',
+     {'signal': 'BUY', 'confidence': 'HIGH'}, 'trailing_comma'),
+    ("{'signal': 'SELL', 'confidence': 'MEDIUM', 'stop_loss': None}",
+     {'signal': 'SELL', 'confidence': 'MEDIUM', 'stop_loss': None}, 'python_literals'),
+    ('{signal: BUY, confidence: HIGH}', {'signal': 'BUY', 'confidence': 'HIGH'}, 'bare_keys'),
+    ('{"signal"：“做多”，"confidence"："高"}', {'signal': '做多', 'confidence': '高'}, 'fullwidth'),
+    ('{"signal": "BUY" "confidence": "LOW"}', {'signal': 'BUY', 'confidence': 'LOW'}, 'missing_comma'),
+    ('{"signal": "BUY", "confidence": "HIGH", "reason": "突破', {'signal': 'BUY', 'confidence': 'HIGH',
+                                                                'reason': '突破'}, 'truncated'),
+    ('signal: SELL, confidence: LOW', {'signal': 'SELL', 'confidence': 'LOW'}, 'regex'),
+])
+def test_repair_json(text, fields, path):
+    obj, paths = repair_json(text)
+    assert obj == fields
+    assert path in paths
+
+
+def test_valid_json_takes_no_repair_path():
+    assert repair_json('{"signal": "HOLD", "confidence": "LOW"}') == ({'signal': 'HOLD', 'confidence': 'LOW'}, [])
+
+
+def test_truncated_number_is_not_trusted():
+    # 被截断的 "0.1" 可能是 0.15，不能当成止损价
+    obj, _ = repair_json('{"signal": "BUY", "stop_loss": 0.1')
+    assert obj['stop_loss'] is None
+
+
+def test_unrecoverable_reply_raises():
+    with pytest.raises(DecisionParseError):
+        repair_json('完全不是JSON')
+
+
+def test_invalid_signal_forces_hold():
+    decision, paths = parse_decision('{"signal": "FOO", "confidence": "SURE"}')
+    assert decision['signal'] == 'HOLD'
+    assert decision['confidence'] == 'LOW'
+    assert {'signal_invalid', 'confidence_invalid'} <= set(paths)
+
+
+def test_aliases_are_normalized():
+    decision, paths = parse_decision('{"signal": "做空", "confidence": "中"}')
+    assert (decision['signal'], decision['confidence']) == ('SELL', 'MEDIUM')
+    assert {'signal_alias', 'confidence_alias'} <= set(paths)
+
+
+@pytest.mark.parametrize('signal, sl, tp, kept', [
+    ('BUY', 0.14, 0.17, (0.14, 0.17)),
+    ('BUY', 0.16, 0.14, (None, None)),     # 做多: 止损须低于现价、止盈须高于现价
+    ('SELL', 0.16, 0.14, (0.16, 0.14)),
+    ('SELL', 0.14, 0.17, (None, None)),
+])
+def test_levels_must_be_on_the_right_side(signal, sl, tp, kept):
+    decision, _ = validate_decision({'signal': signal, 'confidence': 'HIGH', 'stop_loss': sl, 'take_profit': tp},
+                                    price=0.15)
+    assert (decision['stop_loss'], decision['take_profit']) == kept
+
+
+def test_field_stream_waits_for_complete_scalars():
+    stream = JSONFieldStream()
+    assert stream.feed('```json\n{"signal": "BU') == []
+    assert stream.feed('Y", "stop_loss": 0.1') == ['signal']
+    assert 'stop_loss' not in stream.fields  # 0.1 后面可能还有数字
+    assert stream.feed('5, "confidence": "HIGH"}') == ['stop_loss', 'confidence']
+    assert stream.fields == {'signal': 'BUY', 'stop_loss': 0.15, 'confidence': 'HIGH'}
+
+
+@pytest.mark.parametrize('text', ['-0.5', '−0.5', '止损: -0.12', -0.5, '0'])
+def test_non_positive_price_is_dropped(text):
+    decision, paths = validate_decision({'signal': 'HOLD', 'confidence': 'LOW', 'stop_loss': text})
+    assert decision['stop_loss'] is None
+    assert 'stop_loss_dropped' in paths
+
+
+@pytest.mark.parametrize('text, price', [('0.16', 0.16), ('约 0.16 USDT', 0.16), ('0.15-0.16', 0.15),
+                                         ('1,234.5', 1234.5)])
+def test_price_string(text, price):
+    decision, _ = validate_decision({'signal': 'HOLD', 'confidence': 'LOW', 'take_profit': text})
+    assert decision['take_profit'] == price
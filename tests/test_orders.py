@@ -0,0 +1,58 @@
+import pytest
+
+import app_v2 as bot
+from fakes import FakeExchange
+from order_exec import submit_orders
+
+SYMBOL = 'DOGE/USDT:USDT'
+FAST = {'first_poll_sec': 0.001, 'max_poll_sec': 0.002, 'timeout_sec': 1}
+
+
+def cfg(reversal):
+    return {'symbol': SYMBOL, 'amount': 3, 'reversal': reversal}
+
+
+def legs(orders):
+    return [(o['side'], o['amount'], o['params'].get('reduceOnly', False), o.get('batch', False)) for o in orders]
+
+
+@pytest.mark.parametrize('reversal', ['sequential', 'batch', 'net'])
+def test_open_from_flat(reversal):
+    assert legs(bot.plan_live_orders('BUY', None, cfg(reversal))) == [('buy', 3, False, False)]
+    assert legs(bot.plan_live_orders('SELL', None, cfg(reversal))) == [('sell', 3, False, False)]
+
+
+@pytest.mark.parametrize('sig, side', [('BUY', 'long'), ('SELL', 'short'), ('HOLD', 'long'), ('HOLD', None)])
+def test_nothing_to_do(sig, side):
+    pos = {'side': side, 'size': 5} if side else None
+    assert bot.plan_live_orders(sig, pos, cfg('net')) == []
+
+
+def test_sequential_reversal():
+    orders = bot.plan_live_orders('SELL', {'side': 'long', 'size': 5}, cfg('sequential'))
+    assert legs(orders) == [('sell', 5, True, False), ('sell', 3, False, False)]
+
+
+def test_batch_reversal():
+    orders = bot.plan_live_orders('BUY', {'side': 'short', 'size': 5}, cfg('batch'))
+    assert legs(orders) == [('buy', 5, True, True), ('buy', 3, False, True)]
+
+
+def test_net_reversal():
+    # 单向持仓: 一笔 持仓+新开 张数的反向单
+    orders = bot.plan_live_orders('BUY', {'side': 'short', 'size': 5}, cfg('net'))
+    assert legs(orders) == [('buy', 8, False, False)]
+
+
+@pytest.mark.parametrize('reversal, batches', [('sequential', 0), ('batch', 1), ('net', 0)])
+def test_submit_reversal(reversal, batches):
+    exchange = FakeExchange()
+    create_orders = exchange.create_orders
+    calls = []
+    exchange.create_orders = lambda orders, params=None: calls.append(len(orders)) or create_orders(orders, params)
+    orders = bot.plan_live_orders('SELL', {'side': 'long', 'size': 5}, cfg(reversal))
+    filled = submit_orders(exchange, orders, FAST)
+    assert len(calls) == batches  # batch 模式两条腿一次请求发出
+    assert [o['side'] for o in filled] == ['sell'] * len(orders)
+    assert all(o['status'] == 'closed' for o in filled)
+    assert sum(o['amount'] for o in filled) == 8
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from paper_ledger import FUNDING_INTERVAL_MS, STATE_FIELDS, PaperLedger, ledger_path
+
+T0 = 1_700_000_000_000
+
+
+def trade(ledger):
+    """开多 -> 加仓 -> 跨过一次资金费 -> 反手开空 -> 平空"""
+    ledger.fill('buy', 2, 0.10, 100, T0)
+    ledger.fill('buy', 1, 0.13, 100, T0 + 60_000)
+    for ts in ledger.funding_due(T0 + FUNDING_INTERVAL_MS):
+        ledger.settle_funding(ts, 0.0001, 0.12)
+    ledger.fill('sell', 5, 0.12, 100, T0 + FUNDING_INTERVAL_MS + 60_000)
+    ledger.fill('buy', 2, 0.11, 100, T0 + FUNDING_INTERVAL_MS + 120_000)
+
+
+def state(ledger):
+    return {k: getattr(ledger, k) for k in STATE_FIELDS}
+
+
+def test_fill_accounting():
+    ledger = PaperLedger(balance=100.0, taker_fee=0.0, slippage_bps=0.0)
+    ledger.fill('buy', 2, 0.10, 100, T0)
+    ledger.fill('buy', 2, 0.20, 100, T0)
+    assert ledger.entry_price == pytest.approx(0.15)
+    ledger.fill('sell', 6, 0.25, 100, T0)  # 平 4 张多 + 开 2 张空
+    assert ledger.realized_pnl == pytest.approx(4 * 100 * 0.10)
+    assert ledger.side == 'short' and ledger.holdings == 2
+    assert ledger.entry_price == 0.25
+    assert (ledger.trades, ledger.wins) == (1, 1)
+    assert ledger.equity(0.20) == pytest.approx(100 + 40 + 2 * 100 * 0.05)
+
+
+def test_funding_due_only_with_position():
+    ledger = PaperLedger()
+    assert ledger.funding_due(T0 + 3 * FUNDING_INTERVAL_MS) == []
+    ledger.fill('sell', 1, 0.1, 100, T0)
+    due = ledger.funding_due(T0 + 2 * FUNDING_INTERVAL_MS)
+    assert len(due) == 2 and all(ts % FUNDING_INTERVAL_MS == 0 and ts > T0 for ts in due)
+    ledger.settle_funding(due[0], 0.0001, 0.1)
+    assert ledger.funding_paid == pytest.approx(-0.0001 * 0.1 * 100)  # 空头在费率为正时收钱
+
+
+@pytest.mark.parametrize('snapshot_every', [0, 2, 200])
+def test_replay_rebuilds_same_state(tmp_path, snapshot_every):
+    path = str(tmp_path / 'doge.jsonl')
+    ledger = PaperLedger(path, taker_fee=0.0005, slippage_bps=2, snapshot_every=snapshot_every)
+    trade(ledger)
+    expected = state(ledger)
+    ledger._file.close()  # 模拟崩溃: 不走 close()，没有退出快照
+    ledger._file = None
+
+    reopened = PaperLedger(path, taker_fee=0.0, slippage_bps=0, snapshot_every=snapshot_every)
+    assert state(reopened) == expected  # 事件里记的是成交价和手续费，与重启后的配置无关
+    assert reopened.replayed == (expected['seq'] % snapshot_every if snapshot_every else expected['seq'])
+    reopened.close()
+
+    os.remove(path + '.snapshot')  # 没有快照时从头回放
+    full = PaperLedger(path)
+    assert state(full) == expected
+    assert full.replayed == expected['seq']
+    full.close()
+
+
+def test_close_snapshot_skips_replay(tmp_path):
+    path = str(tmp_path / 'doge.jsonl')
+    ledger = PaperLedger(path)
+    trade(ledger)
+    ledger.close()
+    reopened = PaperLedger(path)
+    assert reopened.replayed == 0
+    assert state(reopened) == state(ledger)
+    reopened.close()
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    path = str(tmp_path / 'doge.jsonl')
+    ledger = PaperLedger(path, snapshot_every=0)
+    ledger.fill('buy', 1, 0.1, 100, T0)
+    expected = state(ledger)
+    ledger._file.write(b'{"type":"fill","ts":')  # 写到一半断电
+    ledger._file.close()
+    ledger._file = None
+
+    reopened = PaperLedger(path, snapshot_every=0)
+    assert state(reopened) == expected
+    reopened.fill('sell', 1, 0.1, 100, T0 + 1)  # 截掉残行后接着追加，文件仍可完整回放
+    reopened._file.close()
+    reopened._file = None
+    assert PaperLedger(path, snapshot_every=0).position == 0
+
+
+def test_ledger_path():
+    assert ledger_path('data/paper/{symbol}.jsonl', 'DOGE/USDT:USDT') == 'data/paper/DOGE-USDT-USDT.jsonl'
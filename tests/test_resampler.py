@@ -0,0 +1,82 @@
+import calendar
+
+from resampler import Resampler
+
+MIN = 60 * 1000
+T0 = calendar.timegm((2024, 3, 1, 0, 0, 0)) * 1000  # UTC 整点，所有周期的边界
+
+
+def bar(i, o=None, vol=1.0):
+    """第 i 分钟的 1m K线，价格随 i 变化便于核对 高/低/收"""
+    o = float(i) if o is None else o
+    return [T0 + i * MIN, o, o + 0.5, o - 0.5, o + 0.25, vol]
+
+
+def test_bucket_closes_on_last_minute():
+    rs = Resampler(['5m', '15m'])
+    done = []
+    for i in range(4):
+        done += rs.push(bar(i))
+    assert done == []
+    done = rs.push(bar(4))  # 00:04 这根 1m 收盘即 00:00 的 5m 收盘
+    assert done == [('5m', [T0, 0.0, 4.5, -0.5, 4.25, 5.0])]
+    for i in range(5, 15):
+        done += rs.push(bar(i))
+    assert [tf for tf, _ in done] == ['5m', '5m', '5m', '15m']
+    assert done[-1][1] == [T0, 0.0, 14.5, -0.5, 14.25, 15.0]
+
+
+def test_unaligned_start_opens_on_boundary():
+    rs = Resampler(['5m'])
+    rs.push(bar(3))
+    assert rs.partial['5m'][0] == T0  # 从 00:03 开始喂，K线仍按 00:00 开盘
+    assert rs.push(bar(4)) == [('5m', [T0, 3.0, 4.5, 2.5, 4.25, 2.0])]
+
+
+def test_missing_last_minute_closes_on_next_bucket():
+    rs = Resampler(['5m'])
+    for i in range(4):
+        rs.push(bar(i))
+    done = rs.push(bar(5))  # 00:04 缺失
+    assert done == [('5m', [T0, 0.0, 3.5, -0.5, 3.25, 4.0])]
+    assert rs.partial['5m'][0] == T0 + 5 * MIN
+
+
+def test_old_and_duplicate_candles_ignored():
+    rs = Resampler(['5m'])
+    rs.push(bar(1))
+    assert rs.push(bar(1)) == []
+    assert rs.push(bar(0)) == []
+    assert rs.partial['5m'][5] == 1.0
+
+
+def test_seed_is_not_rebuilt():
+    rs = Resampler(['1h'])
+    rs.seed('1h', [[T0 - 60 * MIN, 1, 2, 0, 1, 100]])
+    assert rs.resume_ms() == T0
+    rs.seed('1h', [[T0, 1, 2, 0, 1, 100]])  # 交易所已给出 00:00 这根
+    assert rs.resume_ms() == T0 + 60 * MIN
+    for i in range(60):
+        assert rs.push(bar(i)) == []
+    assert rs.partial['1h'] is None
+    assert len(rs.closed['1h']) == 2
+
+
+def test_live_candle_joins_current_bar():
+    rs = Resampler(['5m'])
+    candles = [bar(i) for i in range(8)]
+    done = rs.extend(candles, now_ms=T0 + 7 * MIN + 30 * 1000)  # 00:07 这根还没收盘
+    assert [tf for tf, _ in done] == ['5m']
+    assert rs.live == candles[-1]
+    current = rs.current('5m')
+    assert current == [T0 + 5 * MIN, 5.0, 7.5, 4.5, 7.25, 3.0]
+    rows = rs.ohlcv('5m', 10)
+    assert [r[0] for r in rows] == [T0, T0 + 5 * MIN]
+    assert rs.partial['5m'][5] == 2.0  # current() 不改内部状态
+
+
+def test_live_candle_opens_new_bar():
+    rs = Resampler(['5m'])
+    rs.extend([bar(i) for i in range(6)], now_ms=T0 + 5 * MIN + 1)
+    assert rs.partial['5m'] is None
+    assert rs.current('5m') == [T0 + 5 * MIN, 5.0, 5.5, 4.5, 5.25, 1.0]
@@ -0,0 +1,120 @@
+import asyncio
+import calendar
+
+import pytest
+
+from scheduler import (CandleScheduler, candle_open, confirm_candle_close, confirm_candle_close_async,
+                       next_candle_close)
+
+MIN = 60 * 1000
+HOUR = 60 * MIN
+FAST = {'first_poll_sec': 0.001, 'max_poll_sec': 0.002, 'timeout_sec': 0.05}
+
+
+def utc_ms(*args):
+    return calendar.timegm(args + (0,) * (6 - len(args))) * 1000
+
+
+class FixedClock(object):
+    def __init__(self, now_ms):
+        self.now = now_ms
+        self.offset_ms = 0.0
+
+    def now_ms(self):
+        return self.now
+
+    def needs_sync(self):
+        return False
+
+
+@pytest.mark.parametrize('now, timeframe, open_ms, close_ms', [
+    (utc_ms(2024, 3, 1, 10, 7), '15m', utc_ms(2024, 3, 1, 10, 0), utc_ms(2024, 3, 1, 10, 15)),
+    (utc_ms(2024, 3, 1, 10, 15), '15m', utc_ms(2024, 3, 1, 10, 15), utc_ms(2024, 3, 1, 10, 30)),  # 正好在边界上
+    (utc_ms(2024, 3, 1, 10, 15) - 1, '15m', utc_ms(2024, 3, 1, 10, 0), utc_ms(2024, 3, 1, 10, 15)),
+    (utc_ms(2024, 3, 1, 23, 59), '4h', utc_ms(2024, 3, 1, 20), utc_ms(2024, 3, 2)),
+    (utc_ms(2024, 3, 3, 12), '1w', utc_ms(2024, 2, 26), utc_ms(2024, 3, 4)),  # 周K线从周一开始
+    (utc_ms(2024, 12, 31, 23), '1M', utc_ms(2024, 12, 1), utc_ms(2025, 1, 1)),
+    (utc_ms(2024, 2, 29, 12), '1M', utc_ms(2024, 2, 1), utc_ms(2024, 3, 1)),
+])
+def test_candle_bounds(now, timeframe, open_ms, close_ms):
+    assert candle_open(now, timeframe) == open_ms
+    assert next_candle_close(now, timeframe) == close_ms
+
+
+def test_scheduler_fires_on_boundary_with_delay():
+    clock = FixedClock(utc_ms(2024, 3, 1, 10, 7))
+    scheduler = CandleScheduler(clock, delay_sec=0.5)
+    scheduler.add('doge', '15m', lambda: None)
+    fire = utc_ms(2024, 3, 1, 10, 15) + 500
+    assert scheduler.heap[0][0] == fire
+
+    clock.now = fire - 1
+    assert scheduler.pop_due() == []
+    clock.now = fire + 20
+    assert [name for name, _ in scheduler.pop_due()] == ['doge']
+    assert scheduler.heap[0][0] == fire + 15 * MIN
+    assert scheduler.stats['doge'].last_drift == 20
+
+
+def test_scheduler_skips_missed_candles():
+    clock = FixedClock(utc_ms(2024, 3, 1, 10, 7))
+    scheduler = CandleScheduler(clock)
+    scheduler.add('doge', '15m', lambda: None)
+    clock.now = utc_ms(2024, 3, 1, 11, 2)  # 上一个任务跑太久，错过了 3 个边界
+    assert len(scheduler.pop_due()) == 1
+    assert scheduler.heap[0][0] == utc_ms(2024, 3, 1, 11, 15)
+
+
+def test_scheduler_orders_timeframes():
+    clock = FixedClock(utc_ms(2024, 3, 1, 10, 7))
+    scheduler = CandleScheduler(clock)
+    scheduler.add('1h', '1h', lambda: None)
+    scheduler.add('15m', '15m', lambda: None)
+    clock.now = utc_ms(2024, 3, 1, 11)
+    assert sorted(name for name, _ in scheduler.pop_due()) == ['15m', '1h']  # 整点两个周期同时到期
+
+
+class Exchange(object):
+    """前 stale 次轮询只返回上一根K线，之后出现新K线；fail=True 时第一次请求出错"""
+
+    def __init__(self, open_ms, timeframe_ms, stale, fail=False):
+        self.open_ms, self.timeframe_ms = open_ms, timeframe_ms
+        self.stale, self.fail = stale, fail
+        self.calls = 0
+
+    def rows(self, limit):
+        self.calls += 1
+        if self.fail and self.calls == 1:
+            raise IOError("timeout")
+        ts = self.open_ms if self.calls > self.stale else self.open_ms - self.timeframe_ms
+        return [[ts, 1, 1, 1, 1, 1]][-limit:]
+
+    def fetch_ohlcv(self, symbol, timeframe, limit=None):
+        return self.rows(limit)
+
+    async def fetch_ohlcv_async(self, symbol, timeframe, limit=None):
+        return self.rows(limit)
+
+
+def test_confirm_waits_for_new_candle():
+    clock = FixedClock(utc_ms(2024, 3, 1, 10, 15) + 300)
+    exchange = Exchange(utc_ms(2024, 3, 1, 10, 15), 15 * MIN, stale=2, fail=True)
+    result = confirm_candle_close(exchange.fetch_ohlcv, 'DOGE', '15m', clock, FAST)
+    assert result['confirmed']
+    assert result['polls'] == 3
+    assert result['open_ms'] == utc_ms(2024, 3, 1, 10, 15)
+
+
+def test_confirm_times_out():
+    clock = FixedClock(utc_ms(2024, 3, 1, 10, 15) + 300)
+    exchange = Exchange(utc_ms(2024, 3, 1, 10, 15), 15 * MIN, stale=10 ** 6)
+    result = confirm_candle_close(exchange.fetch_ohlcv, 'DOGE', '15m', clock, FAST)
+    assert not result['confirmed']
+    assert result['wait_ms'] <= FAST['timeout_sec'] * 1000 + 50
+
+
+def test_confirm_async_matches_sync():
+    clock = FixedClock(utc_ms(2024, 3, 1, 11) + 300)
+    exchange = Exchange(utc_ms(2024, 3, 1, 11), HOUR, stale=1)
+    result = asyncio.run(confirm_candle_close_async(exchange.fetch_ohlcv_async, 'DOGE', '1h', clock, FAST))
+    assert result['confirmed'] and result['polls'] == 2
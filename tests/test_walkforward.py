@@ -0,0 +1,38 @@
+import numpy as np
+
+from backtest import WARMUP_BARS
+from walkforward import DAY_MS, first_tradable_ms, last_common_ms, make_windows
+
+H = 3600 * 1000
+
+
+def frames(**bars):
+    """每个周期从 0 开始、按周期长度排开的时间戳"""
+    step = {'1h': H, '4h': 4 * H}
+    return {tf: {'ts': np.arange(n, dtype=np.int64) * step[tf]} for tf, n in bars.items()}
+
+
+def point(tf, slow):
+    return {'timeframe': tf, 'sma_fast': 5, 'sma_mid': 10, 'sma_slow': slow}
+
+
+def test_range_uses_grid_timeframes_only():
+    # 网格里没有基础周期 (如 --timeframe 15m --grid timeframe=1h,4h)
+    data = frames(**{'1h': 1000, '4h': 200})
+    start = first_tradable_ms(data, [point('1h', 100), point('4h', 150)])
+    assert start == (max(WARMUP_BARS, 150) - 1) * 4 * H
+    assert last_common_ms(data) == 199 * 4 * H + 1  # 4h 先结束，窗口不能超过它
+
+
+def test_not_enough_bars():
+    data = frames(**{'1h': 1000, '4h': 100})
+    assert first_tradable_ms(data, [point('4h', 150)]) is None
+    assert last_common_ms(frames(**{'1h': 0})) is None
+
+
+def test_windows_tile_the_range():
+    windows = make_windows(0, 100 * DAY_MS, 30 * DAY_MS, 10 * DAY_MS)
+    assert len(windows) == 7
+    assert all(b['train_end'] == a['test_end'] for a, b in zip(windows, windows[1:]))
+    anchored = make_windows(0, 100 * DAY_MS, 30 * DAY_MS, 10 * DAY_MS, anchored=True)
+    assert {w['train_start'] for w in anchored} == {0}
@@ -0,0 +1,28 @@
+import pytest
+
+from ws_feed import CandleFeed, okx_candle_channel, okx_inst_id
+
+
+@pytest.mark.parametrize('timeframe, channel', [
+    ('1m', 'candle1m'), ('15m', 'candle15m'),
+    ('1h', 'candle1H'), ('2h', 'candle2H'), ('4h', 'candle4H'),
+    ('6h', 'candle6Hutc'), ('12h', 'candle12Hutc'),  # 默认 6H/12H 按香港时间切分，要用 UTC 版本
+    ('1d', 'candle1Dutc'), ('1w', 'candle1Wutc'), ('1M', 'candle1Mutc'),
+])
+def test_candle_channel_is_utc_aligned(timeframe, channel):
+    assert okx_candle_channel(timeframe) == channel
+
+
+def test_inst_id():
+    assert okx_inst_id('DOGE/USDT:USDT') == 'DOGE-USDT-SWAP'
+    assert okx_inst_id('BTC/USDT') == 'BTC-USDT'
+
+
+def test_ohlcv_snapshot_is_a_copy():
+    feed = CandleFeed('DOGE-USDT-SWAP', '1m', 60000, None, None, maxlen=3)
+    feed._append_closed([[i * 60000, 1, 1, 1, 1, 1] for i in range(3)])
+    feed.live = [3 * 60000, 2, 2, 2, 2, 2]
+    rows = feed.ohlcv(3)
+    assert [r[0] for r in rows] == [60000, 120000, 180000]
+    feed._append_closed([[3 * 60000, 1, 1, 1, 1, 1]])  # 读循环之后追加的K线不影响已取出的快照
+    assert [r[0] for r in rows] == [60000, 120000, 180000]
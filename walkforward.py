@@ -0,0 +1,205 @@
+import os
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import optimizer
+from backtest import WARMUP_BARS, DEFAULT_ACCOUNT, simulate_account, summarize
+from optimizer import ACCOUNT_PARAMS, SIGNAL_PARAMS, RESULT_COLUMNS
+
+# --- Walk-forward 验证 ---
+# 把历史切成滚动的 [训练窗 | 测试窗]: 训练窗上扫描全部参数点选出最优，原样放到紧随其后的测试窗上回测，
+# 所有测试窗拼起来就是样本外 (out-of-sample) 表现
+# K线 / 均线 / RSI 数组放在一块 shared_memory 里，每个工作进程挂载同一份，参数点按时间窗切片结算，不 pickle DataFrame
+#   python walkforward.py --train-days 90 --test-days 30 --grid sma_fast=10:30:5 --grid timeframe=15m,1h
+#   python walkforward.py --train-days 180 --test-days 30 --anchored     # 训练窗起点固定，逐窗变长
+
+DAY_MS = 86400 * 1000
+
+
+def first_tradable_ms(data, points):
+    """所有参数点都过了预热期 (WARMUP_BARS 与最长均线) 的最早时间；有周期的K线不够预热时返回 None"""
+    slow = {}
+    for p in points:
+        slow[p['timeframe']] = max(slow.get(p['timeframe'], 0), p['sma_slow'])
+    starts = []
+    for tf, n in slow.items():
+        ts = data[tf]['ts']
+        if len(ts) < max(WARMUP_BARS, n):
+            return None
+        starts.append(ts[max(WARMUP_BARS, n) - 1])
+    return int(max(starts))
+
+
+def last_common_ms(data):
+    """所有周期都还有K线的截止时间 (不含)，按网格里实际加载的周期算，不依赖 --timeframe"""
+    if any(len(d['ts']) == 0 for d in data.values()):
+        return None
+    return min(int(d['ts'][-1]) for d in data.values()) + 1
+
+
+def make_windows(start_ms, end_ms, train_ms, test_ms, step_ms=None, anchored=False):
+    """滚动窗口 (默认步长 = 测试窗长度，测试窗首尾相接)；anchored=True 时训练窗起点固定"""
+    step_ms = step_ms or test_ms
+    windows = []
+    t = start_ms
+    while t + train_ms + test_ms <= end_ms:
+        windows.append({'train_start': start_ms if anchored else t,
+                        'train_end': t + train_ms, 'test_end': t + train_ms + test_ms})
+        t += step_ms
+    return windows
+
+
+# --- 工作进程 (数据挂载沿用 optimizer 的 _init_worker) ---
+
+def evaluate(args):
+    """
+    一个参数点在若干时间窗上的表现。信号按整段算一次 (均线 / RSI 只用历史数据，切片不引入未来)，
+    每个窗从空仓开始按切片结算
+    """
+    point, base_account, ranges, keep_equity = args
+    tf = point['timeframe']
+    d = optimizer._DATA[tf]
+    sig = optimizer._signals(tf, point['sma_fast'], point['sma_mid'], point['sma_slow'])
+    account = dict(base_account, **{k: point[k] for k in ACCOUNT_PARAMS if k in point})
+    rows = []
+    for window, start_ms, end_ms in ranges:
+        a, b = np.searchsorted(d['ts'], (start_ms, end_ms))
+        result = simulate_account(sig[a:b], d['close'][a:b], account)
+        row = dict(point, window=window, bars=int(b - a))
+        row.update((k, v) for k, v in summarize(result).items() if k in RESULT_COLUMNS)
+        if keep_equity:
+            row['equity'] = (d['ts'][a:b].copy(), result['equity'] - account['balance'])
+        rows.append(row)
+    return rows
+
+
+# --- 调度 ---
+
+def run_walk_forward(data, points, windows, account=None, workers=None, sort='pnl'):
+    """
+    返回 (训练窗全部结果, 每窗样本外结果, 拼接后的样本外盈亏曲线)。
+    两个阶段共用同一个进程池和同一块共享内存
+    """
+    account = dict(DEFAULT_ACCOUNT, **(account or {}))
+    points = list(points)
+    data = optimizer.add_smas(data, points)
+    workers = workers or os.cpu_count() or 1
+    train_ranges = [(i, w['train_start'], w['train_end']) for i, w in enumerate(windows)]
+    # 一个任务 = 一个参数点跑全部训练窗，信号只算一次
+    train_tasks = [(p, account, train_ranges, False) for p in points]
+
+    def phases(run):
+        train = pd.DataFrame([row for rows in run(train_tasks) for row in rows])
+        # 结果回来的顺序不定，先按参数排好，并列时选出的点与进程数无关
+        train = train.sort_values([k for k in SIGNAL_PARAMS + ACCOUNT_PARAMS if k in train] + ['window'],
+                                  kind='stable').reset_index(drop=True)
+        best = [optimizer.rank(group, sort).iloc[0] for _, group in train.groupby('window', sort=True)]
+        test_tasks = [({k: row[k] for k in SIGNAL_PARAMS + ACCOUNT_PARAMS if k in row}, account,
+                       [(int(row['window']), windows[int(row['window'])]['train_end'],
+                         windows[int(row['window'])]['test_end'])], True) for row in best]
+        test = [rows[0] for rows in run(test_tasks)]
+        return train, best, test
+
+    if workers == 1:
+        optimizer._init_worker(data)
+        train, best, test = phases(lambda tasks: map(evaluate, tasks))
+    else:
+        with optimizer.worker_pool(data, workers) as pool:
+            train, best, test = phases(lambda tasks: pool.imap_unordered(
+                evaluate, tasks, chunksize=optimizer.chunk_size(len(tasks), workers)))
+
+    test.sort(key=lambda row: row['window'])
+    curve, offset = [], 0.0
+    for row in test:
+        ts, pnl = row.pop('equity')
+        curve.append(pd.Series(offset + pnl, index=pd.to_datetime(ts, unit='ms')))
+        offset += pnl[-1] if len(pnl) else 0.0
+    oos = pd.DataFrame(test)
+    best = pd.DataFrame(best).set_index('window')
+    for k in RESULT_COLUMNS:
+        oos[f'is_{k}'] = oos['window'].map(best[k])
+    return train, oos, pd.concat(curve) if curve else pd.Series(dtype=np.float64)
+
+
+def oos_report(oos, curve, windows, balance):
+    """各测试窗合并成一份样本外报告: 盈亏直接相加 (每窗同样的初始余额和张数)，回撤按拼接后的曲线算"""
+    if oos.empty:
+        return {}
+    equity = balance + curve.to_numpy()
+    peak = np.maximum.accumulate(np.r_[balance, equity])[1:]
+    trades = int(oos['trades'].sum())
+    wins = float((oos['win_rate'] * oos['trades']).sum())
+    train_days = sum(w['train_end'] - w['train_start'] for w in windows) / DAY_MS
+    test_days = sum(w['test_end'] - w['train_end'] for w in windows) / DAY_MS
+    is_daily = oos['is_pnl'].sum() / train_days
+    oos_daily = oos['pnl'].sum() / test_days
+    return {
+        'windows': len(oos),
+        'oos_days': round(test_days, 1),
+        'oos_pnl': float(oos['pnl'].sum()),
+        'oos_return_pct': float(oos['pnl'].sum() / balance * 100),
+        'oos_max_drawdown_pct': float(np.max((peak - equity) / peak) * 100) if len(equity) else 0.0,
+        'trades': trades,
+        'win_rate': wins / trades if trades else 0.0,
+        'profitable_windows': float((oos['pnl'] > 0).mean()),
+        # 样本外日均盈亏 / 训练窗日均盈亏: 接近 1 说明参数没有明显过拟合
+        'efficiency': float(oos_daily / is_daily) if is_daily > 0 else float('nan'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward 验证: 训练窗扫描选参，测试窗样本外回测")
+    optimizer.add_sweep_arguments(parser)
+    parser.add_argument('--train-days', type=float, default=90)
+    parser.add_argument('--test-days', type=float, default=30)
+    parser.add_argument('--step-days', type=float, default=None, help="窗口步长，默认等于测试窗")
+    parser.add_argument('--anchored', action='store_true', help="训练窗起点固定 (扩张窗口)")
+    parser.add_argument('--output', help="每窗结果保存为 CSV")
+    args = parser.parse_args()
+    grid = optimizer.build_grid(parser, args)
+
+    load_start = time.perf_counter()
+    data = optimizer.load_sweep_data(args.symbol, args.timeframe, grid['timeframe'], csv=args.csv)
+    bars = ', '.join(f"{tf} {len(d['close'])}根" for tf, d in data.items())
+    print(f"📥 K线准备完成: {bars} | {(time.perf_counter() - load_start) * 1000:.0f} ms")
+
+    points = (optimizer.sample_points(grid, args.samples, args.seed) if args.samples
+              else list(optimizer.grid_points(grid)))
+    if not points:
+        parser.error("网格里没有合法的参数点 (需要 sma_fast < sma_mid < sma_slow)")
+    start_ms = first_tradable_ms(data, points)
+    end_ms = last_common_ms(data)
+    if start_ms is None or end_ms is None or start_ms >= end_ms:
+        parser.error("各周期预热后的K线没有共同的时间段，无法切分窗口")
+    windows = make_windows(start_ms, end_ms, int(args.train_days * DAY_MS), int(args.test_days * DAY_MS),
+                           int(args.step_days * DAY_MS) if args.step_days else None, args.anchored)
+    if not windows:
+        print(f"⚠️ 预热后的K线不够一个 {args.train_days:g}+{args.test_days:g} 天的窗口")
+        return
+
+    workers = args.workers or os.cpu_count() or 1
+    print(f"🔍 {len(windows)} 个窗口 × {len(points)} 个参数点 | {workers} 个进程")
+    start = time.perf_counter()
+    account = {'contract_size': args.contract_size}
+    train, oos, curve = run_walk_forward(data, points, windows, account, workers, args.sort)
+    elapsed = time.perf_counter() - start
+    print(f"✅ 完成 {len(train) + len(oos)} 次窗口回测 | 耗时 {elapsed:.1f}s")
+
+    for w, row in zip(windows, oos.itertuples()):
+        print(f"{pd.to_datetime(w['train_end'], unit='ms'):%Y-%m-%d} ~ {pd.to_datetime(w['test_end'], unit='ms'):%Y-%m-%d} "
+              + ' '.join(f"{k}={getattr(row, k)}" for k in SIGNAL_PARAMS + ACCOUNT_PARAMS if k in oos)
+              + f" | 训练 {row.is_pnl:+.2f} | 样本外 {row.pnl:+.2f} ({row.trades}笔, 回撤 {row.max_drawdown_pct:.2f}%)")
+
+    report = oos_report(oos, curve, windows, DEFAULT_ACCOUNT['balance'])
+    print("📊 样本外汇总: " + ' | '.join(
+        f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}" for k, v in report.items()))
+    if args.output:
+        oos.to_csv(args.output, index=False)
+        print(f"💾 每窗结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
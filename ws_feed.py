@@ -0,0 +1,164 @@
+import json
+import time
+import asyncio
+from collections import deque
+
+# WebSocket 行情: 订阅 OKX K线频道，内存里保存最近的K线，
+# 收到 confirm=1 (已收盘) 的推送立即触发回调，取代 "睡到整点 + 2秒 + REST 轮询"
+# 断线自动重连 (指数退避)，重连或发现断档时用 REST 补齐缺失的已收盘K线
+
+OKX_WS_BUSINESS = "wss://ws.okx.com:8443/ws/v5/business"  # K线频道在 business 端点
+PING_INTERVAL = 20  # OKX 30秒无消息会断开，定时发送 'ping'
+
+
+def okx_candle_channel(timeframe):
+    """
+    '15m' -> 'candle15m', '1h' -> 'candle1H', '6h' -> 'candle6Hutc', '1d' -> 'candle1Dutc'。
+    6H / 12H 及以上的默认频道按香港时间 (UTC+8) 切分，与 ccxt REST 和K线仓库用的 UTC 版本错开 8 小时
+    """
+    num, unit = timeframe[:-1], timeframe[-1]
+    if unit == 'm':
+        return f"candle{num}m"
+    if unit == 'h' and 8 % int(num or 1) == 0:
+        return f"candle{num}H"  # 1H/2H/4H 的边界在两种时区下相同
+    return f"candle{num}{unit.upper()}utc"
+
+
+def okx_inst_id(symbol):
+    """'DOGE/USDT:USDT' -> 'DOGE-USDT-SWAP' (未加载 markets 时的兜底换算)"""
+    base, rest = symbol.split('/')
+    quote = rest.split(':')[0]
+    return f"{base}-{quote}-SWAP" if ':' in rest else f"{base}-{quote}"
+
+
+class CandleFeed(object):
+    """
+    单个 (symbol, timeframe) 的实时K线流
+    on_close(candle): K线收盘回调 (协程)，candle = [ts, o, h, l, c, vol]
+    backfill(since_ms): 返回 since 之后K线的协程 (REST 补数据用，since=None 表示最近一段)
+    clock(): 当前毫秒时间，用于判断 REST 返回的K线是否已收盘 (默认本机时间)
+    """
+
+    def __init__(self, inst_id, timeframe, tf_ms, on_close, backfill, url=OKX_WS_BUSINESS,
+                 clock=None, maxlen=2000):
+        self.inst_id = inst_id
+        self.channel = okx_candle_channel(timeframe)
+        self.tf_ms = tf_ms
+        self.on_close = on_close
+        self.backfill = backfill
+        self.url = url
+        self.clock = clock or (lambda: time.time() * 1000)
+        self.closed = deque(maxlen=maxlen)  # 已收盘K线
+        self.live = None                    # 当前未收盘K线
+        self.reconnects = 0
+        self.stopped = False
+
+    @property
+    def last_closed_ts(self):
+        return self.closed[-1][0] if self.closed else None
+
+    @property
+    def ready(self):
+        return len(self.closed) > 0
+
+    def ohlcv(self, limit):
+        """最近 limit 根 (已收盘 + 当前未收盘)，结构与 fetch_ohlcv 相同。只在事件循环线程调用 (读循环会同时追加K线)"""
+        rows = list(self.closed)[-limit:]
+        if self.live and (not rows or self.live[0] > rows[-1][0]):
+            rows = rows[1:] if len(rows) >= limit else rows
+            rows.append(list(self.live))
+        return rows
+
+    def _append_closed(self, candles):
+        """追加已收盘K线 (自动去重 / 排序)，返回实际新增的K线"""
+        added = []
+        for k in sorted(candles, key=lambda k: k[0]):
+            if self.last_closed_ts is None or k[0] > self.last_closed_ts:
+                self.closed.append(list(k))
+                added.append(k)
+        return added
+
+    async def warm_up(self):
+        """启动时用 REST 拉一段历史"""
+        history = await self.backfill(None)
+        now_ms = self.clock()
+        self._append_closed([k for k in history if k[0] + self.tf_ms <= now_ms])
+
+    async def _fill_gap(self, until_ts=None):
+        """REST 补齐 last_closed_ts 之后、until_ts 之前的已收盘K线"""
+        if self.last_closed_ts is None:
+            return []
+        candles = await self.backfill(self.last_closed_ts + self.tf_ms)
+        now_ms = self.clock()
+        closed = [k for k in candles
+                  if k[0] + self.tf_ms <= now_ms and (until_ts is None or k[0] < until_ts)]
+        added = self._append_closed(closed)
+        if added:
+            print(f"🩹 [{self.inst_id}] REST 补齐 {len(added)} 根K线")
+        return added
+
+    async def _handle(self, msg):
+        if msg == 'pong':
+            return
+        payload = json.loads(msg)
+        if payload.get('event') == 'error':
+            raise RuntimeError(f"订阅失败: {payload}")
+        for row in payload.get('data', []):
+            candle = [int(row[0])] + [float(x) for x in row[1:6]]
+            confirmed = len(row) > 8 and row[8] == '1'
+            if not confirmed:
+                self.live = candle
+                continue
+            if self.last_closed_ts is not None and candle[0] - self.last_closed_ts > self.tf_ms:
+                await self._fill_gap(until_ts=candle[0])  # 中间漏了推送
+            if self._append_closed([candle]):
+                if self.live and self.live[0] <= candle[0]:
+                    self.live = None
+                await self.on_close(candle)
+
+    async def _session(self, http):
+        import aiohttp
+        async with http.ws_connect(self.url, heartbeat=None) as ws:
+            await ws.send_str(json.dumps({'op': 'subscribe',
+                                          'args': [{'channel': self.channel, 'instId': self.inst_id}]}))
+            print(f"📡 [{self.inst_id}] 已订阅 {self.channel}")
+            # 重连后先补齐断线期间收盘的K线，并对最新一根触发一次
+            added = await self._fill_gap()
+            if added:
+                await self.on_close(added[-1])
+            self.reconnects = 0
+
+            while not self.stopped:
+                try:
+                    msg = await ws.receive(timeout=PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    await ws.send_str('ping')
+                    continue
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    await self._handle(msg.data)
+                elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.CLOSING,
+                                  aiohttp.WSMsgType.ERROR):
+                    break
+
+    async def run(self):
+        """连接 + 断线重连主循环"""
+        import aiohttp  # 只有 ws 模式用到，推迟导入
+        async with aiohttp.ClientSession() as http:
+            if not self.ready:
+                await self.warm_up()
+            while not self.stopped:
+                try:
+                    await self._session(http)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"⚠️ [{self.inst_id}] WebSocket 异常: {e}")
+                if self.stopped:
+                    break
+                self.reconnects += 1
+                delay = min(30, 2 ** min(self.reconnects, 5) * 0.5)
+                print(f"🔁 [{self.inst_id}] {delay:.1f}秒后重连 (第{self.reconnects}次)")
+                await asyncio.sleep(delay)
+
+    def stop(self):
+        self.stopped = True